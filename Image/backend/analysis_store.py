@@ -0,0 +1,188 @@
+"""
+In-memory analysis sessions for region-of-interest re-analysis.
+
+An /analyze call that asks for a session (session=true, or preview=true)
+stores the decoded image (preview calls: the encoded upload, decoded on
+first use) and its intermediate maps (ELA, Canny edges, ManTraNet output)
+under an analysis ID. Follow-up ROI calls crop those maps instead of
+re-uploading and recomputing everything.
+
+Every client gets its own analysis ID. Clients whose upload hit the result
+cache get an alias of the existing session (alias()), which shares its maps;
+deleting one ID never takes the session away from the others, and the
+session is freed with its last ID.
+
+Sessions expire after ANALYSIS_TTL_S and the store is bounded by
+ANALYSIS_MAX_BYTES; least-recently-used IDs are evicted first. Each
+session keeps a running byte count, updated by its mutators under
+session.lock, so eviction never walks dicts another request is changing.
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+ANALYSIS_TTL_S = float(os.getenv("ANALYSIS_TTL_S", "900"))
+ANALYSIS_MAX_BYTES = int(float(os.getenv("ANALYSIS_MAX_MB", "256")) * 1024 * 1024)
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 0
+
+
+class AnalysisSession:
+    """
+    Decoded image + intermediate maps of one analysis, plus derived caches.
+    Change them only through set_array / drop_array / add_tile /
+    cache_result / clear_caches, with `lock` held, so the byte count stays right.
+    """
+
+    def __init__(self, analysis_id: str, arrays: dict, info: dict):
+        self.id = analysis_id
+        self.arrays = arrays      # "rgb" or encoded "upload", "ela_gray", "edges", optionally "tamper_map"
+        self.info = info          # scalar features / request details (JSON-able)
+        self.tiles = {}           # (tile_size, ty, tx) -> float32 tamper map tile
+        self.roi_results = OrderedDict()  # request key -> response dict
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+        self.refs = 0             # analysis IDs pointing here (store lock)
+        self._bytes = _nbytes(arrays)
+
+    @property
+    def shape(self):
+        """Full-resolution image shape, also before a preview session decoded it."""
+        rgb = self.arrays.get("rgb")
+        return rgb.shape if rgb is not None else tuple(self.info["shape"])
+
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def set_array(self, name: str, value: np.ndarray):
+        self._bytes += _nbytes(value) - _nbytes(self.arrays.get(name))
+        self.arrays[name] = value
+
+    def drop_array(self, name: str):
+        self._bytes -= _nbytes(self.arrays.pop(name, None))
+
+    def add_tile(self, key, tile: np.ndarray):
+        self._bytes += _nbytes(tile) - _nbytes(self.tiles.get(key))
+        self.tiles[key] = tile
+
+    def cache_result(self, key, result: dict, limit: int = 16):
+        self._bytes += _nbytes(result) - _nbytes(self.roi_results.pop(key, None))
+        self.roi_results[key] = result
+        while len(self.roi_results) > limit:
+            _, old = self.roi_results.popitem(last=False)
+            self._bytes -= _nbytes(old)
+
+    def clear_caches(self):
+        """Drop tiles and ROI results, keeping the base maps."""
+        self.tiles.clear()
+        self.roi_results.clear()
+        self._bytes = _nbytes(self.arrays)
+
+
+class AnalysisStore:
+    """Thread-safe LRU of analysis ID -> AnalysisSession with TTL and a byte budget."""
+
+    def __init__(self, max_bytes: int = ANALYSIS_MAX_BYTES, ttl: float = ANALYSIS_TTL_S):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, arrays: dict, info: dict) -> str:
+        session = AnalysisSession(uuid.uuid4().hex, arrays, info)
+        with self._lock:
+            self._add(session.id, session)
+            self._evict(keep=session.id)
+        return session.id
+
+    def alias(self, analysis_id: str):
+        """New analysis ID sharing the session of `analysis_id` (None if it is gone)."""
+        with self._lock:
+            session = self._get(analysis_id)
+            if session is None:
+                return None
+            new_id = uuid.uuid4().hex
+            self._add(new_id, session)
+            return new_id
+
+    def get(self, analysis_id: str):
+        with self._lock:
+            return self._get(analysis_id)
+
+    def delete(self, analysis_id: str) -> bool:
+        """Drop one analysis ID; the session goes with its last ID."""
+        with self._lock:
+            return self._drop(analysis_id) is not None
+
+    def updated(self, analysis_id: str):
+        """Re-check the byte budget after a session grew (new tiles / ROI results)."""
+        with self._lock:
+            over_budget = self._evict(keep=analysis_id)
+            session = self._sessions.get(analysis_id)
+        # A single session over budget: drop its derived caches, keep the base maps.
+        # Done outside the store lock; ROI requests hold session.lock for seconds
+        if over_budget and session is not None:
+            with session.lock:
+                session.clear_caches()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total()
+
+    def _add(self, analysis_id: str, session: AnalysisSession):
+        self._sessions[analysis_id] = session
+        session.refs += 1
+
+    def _drop(self, analysis_id: str):
+        """Remove one ID; returns its session (None if unknown)."""
+        session = self._sessions.pop(analysis_id, None)
+        if session is not None:
+            session.refs -= 1
+        return session
+
+    def _get(self, analysis_id: str):
+        session = self._sessions.get(analysis_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_access > self.ttl:
+            self._drop(analysis_id)
+            return None
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(analysis_id)
+        return session
+
+    def _total(self) -> int:
+        # Aliases share one session: count each once
+        return sum(s.nbytes() for s in {id(s): s for s in self._sessions.values()}.values())
+
+    def _evict(self, keep: str = None) -> bool:
+        """Expire and LRU-evict IDs other than `keep`; True if still over budget."""
+        now = time.monotonic()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_access > self.ttl]:
+            self._drop(sid)
+        total = self._total()
+        kept = self._sessions.get(keep)
+        for sid in list(self._sessions):
+            if total <= self.max_bytes:
+                break
+            if sid == keep or self._sessions[sid] is kept:
+                continue
+            session = self._drop(sid)
+            if not session.refs:
+                total -= session.nbytes()
+        return total > self.max_bytes
@@ -0,0 +1,336 @@
+"""
+Scale-out mode: a lightweight dispatcher in front of N image workers.
+
+Each worker is an ordinary `main.py` process (PORT=...). The dispatcher:
+  - routes /analyze and /analyze-video by consistent hashing on the upload's SHA-256, so the
+    same image always lands on the same worker and its result cache stays hot
+  - falls back to the least-loaded healthy worker when the owner is
+    overloaded or down (only that worker's keys move)
+  - keeps ROI follow-ups (/analyze/{id}/roi) on the worker holding the session,
+    learned from the worker's X-Analysis-Id header (large bodies are never parsed)
+  - routes POST /jobs like uploads and GET /jobs/{id} to the worker that took
+    the job (any worker when unknown: workers normally share JOB_QUEUE_URL)
+  - health-checks workers and supports graceful draining
+
+Run on one box with local workers:
+    python dispatcher.py --spawn 4 --port 8080          # workers on 8081..8084
+Or front existing workers (local or remote):
+    WORKERS=http://10.0.0.2:8080,http://10.0.0.3:8080 python dispatcher.py
+"""
+
+import os
+import sys
+import bisect
+import asyncio
+import hashlib
+import argparse
+import subprocess
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+
+from fastapi import FastAPI, UploadFile, File, Query, Form, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+
+HEALTH_INTERVAL_S = float(os.getenv("HEALTH_INTERVAL_S", "2"))
+WORKER_TIMEOUT_S = float(os.getenv("WORKER_TIMEOUT_S", "120"))
+# Owner is skipped when it has this many more requests in flight than the least-loaded worker
+OVERLOAD_MARGIN = int(os.getenv("OVERLOAD_MARGIN", "4"))
+VIRTUAL_NODES = 128
+
+
+class Worker:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.draining = False
+        self.inflight = 0          # as seen by this dispatcher
+        self.failures = 0
+        self.last_health = {}
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.draining
+
+    def to_dict(self):
+        return {"url": self.url, "healthy": self.healthy, "draining": self.draining,
+                "inflight": self.inflight, "health": self.last_health}
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes."""
+
+    def __init__(self, workers, vnodes: int = VIRTUAL_NODES):
+        self.workers = workers
+        self._ring = sorted(
+            (self._hash(f"{w.url}#{i}"), w) for w in workers for i in range(vnodes)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "big")
+
+    def candidates(self, key: str):
+        """Distinct workers in ring order starting at the key's owner."""
+        if not self._ring:
+            return []
+        start = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        seen, order = set(), []
+        for i in range(len(self._ring)):
+            worker = self._ring[(start + i) % len(self._ring)][1]
+            if worker.url not in seen:
+                seen.add(worker.url)
+                order.append(worker)
+                if len(order) == len(self.workers):
+                    break
+        return order
+
+
+class Dispatcher:
+    def __init__(self, urls):
+        self.workers = [Worker(u) for u in urls]
+        self.ring = HashRing(self.workers)
+        self.sessions = OrderedDict()   # analysis_id -> Worker (for ROI follow-ups)
+        self.jobs = OrderedDict()       # job_id -> Worker that accepted it
+        self.client = None
+        self.stats = {"routed_owner": 0, "routed_fallback": 0, "retries": 0}
+
+    def pick(self, content_hash: str):
+        candidates = [w for w in self.ring.candidates(content_hash) if w.available]
+        if not candidates:
+            return None
+        owner = candidates[0]
+        least = min(candidates, key=lambda w: w.inflight)
+        if owner.inflight - least.inflight >= OVERLOAD_MARGIN:
+            self.stats["routed_fallback"] += 1
+            return least
+        self.stats["routed_owner"] += 1
+        return owner
+
+    @staticmethod
+    def remember(mapping: OrderedDict, key: str, worker: Worker):
+        mapping[key] = worker
+        while len(mapping) > 100_000:
+            mapping.popitem(last=False)
+
+    async def forward(self, worker: Worker, method: str, path: str, **kwargs):
+        worker.inflight += 1
+        try:
+            return await self.client.request(method, worker.url + path, **kwargs)
+        finally:
+            worker.inflight -= 1
+
+    async def health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check(w) for w in self.workers))
+            await asyncio.sleep(HEALTH_INTERVAL_S)
+
+    async def check(self, worker: Worker):
+        try:
+            r = await self.client.get(worker.url + "/health", timeout=2.0)
+            worker.last_health = r.json()
+            worker.healthy = True
+            worker.draining = r.status_code == 503 or worker.last_health.get("draining", False)
+            worker.failures = 0
+        except Exception:
+            worker.failures += 1
+            if worker.failures >= 2:
+                worker.healthy = False
+
+
+app = FastAPI(title="Image Analysis Dispatcher")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+dispatcher = Dispatcher([u for u in os.getenv("WORKERS", "").split(",") if u.strip()])
+
+
+@app.on_event("startup")
+async def startup():
+    dispatcher.client = httpx.AsyncClient(
+        timeout=WORKER_TIMEOUT_S,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+    )
+    app.state.health_task = asyncio.create_task(dispatcher.health_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.health_task.cancel()
+    await dispatcher.client.aclose()
+
+
+def _passthrough(r: httpx.Response) -> Response:
+    return Response(content=r.content, status_code=r.status_code,
+                    media_type=r.headers.get("content-type", "application/json"))
+
+
+async def route_upload(path: str, file: UploadFile, params: dict, data: dict = None):
+    """Forward an upload to its owner on the ring, falling back along the ring on connection errors."""
+    contents = await file.read()
+    content_hash = hashlib.sha256(contents).hexdigest()
+    files = {"file": (file.filename or "upload", contents, file.content_type or "application/octet-stream")}
+
+    tried = set()
+    for _ in range(len(dispatcher.workers)):
+        worker = dispatcher.pick(content_hash)
+        if worker is None or worker.url in tried:
+            break
+        tried.add(worker.url)
+        try:
+            r = await dispatcher.forward(worker, "POST", path, params=params, files=files, data=data)
+        except httpx.TransportError:
+            # Connection-level failure: take it out until the next good health check
+            worker.healthy = False
+            dispatcher.stats["retries"] += 1
+            continue
+        if r.headers.get("x-analysis-id"):
+            dispatcher.remember(dispatcher.sessions, r.headers["x-analysis-id"], worker)
+        if r.headers.get("x-job-id"):
+            dispatcher.remember(dispatcher.jobs, r.headers["x-job-id"], worker)
+        return _passthrough(r)
+    return JSONResponse(status_code=503, content={"error": "No healthy image workers available"})
+
+
+@app.post("/analyze")
+async def analyze(file: UploadFile = File(...), mode: str = Query("basic", enum=["basic", "advanced"]),
+                  preview: bool = Query(False), session: bool = Query(False)):
+    return await route_upload("/analyze", file, {"mode": mode, "preview": preview, "session": session})
+
+
+@app.post("/analyze-video")
+async def analyze_video(file: UploadFile = File(...), mode: str = Query("basic", enum=["basic", "advanced"]),
+                        sample_fps: float = Query(4.0, gt=0, le=60), heatmaps: bool = Query(False)):
+    return await route_upload("/analyze-video", file,
+                              {"mode": mode, "sample_fps": sample_fps, "heatmaps": heatmaps})
+
+
+@app.api_route("/analyze/{analysis_id}/roi", methods=["POST"])
+@app.api_route("/analyze/{analysis_id}/full", methods=["GET"])
+@app.api_route("/analyze/{analysis_id}", methods=["DELETE"])
+async def session_route(analysis_id: str, request: Request):
+    # The session only exists on its worker, so always try it: a missed health
+    # check does not mean the session is gone, and draining workers still serve it
+    worker = dispatcher.sessions.get(analysis_id)
+    if worker is None:
+        return JSONResponse(status_code=404, content={"error": "Analysis not found or expired"})
+    try:
+        r = await dispatcher.forward(worker, request.method, request.url.path,
+                                     content=await request.body(),
+                                     headers={"content-type": request.headers.get("content-type", "application/json")})
+    except httpx.TransportError:
+        return JSONResponse(status_code=503, content={"error": "Worker holding this analysis is unreachable, retry later"})
+    if r.status_code == 404 or (request.method == "DELETE" and r.status_code == 200):
+        dispatcher.sessions.pop(analysis_id, None)
+    return _passthrough(r)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...), mode: str = Query("basic", enum=["basic", "advanced"]),
+                     priority: int = Form(0), webhook_url: Optional[str] = Form(None)):
+    data = {"priority": str(priority)}
+    if webhook_url:
+        data["webhook_url"] = webhook_url
+    return await route_upload("/jobs", file, {"mode": mode}, data)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    """Status of a job; unknown IDs (e.g. after a dispatcher restart) are asked of every worker."""
+    worker = dispatcher.jobs.get(job_id)
+    candidates = [worker] if worker is not None else [w for w in dispatcher.workers if w.available]
+    last = None
+    for worker in candidates:
+        try:
+            r = await dispatcher.forward(worker, "GET", request.url.path)
+        except httpx.TransportError:
+            continue
+        if r.status_code != 404:
+            dispatcher.remember(dispatcher.jobs, job_id, worker)
+            return _passthrough(r)
+        last = r
+    if last is not None:
+        return _passthrough(last)
+    return JSONResponse(status_code=503, content={"error": "Worker holding this job is unreachable, retry later"})
+
+
+@app.get("/admin/workers")
+def list_workers():
+    return {"workers": [w.to_dict() for w in dispatcher.workers], "stats": dispatcher.stats}
+
+
+@app.post("/admin/workers/{index}/drain")
+async def drain_worker(index: int, enable: bool = True):
+    """
+    Gracefully drain a worker: no new requests are routed to it (its hash
+    range falls through to the next workers on the ring) while in-flight
+    ones finish. Poll /admin/workers until inflight reaches 0 before stopping it.
+    """
+    if not 0 <= index < len(dispatcher.workers):
+        return JSONResponse(status_code=404, content={"error": "No such worker"})
+    worker = dispatcher.workers[index]
+    worker.draining = enable
+    try:
+        await dispatcher.client.post(worker.url + "/admin/drain", params={"enable": enable}, timeout=5.0)
+    except httpx.TransportError:
+        pass
+    return worker.to_dict()
+
+
+@app.get("/health")
+def health():
+    available = sum(w.available for w in dispatcher.workers)
+    return JSONResponse(status_code=200 if available else 503,
+                        content={"status": "ok" if available else "no workers", "available_workers": available})
+
+
+@app.get("/")
+def root():
+    return {"message": f"Image dispatcher fronting {len(dispatcher.workers)} workers"}
+
+
+def spawn_workers(count: int, base_port: int):
+    """Start `count` local main.py workers on consecutive ports."""
+    procs, urls = [], []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for i in range(count):
+        port = base_port + i
+        env = dict(os.environ, PORT=str(port), HOST="127.0.0.1")
+        procs.append(subprocess.Popen([sys.executable, "main.py"], cwd=here, env=env))
+        urls.append(f"http://127.0.0.1:{port}")
+    return procs, urls
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Image analysis dispatcher")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8080")))
+    parser.add_argument("--spawn", type=int, default=0, help="start N local workers")
+    parser.add_argument("--worker-base-port", type=int, default=8081)
+    args = parser.parse_args()
+
+    procs = []
+    if args.spawn:
+        procs, urls = spawn_workers(args.spawn, args.worker_base_port)
+        dispatcher = Dispatcher(urls)
+    if not dispatcher.workers:
+        parser.error("no workers: pass --spawn N or set WORKERS=url1,url2,...")
+    try:
+        uvicorn.run(app, host="0.0.0.0", port=args.port)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                p.kill()
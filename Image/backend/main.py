@@ -1,4 +1,4 @@
-from fastapi import FastAPI, UploadFile, File, Query
+from fastapi import FastAPI, UploadFile, File, Query, Form, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from PIL import Image
@@ -9,9 +9,34 @@ import math
 import base64
 import torch
 import os
+import sys
+import uuid
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from pydantic import BaseModel, Field
+
+# Shared backend modules live in <repo>/common (`pip install -e common`);
+# fall back to the checkout so the service also runs straight from the repo
+try:
+    import misinfo_common  # noqa: F401
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
 
 # Import the PyTorch-based ManTraNet
 from models.mantranet_torch import ManTraNetTorch
+from models.ela_engine import (BLOCK, ela_single, ela_sweep, summarize_sweep, estimate_jpeg_quality,
+                               outlier_threshold, primary_quality)
+from models.scratch import scratch, scratch_scope, pool_bytes as scratch_pool_bytes
+from models.metrics_extractor import compute_metrics
+from models.frame_sampler import is_gif, iter_video_frames, iter_gif_frames, prefetch, sample_frames
+from misinfo_common.job_queue import JobQueue, public_view
+from analysis_store import AnalysisStore
+from misinfo_common.stage_timer import StageTimer
 
 app = FastAPI()
 
@@ -28,45 +53,98 @@ app.add_middleware(
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 mantranet_model = ManTraNetTorch(device=device)
 
+# Sessions kept for /analyze/{analysis_id}/roi follow-ups
+analysis_store = AnalysisStore()
+
+# Results keyed by (content hash, mode, preview). The dispatcher routes
+# identical uploads to the same worker, so this stays hot in scale-out mode
+# too. A hit never hands out another client's analysis ID (see client_view).
+RESULT_CACHE_MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MB", "256")) * 1024 * 1024)
+result_cache = OrderedDict()     # key -> (result, approx bytes)
+result_cache_bytes = 0
+result_cache_lock = threading.Lock()
+
+# Worker state reported on /health (used by dispatcher.py)
+worker_state = {"inflight": 0, "draining": False, "served": 0, "cache_hits": 0}
+
+
+@app.middleware("http")
+async def track_inflight(request, call_next):
+    worker_state["inflight"] += 1
+    try:
+        return await call_next(request)
+    finally:
+        worker_state["inflight"] -= 1
+        worker_state["served"] += 1
+
 # ---------- Utility functions ----------
 
 def image_from_uploadfile(upload_file: UploadFile) -> Image.Image:
     """Convert UploadFile -> PIL image"""
     contents = upload_file.file.read()
-    return Image.open(io.BytesIO(contents)).convert("RGB")
+    return image_from_bytes(contents)
+
+
+def image_from_bytes(contents: bytes, max_side: int = None) -> Image.Image:
+    """
+    Decode to RGB, keeping the estimated original JPEG quality and the
+    undecoded (width, height) in .info. max_side: let the JPEG decoder scale
+    by 1/2, 1/4 or 1/8 (DCT scaling) while the long side stays >= max_side,
+    instead of decoding every pixel only to resize; other formats ignore it.
+    """
+    raw = Image.open(io.BytesIO(contents))
+    jpeg_quality = estimate_jpeg_quality(raw)
+    full_size = raw.size
+    if max_side and max(full_size) > max_side:
+        s = max_side / float(max(full_size))
+        raw.draft("RGB", (math.ceil(full_size[0] * s), math.ceil(full_size[1] * s)))
+    pil_img = raw.convert("RGB")
+    pil_img.info["jpeg_quality"] = jpeg_quality
+    pil_img.info["full_size"] = full_size
+    return pil_img
+
+
+def as_rgb_array(img) -> np.ndarray:
+    """
+    uint8 HxWx3 RGB view of `img`. np.asarray() on a PIL image copies the
+    whole frame, so pipelines should convert once and pass the array around;
+    every feature function below accepts either.
+    """
+    return img if isinstance(img, np.ndarray) else np.asarray(img)
+
+
+def _bgr(rgb: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=scratch("bgr", rgb.shape))
+
+
+def _gray(rgb: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY, dst=scratch("gray", rgb.shape[:2]))
 
 
 def error_level_analysis(pil_img: Image.Image, resave_quality: int = 90):
     """ELA = difference between original and resaved image"""
-    buf = io.BytesIO()
-    pil_img.save(buf, format="JPEG", quality=resave_quality)
-    buf.seek(0)
-    resaved = Image.open(buf).convert("RGB")
+    ela = ela_single(_bgr(as_rgb_array(pil_img)), resave_quality)
+    return ela["ela_gray"], ela["mean"], ela["std"]
 
-    orig_np = np.asarray(pil_img).astype(np.int16)
-    resaved_np = np.asarray(resaved).astype(np.int16)
-    ela_np = np.abs(orig_np - resaved_np).astype(np.uint8)
 
-    ela_gray = cv2.cvtColor(ela_np, cv2.COLOR_RGB2GRAY)
-    mean = float(np.mean(ela_gray) / 255.0)
-    std = float(np.std(ela_gray) / 255.0)
-    return ela_gray, mean, std
+def canny_edges(pil_img: Image.Image) -> np.ndarray:
+    """Canny edge map (new array, safe to keep)"""
+    return cv2.Canny(_gray(as_rgb_array(pil_img)), 100, 200)
 
 
-def edge_density(pil_img: Image.Image) -> float:
+def edge_density(pil_img: Image.Image, edges: np.ndarray = None) -> float:
     """Compute ratio of edge pixels using Canny"""
-    img = np.asarray(pil_img)
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    edges = cv2.Canny(gray, 100, 200)
-    return float(np.count_nonzero(edges)) / float(edges.size)
+    if edges is None:
+        gray = _gray(as_rgb_array(pil_img))
+        edges = cv2.Canny(gray, 100, 200, edges=scratch("edges", gray.shape))
+    return float(cv2.countNonZero(edges)) / float(edges.size)
 
 
 def chroma_anomaly_score(pil_img: Image.Image) -> float:
     """Detect anomalies between color channels"""
-    arr = np.asarray(pil_img).astype(np.float32) / 255.0
-    r_var = np.var(arr[:, :, 0])
-    g_var = np.var(arr[:, :, 1])
-    b_var = np.var(arr[:, :, 2])
+    # Per-channel streaming variance straight from uint8 (no float copy)
+    _, std = cv2.meanStdDev(as_rgb_array(pil_img))
+    r_var, g_var, b_var = (std[:, 0] / 255.0) ** 2
     mean_var = (r_var + g_var + b_var) / 3.0
     diff = (abs(r_var - mean_var) + abs(g_var - mean_var) + abs(b_var - mean_var)) / 3.0
     return float(np.tanh(diff * 10.0))
@@ -85,96 +163,144 @@ def compute_score(ela_mean, ela_std, edge_dens, chroma_anom):
     return max(0.0, min(1.0, score))
 
 
-def generate_basic_heatmap(pil_img: Image.Image, ela_gray: np.ndarray) -> str:
-    """Basic heatmap: ELA + edges"""
-    img = np.asarray(pil_img)
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    edges = cv2.Canny(gray, 100, 200)
-    edges = cv2.GaussianBlur(edges, (5, 5), 0)
-    ela_norm = cv2.normalize(ela_gray, None, 0, 255, cv2.NORM_MINMAX)
-    combined = cv2.addWeighted(ela_norm.astype(np.float32), 0.7, edges.astype(np.float32), 0.3, 0)
-    combined = cv2.GaussianBlur(combined, (3, 3), 0)
-    heatmap = cv2.applyColorMap(combined.astype(np.uint8), cv2.COLORMAP_JET)
-    overlay = cv2.addWeighted(img, 0.6, heatmap, 0.8, 0)
-    _, buffer = cv2.imencode(".png", cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR))
+def generate_basic_heatmap(pil_img: Image.Image, ela_gray: np.ndarray, edges: np.ndarray = None) -> str:
+    """Basic heatmap: ELA + edges (pass precomputed Canny edges to skip recomputing them)"""
+    img = as_rgb_array(pil_img)
+    if edges is None:
+        gray = _gray(img)
+        edges = cv2.Canny(gray, 100, 200, edges=scratch("edges", gray.shape))
+        cv2.GaussianBlur(edges, (5, 5), 0, dst=edges)
+    else:
+        edges = cv2.GaussianBlur(edges, (5, 5), 0, dst=scratch("edges_blur", edges.shape))
+    ela_norm = cv2.normalize(ela_gray, scratch("ela_norm", ela_gray.shape), 0, 255, cv2.NORM_MINMAX)
+    # uint8 blend: saturating arithmetic, no float32 copies
+    combined = cv2.addWeighted(ela_norm, 0.7, edges, 0.3, 0, dst=ela_norm)
+    cv2.GaussianBlur(combined, (3, 3), 0, dst=combined)
+    heatmap = cv2.applyColorMap(combined, cv2.COLORMAP_JET, dst=scratch("heatmap", img.shape))
+    overlay = cv2.addWeighted(img, 0.6, heatmap, 0.8, 0, dst=heatmap)
+    cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR, dst=overlay)
+    _, buffer = cv2.imencode(".png", overlay)
     heatmap_b64 = base64.b64encode(buffer).decode("utf-8")
     return f"data:image/png;base64,{heatmap_b64}"
 
 
-def generate_advanced_heatmap(pil_img: Image.Image):
-    """Advanced heatmap: PyTorch ManTraNet + metrics"""
+def feature_metrics(ela_mean, ela_std, edge_d, chroma, score) -> dict:
+    return {
+        "ELA Mean": round(ela_mean, 4),
+        "ELA StdDev": round(ela_std, 4),
+        "Edge Density": round(edge_d, 4),
+        "Chroma Anomaly": round(chroma, 4),
+        "Tamper Confidence": round(score, 4),
+    }
+
+
+def encode_png(rgb: np.ndarray) -> str:
+    _, buffer = cv2.imencode(".png", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+    heatmap_b64 = base64.b64encode(buffer).decode("utf-8")
+    return f"data:image/png;base64,{heatmap_b64}"
+
+
+def generate_advanced_heatmap(pil_img: Image.Image, tamper_map: np.ndarray = None, features: tuple = None):
+    """
+    Advanced heatmap: PyTorch ManTraNet + metrics.
+    tamper_map: precomputed ManTraNet output (predicted here if omitted)
+    features: precomputed (ela_mean, ela_std, edge_d, chroma) to avoid recomputing them
+    """
     try:
-        temp_path = "temp_input.png"
-        pil_img.save(temp_path)
+        rgb = as_rgb_array(pil_img)
 
         # Predict with ManTraNet
-        heatmap = mantranet_model.predict_heatmap(temp_path)
-        os.remove(temp_path)
+        if tamper_map is None:
+            tamper_map = mantranet_model.predict_map(rgb)
+        heatmap = ManTraNetTorch.colorize(tamper_map)
 
         # --- Metrics ---
-        ela_img, ela_mean, ela_std = error_level_analysis(pil_img)
-        edge_d = edge_density(pil_img)
-        chroma = chroma_anomaly_score(pil_img)
-        score = compute_score(ela_mean, ela_std, edge_d, chroma)
-
-        metrics = {
-            "ELA Mean": round(ela_mean, 4),
-            "ELA StdDev": round(ela_std, 4),
-            "Edge Density": round(edge_d, 4),
-            "Chroma Anomaly": round(chroma, 4),
-            "Tamper Confidence": round(score, 4),
-        }
+        if features is None:
+            _, ela_mean, ela_std = error_level_analysis(rgb)
+            features = (ela_mean, ela_std, edge_density(rgb), chroma_anomaly_score(rgb))
+        score = compute_score(*features)
+        metrics = feature_metrics(*features, score)
 
         # Encode heatmap to base64
-        _, buffer = cv2.imencode(".png", cv2.cvtColor(heatmap, cv2.COLOR_RGB2BGR))
-        heatmap_b64 = base64.b64encode(buffer).decode("utf-8")
-
-        return f"data:image/png;base64,{heatmap_b64}", metrics
+        return encode_png(heatmap), metrics
     except Exception as e:
         print(f"[Advanced Heatmap Error] {e}")
         return None, {}
 
 
-# ---------- API ----------
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", "1024"))
 
-@app.post("/analyze")
-async def analyze_image(file: UploadFile = File(...), mode: str = Query("basic", enum=["basic", "advanced"])):
+
+def preview_frame(rgb: np.ndarray, max_side: int = PREVIEW_MAX_SIDE):
+    """Downscale (INTER_AREA) so the long side is at most max_side. Returns (frame, scale)."""
+    h, w = rgb.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    if scale >= 1.0:
+        return rgb, 1.0
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(rgb, size, interpolation=cv2.INTER_AREA), scale
+
+
+@scratch_scope()
+def run_analysis(pil_img: Image.Image, mode: str = "basic", keep_session: bool = True,
+                 preview: bool = False, timer: StageTimer = None, upload: bytes = None) -> dict:
     """
-    mode: "basic" (default ELA-based heatmap)
-          "advanced" (ManTraNet PyTorch localization)
+    Full /analyze pipeline on a decoded image (shared with the job worker).
+    preview: compute features and heatmap on a frame bounded to
+    PREVIEW_MAX_SIDE, so latency stops growing with input megapixels; the
+    full-resolution result is available later from /analyze/{id}/full.
+    upload: the encoded bytes; preview sessions keep these instead of the
+    decoded frame and decode them at full resolution only when /full or an
+    ROI needs it. Required if pil_img was decoded with image_from_bytes
+    max_side and a session is kept.
+    timer: optional StageTimer that receives per-stage durations.
     """
-    try:
-        pil_img = image_from_uploadfile(file)
-    except Exception as e:
-        return JSONResponse(status_code=400, content={"error": f"Invalid image: {e}"})
-
-    # Compute features
-    ela_img, ela_mean, ela_std = error_level_analysis(pil_img)
-    edge_d = edge_density(pil_img)
-    chroma = chroma_anomaly_score(pil_img)
+    timer = timer or StageTimer()
+    decoded = as_rgb_array(pil_img)
+    full_w, full_h = pil_img.info.get("full_size", (decoded.shape[1], decoded.shape[0]))
+    rgb = preview_frame(decoded)[0] if preview else decoded
+    scale = rgb.shape[1] / float(full_w)
+    timer.mark("resize")
+
+    # Compute features. Advanced mode also runs the multi-quality sweep (or a
+    # single re-save at the estimated original quality, which only applies
+    # to the undownscaled frame); its q=90 pass doubles as the feature ELA
+    sweep, original_quality = None, None
+    if mode == "advanced":
+        original_quality = pil_img.info.get("jpeg_quality") if scale == 1.0 else None
+        # The sweep threads only read the frame, so the scratch copy is safe to share
+        sweep = ela_sweep(_bgr(rgb), original_quality=original_quality)
+    if sweep is not None and 90 in sweep:
+        ela_img, ela_mean, ela_std = sweep[90]["ela_gray"], sweep[90]["mean"], sweep[90]["std"]
+    else:
+        ela_img, ela_mean, ela_std = error_level_analysis(rgb)
+    timer.mark("ela")
+    edges = canny_edges(rgb)
+    edge_d = edge_density(rgb, edges)
+    chroma = chroma_anomaly_score(rgb)
     score = compute_score(ela_mean, ela_std, edge_d, chroma)
     label = "Real" if score >= 0.5 else "Fake"
-
-    # change here
-
+    timer.mark("features")
 
     # Generate heatmap and metrics
+    tamper_map = None
     if mode == "advanced":
-        heatmap_url, metrics = generate_advanced_heatmap(pil_img)
+        try:
+            tamper_map = mantranet_model.predict_map(rgb)
+        except Exception as e:
+            print(f"[Advanced Heatmap Error] {e}")
+        timer.mark("mantranet")
+        heatmap_url, metrics = (None, {}) if tamper_map is None else generate_advanced_heatmap(
+            rgb, tamper_map, (ela_mean, ela_std, edge_d, chroma))
         if heatmap_url is None:
-            heatmap_url = generate_basic_heatmap(pil_img, ela_img)
+            heatmap_url = generate_basic_heatmap(rgb, ela_img, edges)
             metrics = {}
     else:
-        heatmap_url = generate_basic_heatmap(pil_img, ela_img)
-        metrics = {
-            "ELA Mean": round(ela_mean, 4),
-            "ELA StdDev": round(ela_std, 4),
-            "Edge Density": round(edge_d, 4),
-            "Chroma Anomaly": round(chroma, 4),
-            "Tamper Confidence": round(score, 4),
-        }
+        heatmap_url = generate_basic_heatmap(rgb, ela_img, edges)
+        metrics = feature_metrics(ela_mean, ela_std, edge_d, chroma, score)
+    timer.mark("heatmap")
 
-    return {
+    result = {
         "status": "success",
         "score": round(score, 4),
         "label": label,
@@ -182,6 +308,652 @@ async def analyze_image(file: UploadFile = File(...), mode: str = Query("basic",
         "heatmap": heatmap_url,
         "metrics": metrics,
     }
+    if sweep is not None:
+        result["ela"] = summarize_sweep(sweep, original_quality)
+        if "block_grid" in result["ela"]:
+            # Grid cells in full-resolution pixels, like ROI coordinates
+            result["ela"]["block_grid"]["cell"] = round(result["ela"]["block_grid"]["cell"] / scale, 2)
+    if keep_session:
+        # Preview sessions keep the encoded upload instead of the decoded
+        # frame; their maps are marked with their scale and upgraded on
+        # demand (full result / ROI calls)
+        arrays = {"ela_gray": ela_img, "edges": edges}
+        if scale != 1.0 and upload is not None:
+            arrays["upload"] = upload
+        else:
+            arrays["rgb"] = np.ascontiguousarray(decoded)
+        if tamper_map is not None:
+            arrays["tamper_map"] = tamper_map
+        info = {"mode": mode, "score": score, "map_scale": scale, "shape": [full_h, full_w, 3]}
+        if sweep is not None:
+            # Per-block ELA of the primary quality, for ROI calls (cell in full-resolution px)
+            q = primary_quality(sweep, original_quality)
+            if sweep[q]["block_mean"].size:
+                arrays["ela_blocks"] = sweep[q]["block_mean"]
+                info["ela_blocks"] = {"quality": q, "cell": BLOCK / scale, "threshold": outlier_threshold(sweep[q])}
+        result["analysis_id"] = analysis_store.create(arrays, info)
+        timer.mark("session")
+    if scale != 1.0:
+        result["preview"] = {
+            "scale": round(scale, 4),
+            "width": rgb.shape[1],
+            "height": rgb.shape[0],
+            "full_result": f"/analyze/{result['analysis_id']}/full" if keep_session else None,
+        }
+    return result
+
+
+def ensure_full_frame(session):
+    """Decode a preview session's stored upload at full resolution (once)."""
+    if "rgb" not in session.arrays:
+        session.set_array("rgb", np.ascontiguousarray(as_rgb_array(image_from_bytes(session.arrays["upload"]))))
+        session.drop_array("upload")
+
+
+def ensure_full_maps(session):
+    """Replace preview-scale ELA/edge maps of a session with full-resolution ones."""
+    if session.info.get("map_scale", 1.0) == 1.0:
+        return False
+    ensure_full_frame(session)
+    rgb = session.arrays["rgb"]
+    session.set_array("ela_gray", error_level_analysis(rgb)[0])
+    session.set_array("edges", canny_edges(rgb))
+    session.info["map_scale"] = 1.0
+    return True
+
+
+@scratch_scope()
+def full_resolution_result(session) -> dict:
+    """Score + heatmap at native resolution for a (preview) session."""
+    ensure_full_maps(session)
+    rgb = session.arrays["rgb"]
+    ela_img, edges = session.arrays["ela_gray"], session.arrays["edges"]
+    ela_mean, ela_std = (float(v[0, 0]) / 255.0 for v in cv2.meanStdDev(ela_img))
+    edge_d = edge_density(rgb, edges)
+    chroma = chroma_anomaly_score(rgb)
+    score = compute_score(ela_mean, ela_std, edge_d, chroma)
+
+    heatmap_url = None
+    if "tamper_map" in session.arrays:
+        heatmap_url, _ = generate_advanced_heatmap(rgb, session.arrays["tamper_map"],
+                                                   (ela_mean, ela_std, edge_d, chroma))
+    if heatmap_url is None:
+        heatmap_url = generate_basic_heatmap(rgb, ela_img, edges)
+    return {
+        "status": "success",
+        "analysis_id": session.id,
+        "resolution": "full",
+        "score": round(score, 4),
+        "label": "Real" if score >= 0.5 else "Fake",
+        "mode": session.info.get("mode", "basic"),
+        "heatmap": heatmap_url,
+        "metrics": feature_metrics(ela_mean, ela_std, edge_d, chroma, score),
+    }
+
+
+# ---------- Region-of-interest re-analysis ----------
+
+ROI_TILE_BATCH = int(os.getenv("ROI_TILE_BATCH", "8"))
+ROI_MAX_TILES = int(os.getenv("ROI_MAX_TILES", "256"))   # per request; each is one ManTraNet pass
+
+
+class RoiRequest(BaseModel):
+    x: int
+    y: int
+    width: int
+    height: int
+    heatmap: bool = True
+    metrics: bool = True
+    tiles: bool = False       # high-resolution tiled ManTraNet over the ROI
+    tile_size: int = Field(256, ge=64, le=2048)
+
+
+def tiled_tamper_map(session, x0, y0, x1, y1, tile_size):
+    """
+    ManTraNet at (close to) native resolution over the ROI: the image is cut
+    into a tile grid aligned to absolute coordinates, so tiles computed for
+    earlier ROIs of the same session are reused. Returns (map, new, cached).
+    """
+    rgb = session.arrays["rgb"]
+    h, w = rgb.shape[:2]
+    keys = [(tile_size, ty, tx)
+            for ty in range(y0 // tile_size, (y1 - 1) // tile_size + 1)
+            for tx in range(x0 // tile_size, (x1 - 1) // tile_size + 1)]
+    missing = [k for k in keys if k not in session.tiles]
+    for i in range(0, len(missing), ROI_TILE_BATCH):
+        chunk = missing[i:i + ROI_TILE_BATCH]
+        crops = [rgb[ty * tile_size:min(h, (ty + 1) * tile_size), tx * tile_size:min(w, (tx + 1) * tile_size)]
+                 for _, ty, tx in chunk]
+        for key, tile_map in zip(chunk, mantranet_model.predict_maps(crops)):
+            session.add_tile(key, tile_map)
+
+    out = np.zeros((y1 - y0, x1 - x0), dtype=np.float32)
+    for key in keys:
+        _, ty, tx = key
+        ty0, tx0 = ty * tile_size, tx * tile_size
+        ty1, tx1 = min(h, ty0 + tile_size), min(w, tx0 + tile_size)
+        tile = cv2.resize(session.tiles[key], (tx1 - tx0, ty1 - ty0))
+        # Intersection of this tile with the ROI
+        iy0, iy1, ix0, ix1 = max(ty0, y0), min(ty1, y1), max(tx0, x0), min(tx1, x1)
+        out[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0] = tile[iy0 - ty0:iy1 - ty0, ix0 - tx0:ix1 - tx0]
+    return out, len(missing), len(keys) - len(missing)
+
+
+@scratch_scope()
+def analyze_roi(session, req: RoiRequest) -> dict:
+    """Re-analyze a crop of a stored session, reusing its intermediate maps."""
+    h, w = session.shape[:2]
+    x0, y0 = max(0, req.x), max(0, req.y)
+    x1, y1 = min(w, req.x + req.width), min(h, req.y + req.height)
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        raise ValueError(f"ROI must overlap the {w}x{h} image by at least 8x8 pixels")
+    if req.tiles:
+        t = req.tile_size
+        n_tiles = ((y1 - 1) // t - y0 // t + 1) * ((x1 - 1) // t - x0 // t + 1)
+        if n_tiles > ROI_MAX_TILES:
+            raise ValueError(f"ROI needs {n_tiles} tiles of {t}px (limit {ROI_MAX_TILES}); "
+                             "use a smaller region or a larger tile_size")
+    computed = []
+
+    if ensure_full_maps(session):
+        computed.append("full-resolution maps")
+    rgb = session.arrays["rgb"][y0:y1, x0:x1]
+    ela_crop = session.arrays["ela_gray"][y0:y1, x0:x1]
+    edges_crop = session.arrays["edges"][y0:y1, x0:x1]
+
+    # Features come straight from the stored maps
+    ela_mean, ela_std = (float(v[0, 0]) / 255.0 for v in cv2.meanStdDev(ela_crop))
+    edge_d = edge_density(rgb, edges_crop)
+    chroma = chroma_anomaly_score(rgb)
+    score = compute_score(ela_mean, ela_std, edge_d, chroma)
+
+    tamper_crop = None
+    if req.tiles:
+        tamper_crop, new_tiles, cached_tiles = tiled_tamper_map(session, x0, y0, x1, y1, req.tile_size)
+        computed.append(f"tiles: {new_tiles} new, {cached_tiles} reused")
+    elif "tamper_map" in session.arrays:
+        full = session.arrays["tamper_map"]
+        sy, sx = full.shape[0] / h, full.shape[1] / w
+        src = full[int(y0 * sy):max(int(y0 * sy) + 1, int(np.ceil(y1 * sy))),
+                   int(x0 * sx):max(int(x0 * sx) + 1, int(np.ceil(x1 * sx)))]
+        tamper_crop = cv2.resize(src, (x1 - x0, y1 - y0), interpolation=cv2.INTER_LINEAR)
+
+    result = {
+        "status": "success",
+        "analysis_id": session.id,
+        "roi": {"x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0},
+        "score": round(score, 4),
+        "label": "Real" if score >= 0.5 else "Fake",
+        "features": feature_metrics(ela_mean, ela_std, edge_d, chroma, score),
+    }
+    if "ela_blocks" in session.arrays:
+        # Outlier blocks of the advanced-mode sweep inside the ROI, judged
+        # against the whole image's threshold
+        blocks, info = session.arrays["ela_blocks"], session.info["ela_blocks"]
+        cell = info["cell"]
+        by0, bx0 = int(y0 // cell), int(x0 // cell)
+        crop = blocks[by0:max(by0 + 1, math.ceil(y1 / cell)), bx0:max(bx0 + 1, math.ceil(x1 / cell))]
+        if crop.size:
+            result["ela_blocks"] = {
+                "quality": info["quality"],
+                "outlier_blocks": round(float(np.mean(crop > info["threshold"])), 4),
+                "block_mean_max": round(float(crop.max()), 4),
+            }
+    if req.heatmap:
+        if tamper_crop is not None:
+            result["heatmap"] = encode_png(ManTraNetTorch.colorize(tamper_crop))
+        else:
+            result["heatmap"] = generate_basic_heatmap(rgb, ela_crop, edges_crop)
+        computed.append("heatmap")
+    if req.metrics:
+        region_map = tamper_crop if tamper_crop is not None else ela_crop.astype(np.float32)
+        result["metrics"] = compute_metrics(np.ascontiguousarray(rgb), region_map)
+        computed.append("metrics")
+    result["computed"] = computed
+    return result
+
+
+# ---------- Video / animated GIF ----------
+
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "4"))
+VIDEO_MAX_SIDE = int(os.getenv("VIDEO_MAX_SIDE", "640"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "600"))
+VIDEO_BATCH = int(os.getenv("VIDEO_BATCH", "8"))
+
+
+def frame_features(rgb: np.ndarray):
+    """Basic features of one video frame at VIDEO_MAX_SIDE. Returns (features, score, (frame, ela, edges))."""
+    small, _ = preview_frame(rgb, VIDEO_MAX_SIDE)
+    ela_img, ela_mean, ela_std = error_level_analysis(small)
+    edges = canny_edges(small)
+    features = (ela_mean, ela_std, edge_density(small, edges), chroma_anomaly_score(small))
+    return features, compute_score(*features), (small, ela_img, edges)
+
+
+class _Segment:
+    """Frames between two scene changes; keeps the maps of its most suspicious frame only."""
+
+    def __init__(self, start: float):
+        self.start = self.end = start
+        self.frames = []          # analyzed frames: {"t", "score", "features", "weight", ...}
+        self.reused = 0
+        self.peak = None          # lowest-score frame record
+        self.peak_maps = None     # (frame, ela, edges) of the peak
+
+    def add(self, record, maps, keep_maps):
+        self.frames.append(record)
+        self.end = record["t"]
+        if self.peak is None or record["score"] < self.peak["score"]:
+            if self.peak is not None:
+                self.peak.pop("tamper_map", None)
+            self.peak = record
+            self.peak_maps = maps if keep_maps else None
+
+    def reuse(self, t):
+        # Near-duplicate frame: counts toward the last analyzed frame's weight
+        self.frames[-1]["weight"] += 1
+        self.reused += 1
+        self.end = t
+
+    def summary(self, heatmap: bool) -> dict:
+        weights = np.array([f["weight"] for f in self.frames], dtype=np.float64)
+        scores = np.array([f["score"] for f in self.frames], dtype=np.float64)
+        score = float(np.average(scores, weights=weights))
+        out = {
+            "start": round(self.start, 3),
+            "end": round(self.end, 3),
+            "frames_analyzed": len(self.frames),
+            "frames_reused": self.reused,
+            "score": round(score, 4),
+            "min_score": round(self.peak["score"], 4),
+            "label": "Real" if score >= 0.5 else "Fake",
+            "peak_time": round(self.peak["t"], 3),
+            "features": feature_metrics(*self.peak["features"], self.peak["score"]),
+        }
+        tamper = [(f["tamper_area"], f["weight"]) for f in self.frames if "tamper_area" in f]
+        if tamper:
+            areas, area_weights = zip(*tamper)
+            out["tamper_area"] = round(float(np.average(areas, weights=area_weights)), 4)
+        if heatmap and self.peak_maps is not None:
+            if "tamper_map" in self.peak:
+                out["heatmap"] = encode_png(ManTraNetTorch.colorize(self.peak["tamper_map"]))
+            else:
+                out["heatmap"] = generate_basic_heatmap(*self.peak_maps)
+        self.peak_maps = None
+        self.peak.pop("tamper_map", None)
+        return out
+
+
+@scratch_scope()
+def analyze_frames(frames, mode: str = "basic", heatmaps: bool = False) -> dict:
+    """
+    Per-segment score timeline for a stream of (index, t, rgb) frames.
+    Near-duplicate frames reuse the previous frame's result, a scene change
+    starts a new segment, and in advanced mode the analyzed frames go
+    through ManTraNet in batches of VIDEO_BATCH. Analysis stops after
+    VIDEO_MAX_FRAMES analyzed frames and the result is marked truncated.
+    """
+    started = time.perf_counter()
+    segments, current = [], None
+    pending = []              # (segment, record, frame) waiting for a ManTraNet batch
+    counts = {"frames_sampled": 0, "frames_analyzed": 0, "frames_reused": 0}
+    last_t = 0.0
+    truncated = False
+
+    def flush():
+        if not pending:
+            return
+        try:
+            maps = mantranet_model.predict_maps([frame for _, _, frame in pending])
+        except Exception as e:
+            print(f"[Video ManTraNet Error] {e}")
+            maps = []
+        for (segment, record, _), tamper_map in zip(pending, maps):
+            record["tamper_area"] = float(np.count_nonzero(tamper_map > 0.5)) / tamper_map.size
+            # Only the segment's peak frame needs its map (for the heatmap)
+            if heatmaps and segment.peak is record:
+                record["tamper_map"] = tamper_map
+        pending.clear()
+
+    def close():
+        flush()
+        segments.append(current.summary(heatmaps))
+
+    try:
+        for sample in sample_frames(frames, max_frames=VIDEO_MAX_FRAMES):
+            if sample.get("truncated"):
+                truncated = True
+                break
+            counts["frames_sampled"] += 1
+            last_t = sample["t"]
+            if sample["reuse"]:
+                counts["frames_reused"] += 1
+                current.reuse(sample["t"])
+                continue
+            if sample["scene_change"] and current is not None:
+                close()
+                current = None
+            if current is None:
+                current = _Segment(sample["t"])
+            features, score, maps = frame_features(sample["rgb"])
+            record = {"t": sample["t"], "score": score, "features": features, "weight": 1}
+            current.add(record, maps, heatmaps)
+            counts["frames_analyzed"] += 1
+            if mode == "advanced":
+                pending.append((current, record, maps[0]))
+                if len(pending) >= VIDEO_BATCH:
+                    flush()
+    finally:
+        # Stops the decoder (prefetch thread) if sampling ended early
+        if hasattr(frames, "close"):
+            frames.close()
+    if current is not None:
+        close()
+    if not segments:
+        raise ValueError("No decodable frames")
+
+    # Segments run until the next one starts
+    for seg, nxt in zip(segments, segments[1:]):
+        seg["end"] = nxt["start"]
+    segments[-1]["end"] = round(max(segments[-1]["end"], last_t), 3)
+
+    # One tampered scene is enough to flag the clip
+    score = min(seg["score"] for seg in segments)
+    elapsed = time.perf_counter() - started
+    return {
+        "status": "success",
+        "score": round(score, 4),
+        "label": "Real" if score >= 0.5 else "Fake",
+        "mode": mode,
+        "duration": segments[-1]["end"],
+        # True when VIDEO_MAX_FRAMES was reached: the timeline stops at "duration"
+        "truncated": truncated,
+        "segments": segments,
+        "stats": dict(counts, elapsed_s=round(elapsed, 3),
+                      realtime_factor=round(segments[-1]["end"] / elapsed, 2) if elapsed > 0 else None),
+    }
+
+
+# ---------- Jobs ----------
+
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "job_uploads")
+# Spooled files older than this are left over from a crashed process
+JOB_SPOOL_MAX_AGE_S = float(os.getenv("JOB_SPOOL_MAX_AGE_S", str(24 * 3600)))
+os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+
+job_queue = JobQueue()
+
+
+def handle_image_job(payload: dict) -> dict:
+    """Worker-side analysis of a spooled upload (kept for retries until the job finishes)."""
+    with open(payload["path"], "rb") as f:
+        pil_img = image_from_bytes(f.read())
+    return run_analysis(pil_img, payload.get("mode", "basic"), keep_session=False)
+
+
+def remove_job_upload(job: dict):
+    """Delete the spooled upload once the job succeeded or failed for good."""
+    try:
+        os.remove(job["payload"]["path"])
+    except FileNotFoundError:
+        pass
+
+
+def sweep_job_spool(max_age_s: float = JOB_SPOOL_MAX_AGE_S):
+    """Remove stale spooled files (jobs whose process died before finishing them)."""
+    cutoff = time.time() - max_age_s
+    for name in os.listdir(JOB_SPOOL_DIR):
+        path = os.path.join(JOB_SPOOL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+job_queue.register("image", handle_image_job, on_finish=remove_job_upload)
+
+
+@app.on_event("startup")
+def start_job_workers():
+    sweep_job_spool()
+    job_queue.start()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_queue.stop()
+
+
+# ---------- API ----------
+
+# Plain def: FastAPI runs it in its threadpool, so decoding and analysis
+# never block the event loop (health checks, job submissions)
+@app.post("/analyze")
+def analyze_image(response: Response, file: UploadFile = File(...),
+                  mode: str = Query("basic", enum=["basic", "advanced"]), preview: bool = Query(False),
+                  session: bool = Query(False)):
+    """
+    mode: "basic" (default ELA-based heatmap)
+          "advanced" (ManTraNet PyTorch localization)
+    preview: fast path at bounded resolution; fetch /analyze/{id}/full later
+    session: keep the maps for /analyze/{id}/roi follow-ups (implied by preview)
+    Per-stage durations are returned in the Server-Timing header.
+    """
+    timer = StageTimer()
+    contents = file.file.read()
+    keep_session = session or preview
+    key = (hashlib.sha256(contents).hexdigest(), mode, preview)
+    timer.mark("read")
+    with result_cache_lock:
+        cached = result_cache.get(key)
+    if cached is not None:
+        # A session request needs the cached result's session to still be alive
+        analysis_id = analysis_store.alias(cached[0]["analysis_id"]) \
+            if keep_session and cached[0].get("analysis_id") else None
+        if analysis_id or not keep_session:
+            with result_cache_lock:
+                if key in result_cache:
+                    result_cache.move_to_end(key)
+            worker_state["cache_hits"] += 1
+            result = client_view(cached[0], analysis_id)
+            timer.mark("cache")
+            _set_result_headers(response, result, timer)
+            return result
+
+    try:
+        pil_img = image_from_bytes(contents, PREVIEW_MAX_SIDE if preview else None)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid image: {e}"})
+    timer.mark("decode")
+
+    result = run_analysis(pil_img, mode, keep_session, preview=preview, timer=timer, upload=contents)
+    cache_result(key, result)
+    _set_result_headers(response, result, timer)
+    return result
+
+
+def _set_result_headers(response: Response, result: dict, timer: StageTimer):
+    # The dispatcher routes ROI follow-ups by this header instead of parsing
+    # (possibly tens of MB of) JSON
+    response.headers["Server-Timing"] = timer.header()
+    if result.get("analysis_id"):
+        response.headers["X-Analysis-Id"] = result["analysis_id"]
+
+
+def client_view(result: dict, analysis_id: str = None) -> dict:
+    """A cached result pointing at the caller's own analysis ID (or at no session)."""
+    out = dict(result)
+    out.pop("analysis_id", None)
+    if analysis_id:
+        out["analysis_id"] = analysis_id
+    if "preview" in out:
+        out["preview"] = dict(out["preview"], full_result=f"/analyze/{analysis_id}/full" if analysis_id else None)
+    return out
+
+
+def cache_result(key, result):
+    """LRU insert bounded by RESULT_CACHE_MB (heatmap data URLs dominate the size)."""
+    global result_cache_bytes
+    size = len(result.get("heatmap") or "") + 4096
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    with result_cache_lock:
+        old = result_cache.pop(key, None)
+        if old is not None:
+            result_cache_bytes -= old[1]
+        result_cache[key] = (result, size)
+        result_cache_bytes += size
+        while result_cache_bytes > RESULT_CACHE_MAX_BYTES:
+            _, (_, evicted) = result_cache.popitem(last=False)
+            result_cache_bytes -= evicted
+
+
+@app.post("/analyze/{analysis_id}/roi")
+def analyze_region(analysis_id: str, req: RoiRequest):
+    """
+    Re-analyze a crop rectangle of an earlier /analyze call without
+    re-uploading: features, heatmap and compute_metrics for the ROI, and
+    optionally high-resolution tiled ManTraNet (tiles=true).
+    """
+    session = analysis_store.get(analysis_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": "Analysis not found or expired"})
+
+    key = (req.x, req.y, req.width, req.height, req.heatmap, req.metrics, req.tiles, req.tile_size)
+    with session.lock:
+        cached = session.roi_results.get(key)
+        if cached is not None:
+            return dict(cached, analysis_id=analysis_id, computed=["cached"])
+        try:
+            result = analyze_roi(session, req)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        session.cache_result(key, result)
+    analysis_store.updated(analysis_id)
+    # Aliases share the session (and its cached results): answer with the caller's ID
+    return dict(result, analysis_id=analysis_id)
+
+
+@app.get("/analyze/{analysis_id}/full")
+def analyze_full(analysis_id: str):
+    """Full-resolution score + heatmap for an earlier (preview) analysis; computed once, then cached."""
+    session = analysis_store.get(analysis_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": "Analysis not found or expired"})
+    with session.lock:
+        result = session.roi_results.get("full")
+        if result is None:
+            result = full_resolution_result(session)
+            session.cache_result("full", result)
+    analysis_store.updated(analysis_id)
+    return dict(result, analysis_id=analysis_id)
+
+
+@app.delete("/analyze/{analysis_id}")
+def delete_analysis(analysis_id: str):
+    if not analysis_store.delete(analysis_id):
+        return JSONResponse(status_code=404, content={"error": "Analysis not found or expired"})
+    return {"status": "deleted"}
+
+
+# What OpenCV / PIL raise for corrupt or unsupported input
+_DECODE_ERRORS = (ValueError, OSError, EOFError, cv2.error)
+
+
+def _analyze_clip(kind: str, frames, mode: str, heatmaps: bool):
+    """Same error mapping for GIFs and videos: bad input -> 400, anything else -> 500."""
+    try:
+        return analyze_frames(prefetch(frames), mode, heatmaps)
+    except _DECODE_ERRORS as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid {kind}: {e}"})
+    except Exception as e:
+        print(f"[Video Analysis Error] {e}")
+        return JSONResponse(status_code=500, content={"error": f"Analysis of the {kind} failed: {e}"})
+
+
+@app.post("/analyze-video")
+def analyze_video(
+    file: UploadFile = File(...),
+    mode: str = Query("basic", enum=["basic", "advanced"]),
+    sample_fps: float = Query(VIDEO_SAMPLE_FPS, gt=0, le=60),
+    heatmaps: bool = Query(False),
+):
+    """
+    Score timeline for a short video or animated GIF: frames are sampled at
+    sample_fps, near-duplicates reuse the previous result and each scene
+    becomes a segment. heatmaps=true adds the most suspicious frame's
+    heatmap to every segment.
+    """
+    upload = file.file
+    if is_gif(upload.read(6)):
+        upload.seek(0)
+        return _analyze_clip("GIF", iter_gif_frames(upload, sample_fps), mode, heatmaps)
+
+    # VideoCapture needs a path: stream the upload to a temp file
+    upload.seek(0)
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=JOB_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(upload, f, 1024 * 1024)
+        return _analyze_clip("video", iter_video_frames(path, sample_fps), mode, heatmaps)
+    finally:
+        os.remove(path)
+
+
+@app.post("/jobs", status_code=202)
+def create_job(
+    response: Response,
+    file: UploadFile = File(...),
+    mode: str = Query("basic", enum=["basic", "advanced"]),
+    priority: int = Form(0),
+    webhook_url: Optional[str] = Form(None),
+):
+    """
+    Queue an analysis and return immediately with a job ID.
+    Poll GET /jobs/{job_id}, or pass webhook_url to be notified.
+    """
+    contents = file.file.read()
+    try:
+        Image.open(io.BytesIO(contents)).verify()
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid image: {e}"})
+
+    path = os.path.join(JOB_SPOOL_DIR, f"{uuid.uuid4().hex}.upload")
+    with open(path, "wb") as f:
+        f.write(contents)
+    try:
+        job_id = job_queue.submit("image", {"path": path, "mode": mode},
+                                  priority=priority, webhook_url=webhook_url)
+    except ValueError as e:
+        os.remove(path)
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    response.headers["X-Job-Id"] = job_id
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or expired"})
+    return public_view(job)
+
+
+@app.get("/health")
+def health():
+    """Liveness + load for the dispatcher; 503 while draining."""
+    body = dict(worker_state, status="draining" if worker_state["draining"] else "ok",
+                cached_results=len(result_cache), scratch_pool_mb=round(scratch_pool_bytes() / 2**20, 1))
+    return JSONResponse(status_code=503 if worker_state["draining"] else 200, content=body)
+
+
+@app.post("/admin/drain")
+def drain(enable: bool = True):
+    """Stop taking new work from the dispatcher; in-flight requests still finish."""
+    worker_state["draining"] = enable
+    return {"draining": enable, "inflight": worker_state["inflight"]}
 
 
 @app.get("/")
@@ -191,4 +963,4 @@ def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8080")))
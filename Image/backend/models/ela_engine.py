@@ -0,0 +1,175 @@
+"""
+Multi-scale Error Level Analysis.
+
+- JPEG re-compression through OpenCV (libjpeg-turbo) instead of a PIL
+  save/open round-trip, with pooled scratch buffers (models/scratch.py) for the diff
+- Quality sweep fanned out over a thread pool (imencode/imdecode release
+  the GIL, so the qualities really run in parallel)
+- Per-8x8-block ELA mean/std from a strided (reshape) view, no copies
+- Optional original-quality estimate from the JPEG quantization tables,
+  which lets callers run a single re-save instead of the full sweep
+- The per-block map of the most telling quality is returned as a coarse
+  max-pooled grid, so clients can see where the outlier blocks are
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from models.scratch import scratch, scratch_scope
+
+DEFAULT_QUALITIES = (70, 80, 90, 95)
+BLOCK = 8
+GRID_MAX_SIDE = int(os.getenv("ELA_GRID_MAX_SIDE", "64"))
+
+_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="ela")
+
+# Annex K standard luminance quantization table (quality 50), natural order
+_STD_LUMA_QT = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+], dtype=np.float32)
+
+
+def _scaled_luma_table(quality: int) -> np.ndarray:
+    """libjpeg's quality -> quantization table scaling."""
+    scale = 5000.0 / quality if quality < 50 else 200.0 - 2.0 * quality
+    return np.clip(np.floor((_STD_LUMA_QT * scale + 50.0) / 100.0), 1, 255)
+
+
+def estimate_jpeg_quality(pil_img):
+    """
+    Estimate the libjpeg quality an image was saved with from its luminance
+    quantization table. Returns None for non-JPEG input or custom tables.
+    """
+    tables = getattr(pil_img, "quantization", None)
+    if not tables or 0 not in tables:
+        return None
+    luma = np.asarray(tables[0], dtype=np.float32)
+    if luma.size != 64:
+        return None
+    # Table order (zigzag vs natural) does not matter for a sorted comparison
+    luma_sorted = np.sort(luma)
+    best_q, best_err = None, None
+    for q in range(1, 101):
+        err = float(np.mean(np.abs(np.sort(_scaled_luma_table(q)) - luma_sorted)))
+        if best_err is None or err < best_err:
+            best_q, best_err = q, err
+    # Far from every libjpeg table -> custom encoder, don't trust the estimate
+    return best_q if best_err is not None and best_err < 2.0 else None
+
+
+def block_stats(ela_gray: np.ndarray, block: int = BLOCK, stripe_rows: int = 64):
+    """
+    Per-block mean/std of an ELA map, normalized to [0, 1] (float32 grids).
+    Works on horizontal stripes of `stripe_rows` blocks so the float32
+    temporaries stay small regardless of image size.
+    """
+    bh, bw = ela_gray.shape[0] // block, ela_gray.shape[1] // block
+    mean = np.zeros((bh, bw), dtype=np.float32)
+    std = np.zeros((bh, bw), dtype=np.float32)
+    for r0 in range(0, bh, stripe_rows):
+        r1 = min(bh, r0 + stripe_rows)
+        blocks = ela_gray[r0 * block:r1 * block, :bw * block].reshape(r1 - r0, block, bw, block)
+        m = blocks.mean(axis=(1, 3), dtype=np.float32)
+        sq = np.square(blocks, dtype=np.float32).mean(axis=(1, 3))
+        mean[r0:r1] = m
+        std[r0:r1] = np.sqrt(np.maximum(sq - m * m, 0.0))
+    mean /= 255.0
+    std /= 255.0
+    return mean, std
+
+
+@scratch_scope()
+def ela_single(bgr: np.ndarray, quality: int, with_blocks: bool = False) -> dict:
+    """Re-save `bgr` (uint8 HxWx3) at `quality`, return the grayscale ELA map + stats."""
+    ok, encoded = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError(f"JPEG encode failed at quality {quality}")
+    resaved = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+    diff = cv2.absdiff(bgr, resaved, dst=scratch("ela_diff", bgr.shape))
+    ela_gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
+    mean, std = cv2.meanStdDev(ela_gray)
+
+    result = {
+        "quality": int(quality),
+        "ela_gray": ela_gray,
+        "mean": float(mean[0, 0] / 255.0),
+        "std": float(std[0, 0] / 255.0),
+    }
+    if with_blocks:
+        result["block_mean"], result["block_std"] = block_stats(ela_gray)
+    return result
+
+
+def ela_sweep(bgr: np.ndarray, qualities=DEFAULT_QUALITIES, with_blocks: bool = True,
+              original_quality: int = None) -> dict:
+    """
+    ELA at several re-save qualities in parallel. If `original_quality` is
+    known (see estimate_jpeg_quality) only that quality is run — re-saving at
+    the original setting is where edited regions stand out the most.
+    Returns {quality: ela_single(...) result}.
+    """
+    if original_quality is not None:
+        qualities = (original_quality,)
+    futures = {q: _executor.submit(ela_single, bgr, q, with_blocks) for q in qualities}
+    return {q: f.result() for q, f in futures.items()}
+
+
+def outlier_threshold(res: dict) -> float:
+    """Block mean above which a block of an ela_single(with_blocks=True) result counts as an outlier."""
+    return float(np.median(res["block_mean"]) + 3.0 * res["block_std"].mean())
+
+
+def block_grid(block_mean: np.ndarray, max_side: int = GRID_MAX_SIDE):
+    """
+    Max-pool a per-block map to at most max_side cells per side, so a hot
+    block survives downsampling. Returns (uint8 grid scaled to 0-255,
+    blocks per cell side).
+    """
+    bh, bw = block_mean.shape
+    f = max(1, -(-max(bh, bw) // max_side))
+    gh, gw = -(-bh // f), -(-bw // f)
+    padded = np.zeros((gh * f, gw * f), dtype=np.float32)
+    padded[:bh, :bw] = block_mean
+    pooled = padded.reshape(gh, f, gw, f).max(axis=(1, 3))
+    return np.clip(np.rint(pooled * 255.0), 0, 255).astype(np.uint8), f
+
+
+def primary_quality(sweep: dict, original_quality: int = None):
+    """The sweep entry edits stand out in most: the original quality, else 90, else the highest."""
+    for q in (original_quality, 90):
+        if q in sweep:
+            return q
+    return max(sweep)
+
+
+def summarize_sweep(sweep: dict, original_quality: int = None) -> dict:
+    """
+    JSON-friendly summary of an ela_sweep() result. "block_grid" is the
+    primary quality's block-mean map (block_grid()); "cell" is the side of
+    one grid cell in pixels of the swept frame.
+    """
+    summary = {"estimated_quality": original_quality, "qualities": {}}
+    for q, res in sorted(sweep.items()):
+        entry = {"mean": round(res["mean"], 4), "std": round(res["std"], 4)}
+        if "block_mean" in res and res["block_mean"].size:
+            bm = res["block_mean"]
+            # Share of blocks far above the typical block error: localized edits
+            entry["outlier_blocks"] = round(float(np.mean(bm > outlier_threshold(res))), 4)
+            entry["block_mean_max"] = round(float(bm.max()), 4)
+        summary["qualities"][str(q)] = entry
+    q = primary_quality(sweep, original_quality) if sweep else None
+    if q is not None and "block_mean" in sweep[q] and sweep[q]["block_mean"].size:
+        grid, f = block_grid(sweep[q]["block_mean"])
+        summary["block_grid"] = {"quality": int(q), "cell": BLOCK * f, "values": grid.tolist()}
+    return summary
@@ -0,0 +1,149 @@
+"""
+Streaming frame sampling for video / animated GIF analysis.
+
+- Frames are decoded one at a time (cv2.VideoCapture for video files, PIL
+  ImageSequence for GIFs), so memory does not grow with clip length
+- Video frames between samples are only grab()bed, never converted to RGB
+- A 64-bit dHash per decoded frame drives both near-duplicate skipping
+  (small Hamming distance to the last analyzed frame -> reuse its result)
+  and scene-change detection (large distance -> new timeline segment)
+- Decoding runs on a background thread (prefetch) so it overlaps with
+  feature extraction on the caller's thread
+"""
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+
+def dhash(rgb: np.ndarray, size: int = 8) -> int:
+    """Difference hash: sign of horizontal gradients on a (size)x(size+1) thumbnail."""
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def is_gif(contents: bytes) -> bool:
+    return contents[:6] in (b"GIF87a", b"GIF89a")
+
+
+def iter_video_frames(path: str, sample_fps: float):
+    """
+    Yield (frame_index, timestamp_s, rgb) at roughly `sample_fps` from a
+    video file. Frames in between are grabbed (demuxed + decoded) but not
+    retrieved, which skips the colour conversion and copy.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("Cannot open video (unsupported container or codec)")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if fps <= 0 or fps > 1000:
+            fps = 30.0
+        stride = max(1, int(round(fps / sample_fps))) if sample_fps > 0 else 1
+        index = 0
+        while cap.grab():
+            if index % stride == 0:
+                ok, bgr = cap.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        cap.release()
+
+
+def iter_gif_frames(fp, sample_fps: float):
+    """
+    Yield (frame_index, timestamp_s, rgb) from an animated GIF, using the
+    per-frame durations. A frame is yielded when at least 1/sample_fps
+    seconds have passed since the previous yielded one.
+    """
+    # Time is kept in whole ms (GIF durations are integers), so summing
+    # 100 ms steps cannot drift below a sampling boundary
+    min_gap_ms = 1000.0 / sample_fps if sample_fps > 0 else 0.0
+    t_ms, next_ms = 0, 0.0
+    with Image.open(fp) as gif:
+        for index, frame in enumerate(ImageSequence.Iterator(gif)):
+            if t_ms >= next_ms:
+                yield index, t_ms / 1000.0, np.asarray(frame.convert("RGB"))
+                next_ms = t_ms + min_gap_ms
+            # Browsers clamp tiny delays to 100 ms
+            duration = int(frame.info.get("duration") or 100)
+            t_ms += duration if duration >= 20 else 100
+
+
+def prefetch(frames, depth: int = 4):
+    """Run a frame iterator on a background thread, buffering up to `depth` frames."""
+    buf = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in frames:
+                if stop.is_set():
+                    break
+                buf.put(item)
+        except Exception as e:
+            buf.put(e)
+        finally:
+            # Close the source generator here so its capture is released on this thread
+            if hasattr(frames, "close"):
+                frames.close()
+            buf.put(done)
+
+    threading.Thread(target=produce, daemon=True, name="frame-decode").start()
+    try:
+        while True:
+            item = buf.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Consumer stopped early: unblock and end the producer
+        stop.set()
+        while not buf.empty():
+            buf.get_nowait()
+
+
+def sample_frames(frames, dup_threshold: int = 4, scene_threshold: int = 18,
+                  max_gap_s: float = 2.0, max_frames: int = 600):
+    """
+    Classify a stream of (index, t, rgb) frames. Yields dicts with
+      index, t, rgb, hash, scene_change (starts a new segment), and
+      reuse (True -> near-duplicate of the last analyzed frame; rgb is None).
+    A near-duplicate is never a scene change.
+    A near-duplicate is still analyzed once `max_gap_s` has passed since the
+    last analyzed frame (periodic keyframe). At most `max_frames` frames are
+    analyzed: at the next one a final {"index", "t", "truncated": True} item
+    is yielded and the stream stops, so callers can report the cut.
+    """
+    last_hash, last_t, prev_hash, analyzed = None, None, None, 0
+    for index, t, rgb in frames:
+        h = dhash(rgb)
+        # Cuts are judged against the previous sampled frame (so slow pans
+        # stay one segment), duplicates against the last analyzed one (so
+        # small changes cannot accumulate unseen)
+        scene_change = prev_hash is None or hamming(h, prev_hash) >= scene_threshold
+        prev_hash = h
+        dist = 64 if last_hash is None else hamming(h, last_hash)
+        if dist <= dup_threshold and t - last_t < max_gap_s:
+            yield {"index": index, "t": t, "rgb": None, "hash": h, "scene_change": False, "reuse": True}
+            continue
+        if analyzed >= max_frames:
+            yield {"index": index, "t": t, "truncated": True}
+            return
+        analyzed += 1
+        last_hash, last_t = h, t
+        yield {"index": index, "t": t, "rgb": rgb, "hash": h, "scene_change": scene_change, "reuse": False}
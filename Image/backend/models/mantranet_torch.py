@@ -50,11 +50,41 @@ class ManTraNetTorch:
         if img is None:
             raise ValueError(f"Cannot load image from path: {image_path}")
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = cv2.resize(img, (256, 256))
+        return self.preprocess_array(img)
+
+    def preprocess_array(self, rgb):
+        """Normalizes an RGB uint8 array (any size) for inference"""
+        img = cv2.resize(rgb, (256, 256))
         img = img.astype(np.float32) / 255.0
-        tensor = torch.tensor(img).permute(2, 0, 1).unsqueeze(0).to(self.device)
+        tensor = torch.from_numpy(img).permute(2, 0, 1).unsqueeze(0).to(self.device)
         return tensor
 
+    def predict_maps(self, rgb_images):
+        """
+        Batched inference on RGB uint8 arrays.
+        Returns one float32 256x256 tamper map per image, normalized to [0, 1].
+        """
+        if len(rgb_images) == 0:
+            return []
+        batch = torch.cat([self.preprocess_array(img) for img in rgb_images], dim=0)
+        with torch.no_grad():
+            preds = self.model(batch).cpu().numpy()[:, 0]
+
+        maps = []
+        for pred in preds:
+            maps.append(((pred - pred.min()) / (pred.max() - pred.min() + 1e-8)).astype(np.float32))
+        return maps
+
+    def predict_map(self, rgb):
+        """Single-image tamper map (float32 256x256 in [0, 1])"""
+        return self.predict_maps([rgb])[0]
+
+    @staticmethod
+    def colorize(tamper_map):
+        """Apply colormap for visualization"""
+        heatmap_uint8 = (tamper_map * 255).astype(np.uint8)
+        return cv2.applyColorMap(heatmap_uint8, cv2.COLORMAP_JET)
+
     def predict_heatmap(self, image_path):
         """
         Runs the model and produces a normalized heatmap.
@@ -68,9 +98,4 @@ class ManTraNetTorch:
 
         # Normalize to [0, 1]
         heatmap = (pred - pred.min()) / (pred.max() - pred.min() + 1e-8)
-        heatmap_uint8 = (heatmap * 255).astype(np.uint8)
-
-        # Apply colormap for visualization
-        heatmap_color = cv2.applyColorMap(heatmap_uint8, cv2.COLORMAP_JET)
-
-        return heatmap_color
+        return self.colorize(heatmap)
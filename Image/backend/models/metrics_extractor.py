@@ -1,57 +1,89 @@
 import cv2
 import numpy as np
 
+METRIC_NAMES = [
+    "Noise Analysis", "JPEG Artifacts", "Color Inconsistency",
+    "Edge Discontinuity", "Lighting Mismatch", "Shadow Irregularity"
+]
+
+
+def _dct_matrix(n=8):
+    """Orthonormal DCT-II basis, same scaling as cv2.dct"""
+    k = np.arange(n, dtype=np.float32)[:, None]
+    x = np.arange(n, dtype=np.float32)[None, :]
+    d = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    d[0, :] = np.sqrt(1.0 / n)
+    return d.astype(np.float32)
+
+
+_DCT8 = _dct_matrix(8)
+
+
+def _dct_block_variance(gray, block_size=8, stripe_rows=64):
+    """Sum over full 8x8 blocks of var(dct(block)), one stripe of block rows at a time"""
+    bh, bw = gray.shape[0] // block_size, gray.shape[1] // block_size
+    total = 0.0
+    for r0 in range(0, bh, stripe_rows):
+        r1 = min(bh, r0 + stripe_rows)
+        stripe = gray[r0 * block_size:r1 * block_size, :bw * block_size]
+        blocks = stripe.reshape(r1 - r0, block_size, bw, block_size).transpose(0, 2, 1, 3).astype(np.float32)
+        coeffs = _DCT8 @ blocks @ _DCT8.T
+        total += float(coeffs.var(axis=(2, 3), dtype=np.float32).sum())
+    return total
+
+
 def compute_metrics(image, heatmap):
     # Ensure both are same size
     heatmap = cv2.resize(heatmap, (image.shape[1], image.shape[0]))
+    if heatmap.ndim == 3:
+        heatmap = cv2.cvtColor(heatmap, cv2.COLOR_RGB2GRAY)
     gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
 
     # Create binary tampered mask (top 10% confidence as tampered)
-    mask = (heatmap > np.percentile(heatmap, 90)).astype(np.uint8)
-
-    # Split regions
-    tampered = gray[mask == 1]
-    clean = gray[mask == 0]
+    # 0/255 uint8 masks let OpenCV compute the region statistics directly,
+    # without gathering the pixels of each region into new arrays
+    threshold = float(np.percentile(heatmap, 90))
+    mask_t = cv2.compare(heatmap, threshold, cv2.CMP_GT)
+    mask_c = cv2.bitwise_not(mask_t)
 
     # Safety checks
-    if len(tampered) == 0 or len(clean) == 0:
-        return {m: 0.0 for m in [
-            "Noise Analysis", "JPEG Artifacts", "Color Inconsistency",
-            "Edge Discontinuity", "Lighting Mismatch", "Shadow Irregularity"
-        ]}
+    n_tampered = cv2.countNonZero(mask_t)
+    if n_tampered == 0 or n_tampered == mask_t.size:
+        return {m: 0.0 for m in METRIC_NAMES}
 
     # ---- Compute Metrics ----
     def normalize(v): return float(np.clip(v * 100, 0, 100))
 
+    def region_means(src):
+        return np.array(cv2.mean(src, mask=mask_t)), np.array(cv2.mean(src, mask=mask_c))
+
     # 1️⃣ Noise (variance difference)
-    noise_conf = np.abs(np.var(tampered) - np.var(clean)) / np.var(clean + 1e-5)
+    _, std_t = cv2.meanStdDev(gray, mask=mask_t)
+    _, std_c = cv2.meanStdDev(gray, mask=mask_c)
+    var_t, var_c = float(std_t[0, 0]) ** 2, float(std_c[0, 0]) ** 2
+    noise_conf = abs(var_t - var_c) / max(var_c, 1e-12)
 
     # 2️⃣ JPEG Artifacts (block DCT discontinuity)
-    block_size = 8
-    dct_var = 0
-    for i in range(0, gray.shape[0], block_size):
-        for j in range(0, gray.shape[1], block_size):
-            block = gray[i:i+block_size, j:j+block_size]
-            if block.shape == (block_size, block_size):
-                dct = cv2.dct(np.float32(block))
-                dct_var += np.var(dct)
-    jpeg_conf = dct_var / (gray.shape[0] * gray.shape[1] / 64)
+    jpeg_conf = _dct_block_variance(gray) / (gray.shape[0] * gray.shape[1] / 64)
 
     # 3️⃣ Color inconsistency (mean RGB difference)
-    mean_diff = np.mean(np.abs(np.mean(image[mask == 1], axis=0) - np.mean(image[mask == 0], axis=0)))
-    color_conf = mean_diff / 128.0
+    rgb_t, rgb_c = region_means(image)
+    color_conf = np.mean(np.abs(rgb_t[:3] - rgb_c[:3])) / 128.0
 
-    # 4️⃣ Edge discontinuity
-    edges = cv2.Sobel(gray, cv2.CV_64F, 1, 1, ksize=3)
-    edge_conf = np.abs(np.mean(edges[mask == 1]) - np.mean(edges[mask == 0])) / 255.0
+    # 4️⃣ Edge discontinuity (int16 is exact for 3x3 Sobel on uint8)
+    edges = cv2.Sobel(gray, cv2.CV_16S, 1, 1, ksize=3)
+    edge_t, edge_c = region_means(edges)
+    edge_conf = abs(edge_t[0] - edge_c[0]) / 255.0
 
-    # 5️⃣ Lighting mismatch (V-channel gradient)
-    hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-    grad_v = cv2.Laplacian(hsv[:, :, 2], cv2.CV_64F)
-    light_conf = np.abs(np.mean(grad_v[mask == 1]) - np.mean(grad_v[mask == 0])) / 10.0
+    # 5️⃣ Lighting mismatch (V-channel gradient; V of HSV is max(R, G, B))
+    value = image.max(axis=2)
+    grad_v = cv2.Laplacian(value, cv2.CV_16S)
+    light_t, light_c = region_means(grad_v)
+    light_conf = abs(light_t[0] - light_c[0]) / 10.0
 
     # 6️⃣ Shadow irregularity (shadow value difference)
-    shadow_conf = np.abs(np.mean(hsv[:, :, 2][mask == 1]) - np.mean(hsv[:, :, 2][mask == 0])) / 50.0
+    shadow_t, shadow_c = region_means(value)
+    shadow_conf = abs(shadow_t[0] - shadow_c[0]) / 50.0
 
     return {
         "Noise Analysis": normalize(noise_conf),
@@ -0,0 +1,105 @@
+"""
+Per-worker scratch buffers for the image pipeline.
+
+One pool per process, shared by every thread (FastAPI threadpool, ELA
+executor, job workers). Work runs inside `scratch_scope()`: the first
+scratch(name, shape, dtype) call in a scope takes a matching free buffer
+from the pool (or allocates one), and the scope hands them all back when it
+exits. Consecutive requests with the same image shape (the common case for
+a given camera/upload size) reuse memory instead of allocating several
+full-size temporaries per request.
+
+Free buffers are kept only up to SCRATCH_POOL_MB (least recently returned
+go first), so idle threads hold nothing and one huge image cannot pin its
+buffers forever. Outside a scope scratch() just allocates.
+
+Never keep a scratch buffer past its scope: another thread gets it next.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+SCRATCH_POOL_BYTES = int(float(os.getenv("SCRATCH_POOL_MB", "256")) * 1024 * 1024)
+
+_local = threading.local()
+_lock = threading.Lock()
+_free = OrderedDict()   # (name, shape, dtype) -> [free buffers]
+_free_bytes = 0
+
+
+def _acquire(key) -> np.ndarray:
+    global _free_bytes
+    with _lock:
+        buffers = _free.get(key)
+        if buffers:
+            buf = buffers.pop()
+            if not buffers:
+                del _free[key]
+            _free_bytes -= buf.nbytes
+            return buf
+    _, shape, dtype = key
+    return np.empty(shape, dtype=dtype)
+
+
+def _release(key, buf: np.ndarray):
+    global _free_bytes
+    if buf.nbytes > SCRATCH_POOL_BYTES:
+        return
+    with _lock:
+        _free.setdefault(key, []).append(buf)
+        _free.move_to_end(key)
+        _free_bytes += buf.nbytes
+        while _free_bytes > SCRATCH_POOL_BYTES:
+            old_key, buffers = next(iter(_free.items()))
+            _free_bytes -= buffers.pop(0).nbytes
+            if not buffers:
+                del _free[old_key]
+
+
+@contextmanager
+def scratch_scope():
+    """Lend pool buffers to scratch() calls on this thread until exit (also a decorator)."""
+    if getattr(_local, "held", None) is not None:
+        # Nested: the outermost scope owns the buffers
+        yield
+        return
+    _local.held = {}
+    try:
+        yield
+    finally:
+        held, _local.held = _local.held, None
+        for key, buf in held.values():
+            _release(key, buf)
+
+
+def scratch(name: str, shape, dtype=np.uint8) -> np.ndarray:
+    """Uninitialized array for `name` with the given shape/dtype, reused within the scope."""
+    key = (name, tuple(shape), np.dtype(dtype))
+    held = getattr(_local, "held", None)
+    if held is None:
+        return np.empty(key[1], dtype=key[2])
+    entry = held.get(name)
+    if entry is not None:
+        if entry[0] == key:
+            return entry[1]
+        _release(*entry)
+    buf = _acquire(key)
+    held[name] = (key, buf)
+    return buf
+
+
+def pool_bytes() -> int:
+    """Bytes held by free buffers in the pool."""
+    return _free_bytes
+
+
+def release_all():
+    """Drop every free buffer in the pool (buffers lent to open scopes are unaffected)."""
+    global _free_bytes
+    with _lock:
+        _free.clear()
+        _free_bytes = 0
@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+
+from analysis_store import AnalysisStore
+
+MB = 1024 * 1024
+
+
+def _arrays(mb=1):
+    return {"rgb": np.zeros(mb * MB, dtype=np.uint8)}
+
+
+def test_least_recently_used_session_goes_first():
+    store = AnalysisStore(max_bytes=int(2.5 * MB))
+    a, b = store.create(_arrays(), {}), store.create(_arrays(), {})
+    assert store.get(a) is not None          # a is now more recent than b
+    c = store.create(_arrays(), {})
+    assert store.get(b) is None
+    assert store.get(a) is not None and store.get(c) is not None
+    assert store.total_bytes() <= 2.5 * MB
+
+
+def test_new_session_over_budget_evicts_everything_else_but_stays():
+    store = AnalysisStore(max_bytes=2 * MB)
+    a = store.create(_arrays(), {})
+    big = store.create(_arrays(3), {})
+    assert store.get(a) is None
+    assert store.get(big) is not None
+
+
+def test_growing_session_drops_its_caches_when_alone_over_budget():
+    store = AnalysisStore(max_bytes=2 * MB)
+    sid = store.create(_arrays(), {})
+    session = store.get(sid)
+    with session.lock:
+        session.add_tile((256, 0, 0), np.zeros(MB // 2, dtype=np.float32))
+    store.updated(sid)
+    assert session.tiles == {}
+    assert session.nbytes() == store.total_bytes() < 2 * MB
+
+
+def test_byte_count_tracks_mutators():
+    store = AnalysisStore(max_bytes=100 * MB)
+    session = store.get(store.create({"upload": b"x" * 1000}, {"shape": [40, 50, 3]}))
+    assert session.nbytes() == 1000 and session.shape == (40, 50, 3)
+    session.set_array("rgb", np.zeros((40, 50, 3), dtype=np.uint8))
+    session.drop_array("upload")
+    session.cache_result("full", {"heatmap": "y" * 500})
+    assert session.nbytes() == 40 * 50 * 3 + 500
+    assert session.shape == (40, 50, 3)
+
+
+def test_expired_sessions_are_gone():
+    store = AnalysisStore(ttl=0.05)
+    sid = store.create(_arrays(), {})
+    time.sleep(0.1)
+    assert store.get(sid) is None
+    assert store.total_bytes() == 0
+
+
+def test_aliases_share_one_session_and_survive_each_others_delete():
+    store = AnalysisStore(max_bytes=int(1.5 * MB))
+    first = store.create(_arrays(), {})
+    second = store.alias(first)
+    assert second != first and store.get(second) is store.get(first)
+    assert store.total_bytes() < 1.5 * MB     # counted once
+    assert store.delete(first)
+    assert not store.delete(first)
+    assert store.get(second) is not None
+    assert store.alias("missing") is None
+    # A new session evicts the old one only once its last ID goes
+    third = store.create(_arrays(), {})
+    assert store.get(second) is None and store.get(third) is not None
@@ -0,0 +1,46 @@
+import hashlib
+
+import pytest
+
+pytest.importorskip("httpx")
+from dispatcher import Dispatcher, HashRing, Worker  # noqa: E402
+
+URLS = [f"http://127.0.0.1:{8081 + i}" for i in range(4)]
+KEYS = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(2000)]
+
+
+def _owners(ring):
+    return {k: ring.candidates(k)[0].url for k in KEYS}
+
+
+def test_removing_a_worker_only_moves_its_keys():
+    workers = [Worker(u) for u in URLS]
+    before = _owners(HashRing(workers))
+    gone = URLS[1]
+    after = _owners(HashRing([w for w in workers if w.url != gone]))
+    moved = [k for k in KEYS if before[k] != after[k]]
+    assert moved and all(before[k] == gone for k in moved)
+    assert all(after[k] != gone for k in KEYS)
+    # Virtual nodes spread the keys: no worker owns more than twice its fair share
+    for url in URLS:
+        assert sum(1 for k in KEYS if before[k] == url) < 2 * len(KEYS) / len(URLS)
+
+
+def test_removed_workers_keys_go_to_their_next_candidate():
+    workers = [Worker(u) for u in URLS]
+    full = HashRing(workers)
+    reduced = HashRing([w for w in workers if w.url != URLS[2]])
+    for k in KEYS:
+        order = [w.url for w in full.candidates(k)]
+        assert len(order) == len(URLS) == len(set(order))
+        expected = order[1] if order[0] == URLS[2] else order[0]
+        assert reduced.candidates(k)[0].url == expected
+
+
+def test_pick_skips_a_draining_owner_without_moving_other_keys():
+    dispatcher = Dispatcher(URLS)
+    before = {k: dispatcher.pick(k).url for k in KEYS}
+    dispatcher.workers[0].draining = True
+    after = {k: dispatcher.pick(k).url for k in KEYS}
+    assert all(after[k] == before[k] for k in KEYS if before[k] != URLS[0])
+    assert all(after[k] != URLS[0] for k in KEYS)
@@ -0,0 +1,86 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from models.ela_engine import (block_grid, ela_single, ela_sweep, estimate_jpeg_quality,
+                               summarize_sweep)
+
+
+def _photo(h=240, w=320, seed=0):
+    """Smooth gradients plus mild noise: compresses like a photo, not like white noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    base = np.stack([x / w * 200, y / h * 180, (x + y) / (w + h) * 220], axis=2)
+    return np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8)
+
+
+def _pil_ela(rgb, quality):
+    """The original PIL save/open implementation from main.py."""
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, format="JPEG", quality=quality)
+    buf.seek(0)
+    resaved = np.asarray(Image.open(buf).convert("RGB")).astype(np.int16)
+    ela_gray = cv2.cvtColor(np.abs(rgb.astype(np.int16) - resaved).astype(np.uint8), cv2.COLOR_RGB2GRAY)
+    return ela_gray, float(np.mean(ela_gray) / 255.0), float(np.std(ela_gray) / 255.0)
+
+
+@pytest.mark.parametrize("quality", [70, 90, 95])
+def test_ela_matches_pil_baseline(quality):
+    rgb = _photo()
+    base_map, base_mean, base_std = _pil_ela(rgb, quality)
+    res = ela_single(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), quality, with_blocks=True)
+    # Same libjpeg settings; only the encoder build may differ by a code value here and there
+    assert res["mean"] == pytest.approx(base_mean, abs=2e-3)
+    assert res["std"] == pytest.approx(base_std, abs=2e-3)
+    assert np.mean(np.abs(res["ela_gray"].astype(np.int16) - base_map)) < 0.5
+    assert res["block_mean"].shape == (240 // 8, 320 // 8)
+    assert res["block_mean"].mean() == pytest.approx(res["mean"], abs=1e-4)
+
+
+def test_ela_result_is_not_a_scratch_buffer():
+    bgr = cv2.cvtColor(_photo(), cv2.COLOR_RGB2BGR)
+    first = ela_single(bgr, 90)["ela_gray"]
+    kept = first.copy()
+    ela_single(bgr[::-1].copy(), 90)
+    np.testing.assert_array_equal(first, kept)
+
+
+@pytest.mark.parametrize("quality", [30, 50, 75, 85, 90, 95])
+def test_estimate_jpeg_quality(quality):
+    buf = io.BytesIO()
+    Image.fromarray(_photo()).save(buf, format="JPEG", quality=quality)
+    assert estimate_jpeg_quality(Image.open(io.BytesIO(buf.getvalue()))) == quality
+
+
+def test_estimate_jpeg_quality_rejects_non_jpeg_and_custom_tables():
+    buf = io.BytesIO()
+    Image.fromarray(_photo()).save(buf, format="PNG")
+    assert estimate_jpeg_quality(Image.open(io.BytesIO(buf.getvalue()))) is None
+
+    flat = {0: [7] * 64, 1: [7] * 64}
+    buf = io.BytesIO()
+    Image.fromarray(_photo()).save(buf, format="JPEG", qtables=flat)
+    assert estimate_jpeg_quality(Image.open(io.BytesIO(buf.getvalue()))) is None
+
+
+def test_sweep_runs_only_the_original_quality_when_known():
+    bgr = cv2.cvtColor(_photo(), cv2.COLOR_RGB2BGR)
+    assert sorted(ela_sweep(bgr)) == [70, 80, 90, 95]
+    sweep = ela_sweep(bgr, original_quality=85)
+    assert list(sweep) == [85]
+    summary = summarize_sweep(sweep, 85)
+    assert summary["estimated_quality"] == 85
+    assert summary["block_grid"]["quality"] == 85
+
+
+def test_block_grid_keeps_a_hot_block_when_downsampling():
+    block_mean = np.zeros((300, 200), dtype=np.float32)
+    block_mean[123, 45] = 0.5
+    grid, f = block_grid(block_mean, max_side=64)
+    assert f == 5
+    assert grid.shape == (60, 40)
+    assert grid[123 // f, 45 // f] == 128
+    assert grid.sum() == 128
@@ -0,0 +1,63 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from models.frame_sampler import iter_gif_frames, prefetch, sample_frames
+
+W, H = 64, 48
+
+
+def _scene(seed):
+    """A distinct blocky scene (dHash needs real gradients, not noise)."""
+    rng = np.random.default_rng(seed)
+    return np.kron(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8), np.ones((8, 8, 1), dtype=np.uint8))
+
+
+def _gif(frames, duration=100):
+    buf = io.BytesIO()
+    images = [Image.fromarray(f) for f in frames]
+    images[0].save(buf, format="GIF", save_all=True, append_images=images[1:], duration=duration, loop=0)
+    buf.seek(0)
+    return buf
+
+
+def _nudged(rgb, corner=0):
+    # A few pixels change: a near-duplicate, but not byte-identical (the GIF
+    # writer merges identical consecutive frames)
+    out = rgb.astype(np.int16)
+    out[corner:corner + 2, :2] += 3
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def test_gif_duplicates_are_reused_and_cuts_start_segments():
+    a, b = _scene(1), _scene(2)
+    frames = [a, _nudged(a), _nudged(a, 10), b, _nudged(b), a]
+    items = list(sample_frames(iter_gif_frames(_gif(frames), sample_fps=100)))
+    assert [i["index"] for i in items] == list(range(6))
+    assert [i["reuse"] for i in items] == [False, True, True, False, True, False]
+    assert [i["scene_change"] for i in items] == [True, False, False, True, False, True]
+    assert all(i["rgb"] is None for i in items if i["reuse"])
+    assert items[0]["rgb"].shape == (H, W, 3)
+
+
+def test_gif_sampling_follows_frame_durations():
+    frames = [_scene(i) for i in range(10)]
+    sampled = list(iter_gif_frames(_gif(frames, duration=100), sample_fps=5))
+    assert [index for index, _, _ in sampled] == [0, 2, 4, 6, 8]
+    assert [round(t, 3) for _, t, _ in sampled] == [0.0, 0.2, 0.4, 0.6, 0.8]
+
+
+def test_static_gif_still_gets_periodic_keyframes():
+    a = _scene(3)
+    frames = ((i, i * 0.5, a) for i in range(9))   # 4 s of one still image
+    items = list(sample_frames(frames, max_gap_s=2.0))
+    assert [i["t"] for i in items if not i["reuse"]] == [0.0, 2.0, 4.0]
+    assert not any(i["scene_change"] for i in items[1:])
+
+
+def test_max_frames_truncates_the_stream():
+    frames = ((i, i * 0.1, _scene(i)) for i in range(10))
+    items = list(sample_frames(prefetch(frames), max_frames=3))
+    assert [i.get("truncated", False) for i in items] == [False, False, False, True]
+    assert items[-1]["index"] == 3
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from models.metrics_extractor import METRIC_NAMES, compute_metrics
+
+
+def _baseline_metrics(image, heatmap):
+    """compute_metrics as first written (per-block cv2.dct loop, boolean-mask gathers)."""
+    heatmap = cv2.resize(heatmap, (image.shape[1], image.shape[0]))
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    mask = (heatmap > np.percentile(heatmap, 90)).astype(np.uint8)
+    tampered, clean = gray[mask == 1], gray[mask == 0]
+
+    def normalize(v): return float(np.clip(v * 100, 0, 100))
+
+    noise_conf = np.abs(np.var(tampered) - np.var(clean)) / np.var(clean + 1e-5)
+    dct_var = 0
+    for i in range(0, gray.shape[0], 8):
+        for j in range(0, gray.shape[1], 8):
+            block = gray[i:i + 8, j:j + 8]
+            if block.shape == (8, 8):
+                dct_var += np.var(cv2.dct(np.float32(block)))
+    jpeg_conf = dct_var / (gray.shape[0] * gray.shape[1] / 64)
+    color_conf = np.mean(np.abs(np.mean(image[mask == 1], axis=0) - np.mean(image[mask == 0], axis=0))) / 128.0
+    edges = cv2.Sobel(gray, cv2.CV_64F, 1, 1, ksize=3)
+    edge_conf = np.abs(np.mean(edges[mask == 1]) - np.mean(edges[mask == 0])) / 255.0
+    hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+    grad_v = cv2.Laplacian(hsv[:, :, 2], cv2.CV_64F)
+    light_conf = np.abs(np.mean(grad_v[mask == 1]) - np.mean(grad_v[mask == 0])) / 10.0
+    shadow_conf = np.abs(np.mean(hsv[:, :, 2][mask == 1]) - np.mean(hsv[:, :, 2][mask == 0])) / 50.0
+    return dict(zip(METRIC_NAMES, map(normalize, (noise_conf, jpeg_conf, color_conf,
+                                                   edge_conf, light_conf, shadow_conf))))
+
+
+def _fixed_image():
+    rng = np.random.default_rng(7)
+    image = cv2.resize(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8), (203, 157),
+                       interpolation=cv2.INTER_CUBIC)
+    # A pasted, darker and noisier patch for the tampered region
+    image[40:90, 60:130] = np.clip(image[40:90, 60:130] * 0.6 + rng.normal(0, 12, (50, 70, 3)), 0, 255)
+    heatmap = np.zeros((64, 80), dtype=np.float32)
+    heatmap[16:37, 24:52] = 1.0
+    heatmap += rng.random(heatmap.shape, dtype=np.float32) * 0.2
+    return image, heatmap
+
+
+def test_compute_metrics_matches_baseline():
+    image, heatmap = _fixed_image()
+    expected = _baseline_metrics(image, heatmap)
+    got = compute_metrics(image, heatmap)
+    assert list(got) == METRIC_NAMES
+    for name in METRIC_NAMES:
+        assert got[name] == pytest.approx(expected[name], rel=1e-4, abs=1e-3), name
+    # The comparison means something: metrics in range, not clipped to 0 or 100
+    for name in ("Noise Analysis", "Color Inconsistency", "Lighting Mismatch"):
+        assert 0.0 < got[name] < 100.0, name
+
+
+def test_compute_metrics_uniform_heatmap_is_all_zero():
+    image, _ = _fixed_image()
+    assert compute_metrics(image, np.ones((10, 10), dtype=np.float32)) == {m: 0.0 for m in METRIC_NAMES}
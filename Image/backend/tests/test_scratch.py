@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pytest
+
+from models import scratch as pool
+from models.scratch import scratch, scratch_scope
+
+
+@pytest.fixture(autouse=True)
+def empty_pool():
+    pool.release_all()
+    yield
+    pool.release_all()
+
+
+def test_buffers_are_reused_by_the_next_scope():
+    with scratch_scope():
+        first = scratch("diff", (32, 32, 3))
+        assert scratch("diff", (32, 32, 3)) is first   # same name + shape within a scope
+    assert pool.pool_bytes() == first.nbytes
+    with scratch_scope():
+        assert scratch("diff", (32, 32, 3)) is first
+    with scratch_scope():
+        other = scratch("diff", (16, 16, 3))           # different shape: new buffer
+        assert other is not first
+
+
+def test_distinct_names_never_share_memory():
+    with scratch_scope():
+        a = scratch("a", (64, 64))
+        b = scratch("b", (64, 64))
+        assert not np.shares_memory(a, b)
+
+
+def test_concurrent_scopes_never_alias():
+    with scratch_scope():
+        scratch("diff", (32, 32))   # seed the pool with one free buffer
+    inside, release = threading.Barrier(2), threading.Event()
+    held = {}
+
+    def worker():
+        with scratch_scope():
+            held["thread"] = scratch("diff", (32, 32))
+            held["thread"][:] = 1
+            inside.wait()
+            release.wait()
+            held["untouched"] = bool((held["thread"] == 1).all())
+
+    t = threading.Thread(target=worker)
+    t.start()
+    inside.wait()
+    with scratch_scope():
+        mine = scratch("diff", (32, 32))
+        mine[:] = 2
+        assert not np.shares_memory(mine, held["thread"])
+    release.set()
+    t.join()
+    assert held["untouched"]   # nobody wrote into the other thread's buffer meanwhile
+    # Both came back to the pool
+    assert pool.pool_bytes() == 2 * 32 * 32
+
+
+def test_nested_scope_keeps_the_outer_buffers():
+    with scratch_scope():
+        outer = scratch("gray", (8, 8))
+        with scratch_scope():
+            assert scratch("gray", (8, 8)) is outer
+        assert pool.pool_bytes() == 0   # still lent to the outer scope
+        with scratch_scope():
+            assert not np.shares_memory(scratch("edges", (8, 8)), outer)
+
+
+def test_outside_a_scope_every_call_allocates():
+    assert scratch("x", (4, 4)) is not scratch("x", (4, 4))
+    assert pool.pool_bytes() == 0
+
+
+def test_pool_is_bounded(monkeypatch):
+    monkeypatch.setattr(pool, "SCRATCH_POOL_BYTES", 1000)
+    for name in ("a", "b", "c"):
+        with scratch_scope():
+            scratch(name, (400,))
+    # Oldest returned buffer was dropped to stay under the budget
+    assert pool.pool_bytes() == 800
+    with scratch_scope():
+        scratch("big", (2000,))
+    assert pool.pool_bytes() == 800   # larger than the whole pool: never kept
@@ -0,0 +1,10 @@
+# app/__init__.py
+import os
+import sys
+
+# Shared backend modules live in <repo>/common (`pip install -e common`);
+# fall back to the checkout so the service also runs straight from the repo
+try:
+    import misinfo_common  # noqa: F401
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "common"))
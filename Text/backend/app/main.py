@@ -1,6 +1,6 @@
 # app/main.py
 from fastapi import FastAPI
-from app.routes import text_verify
+from app.routes import text_verify, jobs
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -21,6 +21,16 @@ app.add_middleware(
 
 # Include API routes
 app.include_router(text_verify.router)
+app.include_router(jobs.router)
+
+# Background workers for /api/jobs
+@app.on_event("startup")
+def start_job_workers():
+    jobs.job_queue.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    jobs.job_queue.stop()
 
 @app.get("/")
 def root():
@@ -0,0 +1,64 @@
+# app/routes/jobs.py
+from typing import Optional
+from fastapi import APIRouter
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from app.routes.text_verify import run_text_verification
+from misinfo_common.job_queue import JobQueue, Deferred, public_view
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Jobs"]
+)
+
+job_queue = JobQueue()
+
+# Job priority orders the queue; towards the LLM scheduler jobs always rank
+# below interactive requests (priority 1) and stay sheddable
+JOB_LLM_MAX_PRIORITY = 0
+
+
+def handle_text_job(payload: dict) -> dict:
+    """
+    Worker-side text verification. Rate limiting defers the job until the
+    upstream's retry delay without spending an attempt; outages raise and
+    are retried with backoff.
+    """
+    priority = min(int(payload.get("priority", 0)), JOB_LLM_MAX_PRIORITY)
+    result = run_text_verification(payload["text"], priority)
+    if result.get("verdict") == "Rate Limited":
+        raise Deferred("Upstream model rate limited", retry_after=result.get("retry_after", 5.0))
+    if result.get("verdict") == "System Unavailable":
+        raise RuntimeError("Upstream model system unavailable")
+    return result
+
+
+job_queue.register("text", handle_text_job)
+
+
+class TextJobInput(BaseModel):
+    text: str
+    priority: int = 0
+    webhook_url: Optional[str] = None
+
+
+@router.post("/jobs", status_code=202)
+def create_job(request: TextJobInput):
+    """
+    Queue a text verification and return immediately with a job ID.
+    Poll GET /api/jobs/{job_id}, or pass webhook_url to be notified.
+    """
+    try:
+        job_id = job_queue.submit("text", {"text": request.text, "priority": request.priority},
+                                  priority=request.priority, webhook_url=request.webhook_url)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or expired"})
+    return public_view(job)
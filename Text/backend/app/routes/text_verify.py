@@ -2,6 +2,8 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from app.utils.verifier import verify_claim_with_gemini
+from app.utils.triage import triage_claim, known_verdicts
+from misinfo_common.stage_timer import StageTimer
 from fastapi.responses import JSONResponse
 
 router = APIRouter(
@@ -12,10 +14,29 @@ router = APIRouter(
 class TextInput(BaseModel):
     text: str
 
+def run_text_verification(text: str, priority: int = 1, timer: StageTimer = None) -> dict:
+    """Triage, then Gemini if needed. Shared by the sync route and the job worker."""
+    timer = timer or StageTimer()
+    result = triage_claim(text)
+    timer.mark("triage")
+    if result is None:
+        result = verify_claim_with_gemini(text, priority, timer)
+        known_verdicts.remember(text, result)
+    return result
+
+
 @router.post("/verify-text")
 def verify_text(request: TextInput):
     """
     Endpoint to verify if a given text is true or misinformation.
+    Inputs that the local triage stage can answer never reach Gemini;
+    the response's "stage" field says which stage answered, and the
+    Server-Timing header how long each step took.
     """
-    result = verify_claim_with_gemini(request.text)
-    return JSONResponse(content=result)
+    timer = StageTimer()
+    result = run_text_verification(request.text, timer=timer)
+    headers = {"Server-Timing": timer.header()}
+    if result.get("verdict") == "Rate Limited":
+        headers["Retry-After"] = str(max(1, round(result["retry_after"])))
+        return JSONResponse(status_code=429, content=result, headers=headers)
+    return JSONResponse(content=result, headers=headers)
@@ -0,0 +1,530 @@
+# app/utils/evidence_index.py
+"""
+Offline evidence store for fact-checking.
+
+A BM25 inverted index (plus an optional hashed-vector index when numpy is
+available) over a local corpus of fact-check articles / reference snippets.
+Runs fully offline — no network access needed.
+
+On-disk layout (one directory):
+    docs.jsonl        raw documents, one JSON object per line
+    offsets.bin       uint64 byte offset of every document in docs.jsonl
+    doclens.bin       uint32 token count of every document
+    vectors.f32       float32 [N, VECTOR_DIM] hashed vectors (when meta has_vectors)
+    meta.json         corpus statistics + segment list
+    seg_XXXX/         one segment per ingest() call
+        lexicon.json  term -> [offset, count] into postings.bin
+        postings.bin  packed uint32 (doc_no, tf) pairs
+
+Every ingest() writes a new immutable segment, so ingestion is incremental;
+compact() merges all segments back into one. Postings and doc tables are
+memory-mapped, so opening a large index is cheap and queries only touch the
+pages they need. With numpy, BM25 scores each term's postings as one
+vectorised slice of the mapped file instead of a Python loop per posting.
+
+Files are appended in the order above and meta.json is replaced last, so it
+is the commit point: num_docs / docs_bytes say how much of each file is
+real. A crash mid-ingest can leave extra rows past those sizes; readers
+never look at them and the next ingest() truncates them away. Vectors are written on every ingest regardless of
+use_vectors (which only controls searching), so vectors.f32 always has one
+row per document; an index ingested without numpy is marked has_vectors=false
+and stays BM25-only.
+
+CLI:
+    python -m app.utils.evidence_index ingest corpus.jsonl [--index DIR]
+    python -m app.utils.evidence_index query "some claim" [--index DIR]
+    python -m app.utils.evidence_index compact [--index DIR]
+"""
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import shutil
+import threading
+import zlib
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # vector index is optional
+    np = None
+
+DEFAULT_INDEX_DIR = os.getenv(
+    "EVIDENCE_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "evidence_index"),
+)
+
+VECTOR_DIM = 512
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have he her his i in is it its "
+    "of on or she that the their they this to was were will with you your not no "
+    "do does did so than then there these those which who whom what when where why how".split()
+)
+
+
+def tokenize(text: str):
+    """Lowercase word tokens with stopwords dropped."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _hashed_vector(tokens):
+    """Signed feature-hashing of unigrams + bigrams, L2 normalised."""
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    feats = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+    for f in feats:
+        h = zlib.crc32(f.encode("utf-8"))
+        vec[h % VECTOR_DIM] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+def _mmap_array(path: str, typecode: str):
+    """Memory-map a packed binary file as a typed memoryview (empty if missing)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None, memoryview(array(typecode))
+    f = open(path, "rb")
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    f.close()
+    return mm, memoryview(mm).cast(typecode)
+
+
+class _Segment:
+    """One immutable on-disk postings segment."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "lexicon.json"), "r", encoding="utf-8") as f:
+            self.lexicon = json.load(f)
+        self._mm, self.postings = _mmap_array(os.path.join(path, "postings.bin"), "I")
+        # [count, 2] (doc_no, tf) view of the same pages for vectorised scoring
+        self.pairs = None
+        if np is not None and self._mm is not None:
+            self.pairs = np.frombuffer(self._mm, dtype=np.uint32).reshape(-1, 2)
+
+    def df(self, term: str) -> int:
+        entry = self.lexicon.get(term)
+        return entry[1] if entry else 0
+
+    def iter_postings(self, term: str):
+        entry = self.lexicon.get(term)
+        if not entry:
+            return
+        start, count = entry
+        view = self.postings[start * 2:(start + count) * 2]
+        for i in range(0, count * 2, 2):
+            yield view[i], view[i + 1]
+
+    def close(self):
+        self.pairs = None  # numpy views pin the mmap until dropped
+        self.postings.release()
+        if self._mm is not None:
+            self._mm.close()
+
+    @staticmethod
+    def write(path: str, term_postings: dict):
+        """Write a segment from {term: [(doc_no, tf), ...]} (doc_no ascending)."""
+        os.makedirs(path, exist_ok=True)
+        lexicon = {}
+        flat = array("I")
+        for term in sorted(term_postings):
+            plist = term_postings[term]
+            lexicon[term] = [len(flat) // 2, len(plist)]
+            for doc_no, tf in plist:
+                flat.append(doc_no)
+                flat.append(tf)
+        with open(os.path.join(path, "postings.bin"), "wb") as f:
+            flat.tofile(f)
+        with open(os.path.join(path, "lexicon.json"), "w", encoding="utf-8") as f:
+            json.dump(lexicon, f, separators=(",", ":"))
+
+
+class EvidenceIndex:
+    """
+    Local BM25 (+ optional vector) evidence index.
+
+    Documents are dicts with at least "text"; "id", "title", "source", "url"
+    and "verdict" are kept and returned with hits. Documents whose "id" is
+    already indexed are skipped on ingest.
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, use_vectors: bool = True):
+        self.index_dir = os.path.abspath(index_dir)
+        self.use_vectors = use_vectors and np is not None
+        self._lock = threading.RLock()
+        self._segments = []
+        self._maps = []
+        self._known_ids = None
+        self.meta = {"num_docs": 0, "total_len": 0, "segments": [], "vector_dim": VECTOR_DIM,
+                     "has_vectors": np is not None}
+        self._open()
+
+    # ---------- open / close ----------
+
+    def _p(self, *parts):
+        return os.path.join(self.index_dir, *parts)
+
+    def _open(self):
+        with self._lock:
+            self._close_maps()
+            if os.path.exists(self._p("meta.json")):
+                with open(self._p("meta.json"), "r", encoding="utf-8") as f:
+                    self.meta = json.load(f)
+                if "has_vectors" not in self.meta:
+                    # Older indexes: trust vectors.f32 only if it has a row per document
+                    self.meta["has_vectors"] = self._vector_file_ok()
+            self._segments = [_Segment(self._p(name)) for name in self.meta["segments"]]
+            mm, self._offsets = _mmap_array(self._p("offsets.bin"), "Q")
+            self._maps.append(mm)
+            mm, self._doclens = _mmap_array(self._p("doclens.bin"), "I")
+            self._maps.append(mm)
+            n = self.meta["num_docs"]
+            self._doclens_np = None
+            if np is not None and mm is not None:
+                self._doclens_np = np.frombuffer(mm, dtype=np.uint32, count=n)
+            self._vectors = None
+            if self.use_vectors and n and self.meta["has_vectors"]:
+                if self._vector_file_ok():
+                    self._vectors = np.memmap(self._p("vectors.f32"), dtype=np.float32,
+                                              mode="r", shape=(n, self.meta["vector_dim"]))
+                else:
+                    print(f"[Evidence Index] {self._p('vectors.f32')} does not match {n} documents; "
+                          "vector search disabled")
+            self._docs_fh = open(self._p("docs.jsonl"), "rb") if n else None
+
+    def _vector_file_ok(self) -> bool:
+        path = self._p("vectors.f32")
+        expected = self.meta["num_docs"] * self.meta["vector_dim"] * 4
+        # Rows past num_docs are left over from an interrupted ingest and are never read
+        return os.path.exists(path) and os.path.getsize(path) >= expected
+
+    def _close_maps(self):
+        for seg in self._segments:
+            seg.close()
+        self._segments = []
+        self._doclens_np = None
+        for view in (getattr(self, "_offsets", None), getattr(self, "_doclens", None)):
+            if view is not None:
+                view.release()
+        for mm in self._maps:
+            if mm is not None:
+                mm.close()
+        self._maps = []
+        self._vectors = None
+        fh = getattr(self, "_docs_fh", None)
+        if fh is not None:
+            fh.close()
+        self._docs_fh = None
+
+    def close(self):
+        with self._lock:
+            self._close_maps()
+
+    def __len__(self):
+        return self.meta["num_docs"]
+
+    # ---------- ingestion ----------
+
+    def _load_known_ids(self):
+        if self._known_ids is None:
+            self._known_ids = set()
+            if os.path.exists(self._p("docs.jsonl")):
+                with open(self._p("docs.jsonl"), "r", encoding="utf-8") as f:
+                    for line in f:
+                        doc_id = json.loads(line).get("id")
+                        if doc_id is not None:
+                            self._known_ids.add(str(doc_id))
+        return self._known_ids
+
+    def _committed_sizes(self) -> dict:
+        """Byte size of every data file as of the last meta.json write."""
+        n = self.meta["num_docs"]
+        docs_bytes = self.meta.get("docs_bytes")
+        if docs_bytes is None:
+            # Older indexes: the last document ends where its line does
+            docs_bytes = 0
+            if n:
+                self._docs_fh.seek(self._offsets[n - 1])
+                docs_bytes = self._offsets[n - 1] + len(self._docs_fh.readline())
+        sizes = {"docs.jsonl": docs_bytes, "offsets.bin": n * 8, "doclens.bin": n * 4}
+        if self.meta["has_vectors"]:
+            sizes["vectors.f32"] = n * self.meta["vector_dim"] * 4
+        return sizes
+
+    def _truncate_uncommitted(self):
+        """Drop rows a crashed ingest appended after the last meta.json write."""
+        sizes = self._committed_sizes()
+        stale = [name for name, size in sizes.items()
+                 if os.path.exists(self._p(name)) and os.path.getsize(self._p(name)) > size]
+        if not stale:
+            return
+        self._close_maps()  # some platforms refuse to truncate a mapped file
+        for name in stale:
+            print(f"[Evidence Index] Dropping uncommitted data past byte {sizes[name]} of {self._p(name)}")
+            with open(self._p(name), "r+b") as f:
+                f.truncate(sizes[name])
+        self._known_ids = None
+        self._open()
+
+    def ingest(self, docs) -> int:
+        """Append documents as a new segment. Returns the number indexed."""
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._truncate_uncommitted()
+            try:
+                return self._ingest(docs)
+            except BaseException:
+                # IDs of documents that never got committed must not block a retry
+                self._known_ids = None
+                raise
+
+    def _ingest(self, docs) -> int:
+        known = self._load_known_ids()
+        base = self.meta["num_docs"]
+        term_postings = {}
+        offsets, doclens = array("Q"), array("I")
+        vectors = []
+        added = 0
+        # Without numpy the new rows cannot be written: the index goes BM25-only
+        write_vectors = self.meta["has_vectors"] and np is not None
+
+        with open(self._p("docs.jsonl"), "ab") as docs_f:
+            pos = docs_f.tell()
+            for doc in docs:
+                text = (doc.get("text") or "").strip()
+                if not text:
+                    continue
+                doc_id = doc.get("id")
+                if doc_id is not None:
+                    if str(doc_id) in known:
+                        continue
+                    known.add(str(doc_id))
+                tokens = tokenize(f"{doc.get('title', '')} {text}")
+                doc_no = base + added
+
+                counts = {}
+                for t in tokens:
+                    counts[t] = counts.get(t, 0) + 1
+                for t, tf in counts.items():
+                    term_postings.setdefault(t, []).append((doc_no, tf))
+
+                line = (json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8")
+                docs_f.write(line)
+                offsets.append(pos)
+                pos += len(line)
+                doclens.append(len(tokens))
+                if write_vectors:
+                    vectors.append(_hashed_vector(tokens))
+                added += 1
+
+        if not added:
+            return 0
+
+        seg_name = f"seg_{len(self.meta['segments']) + 1:04d}"
+        while os.path.exists(self._p(seg_name)):
+            seg_name += "_"
+        _Segment.write(self._p(seg_name), term_postings)
+        with open(self._p("offsets.bin"), "ab") as f:
+            offsets.tofile(f)
+        with open(self._p("doclens.bin"), "ab") as f:
+            doclens.tofile(f)
+        if write_vectors:
+            with open(self._p("vectors.f32"), "ab") as f:
+                np.stack(vectors).astype(np.float32).tofile(f)
+        elif self.meta["has_vectors"]:
+            self.meta["has_vectors"] = False
+            if os.path.exists(self._p("vectors.f32")):
+                os.remove(self._p("vectors.f32"))
+
+        self.meta["num_docs"] = base + added
+        self.meta["docs_bytes"] = pos
+        self.meta["total_len"] += sum(doclens)
+        self.meta["segments"].append(seg_name)
+        self._write_meta()
+        self._open()
+        return added
+
+    def ingest_jsonl(self, path: str, batch_size: int = 5000) -> int:
+        """Stream a JSONL corpus into the index in batches (one segment each)."""
+        total, batch = 0, []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    total += self.ingest(batch)
+                    batch = []
+        if batch:
+            total += self.ingest(batch)
+        return total
+
+    def compact(self):
+        """Merge all postings segments into a single segment."""
+        with self._lock:
+            if len(self._segments) <= 1:
+                return
+            merged = {}
+            for seg in self._segments:  # segments are in doc_no order already
+                for term in seg.lexicon:
+                    merged.setdefault(term, []).extend(seg.iter_postings(term))
+            old = list(self.meta["segments"])
+            new_name = f"seg_{len(old) + 1:04d}"
+            while os.path.exists(self._p(new_name)):
+                new_name += "_"
+            _Segment.write(self._p(new_name), merged)
+            self.meta["segments"] = [new_name]
+            self._write_meta()
+            self._open()
+            for name in old:
+                shutil.rmtree(self._p(name), ignore_errors=True)
+
+    def _write_meta(self):
+        tmp = self._p("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._p("meta.json"))
+
+    # ---------- querying ----------
+
+    def get_doc(self, doc_no: int) -> dict:
+        self._docs_fh.seek(self._offsets[doc_no])
+        return json.loads(self._docs_fh.readline())
+
+    def _bm25(self, tokens, k: int):
+        if self._doclens_np is None:
+            return self._bm25_python(tokens, k)
+        n = self.meta["num_docs"]
+        avgdl = self.meta["total_len"] / n if n else 1.0
+        doc_parts, score_parts = [], []
+        for term in set(tokens):
+            df = sum(seg.df(term) for seg in self._segments)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for seg in self._segments:
+                entry = seg.lexicon.get(term)
+                if not entry:
+                    continue
+                start, count = entry
+                pairs = seg.pairs[start:start + count]
+                doc_nos = pairs[:, 0]
+                tf = pairs[:, 1].astype(np.float64)
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._doclens_np[doc_nos] / avgdl)
+                doc_parts.append(doc_nos)
+                score_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if not doc_parts:
+            return []
+        doc_nos = np.concatenate(doc_parts)
+        scores = np.bincount(doc_nos, weights=np.concatenate(score_parts))
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(int(d), float(scores[d])) for d in hits]
+
+    def _bm25_python(self, tokens, k: int):
+        n = self.meta["num_docs"]
+        avgdl = self.meta["total_len"] / n if n else 1.0
+        doclens = self._doclens
+        scores = {}
+        for term in set(tokens):
+            df = sum(seg.df(term) for seg in self._segments)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for seg in self._segments:
+                for doc_no, tf in seg.iter_postings(term):
+                    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doclens[doc_no] / avgdl)
+                    scores[doc_no] = scores.get(doc_no, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+
+    def _vector(self, tokens, k: int):
+        if self._vectors is None or not tokens:
+            return []
+        sims = self._vectors @ _hashed_vector(tokens)
+        k = min(k, sims.shape[0])
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(i), float(sims[i])) for i in top if sims[i] > 0]
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0):
+        """
+        Top-k evidence for a query. BM25 and vector rankings are fused with
+        reciprocal-rank fusion when the vector index is enabled.
+        Returns a list of dicts: the stored document plus "score".
+        """
+        with self._lock:
+            if not self.meta["num_docs"]:
+                return []
+            tokens = tokenize(query)
+            if not tokens:
+                return []
+            lexical = self._bm25(tokens, k * 2)
+            lexical = [(d, s) for d, s in lexical if s > min_score]
+            dense = self._vector(tokens, k * 2) if self.use_vectors else []
+
+            if dense:
+                fused = {}
+                for ranking in (lexical, dense):
+                    for rank, (doc_no, _) in enumerate(ranking):
+                        fused[doc_no] = fused.get(doc_no, 0.0) + 1.0 / (RRF_K + rank + 1)
+                ranked = heapq.nlargest(k, fused.items(), key=lambda kv: kv[1])
+            else:
+                ranked = lexical[:k]
+
+            hits = []
+            for doc_no, score in ranked:
+                doc = self.get_doc(doc_no)
+                doc["score"] = round(score, 4)
+                hits.append(doc)
+            return hits
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_default_index():
+    """Process-wide index at EVIDENCE_INDEX_DIR (opened lazily)."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = EvidenceIndex(DEFAULT_INDEX_DIR)
+        return _default_index
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Local evidence index")
+    parser.add_argument("command", choices=["ingest", "query", "compact"])
+    parser.add_argument("arg", nargs="?", help="JSONL corpus (ingest) or query text (query)")
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    index = EvidenceIndex(args.index)
+    if args.command == "ingest":
+        added = index.ingest_jsonl(args.arg)
+        print(f"Indexed {added} documents ({len(index)} total) into {index.index_dir}")
+    elif args.command == "compact":
+        index.compact()
+        print(f"Compacted {index.index_dir} into {len(index.meta['segments'])} segment(s)")
+    else:
+        start = time.perf_counter()
+        hits = index.search(args.arg or "", k=args.k)
+        elapsed = (time.perf_counter() - start) * 1000
+        for hit in hits:
+            print(f"[{hit['score']}] {hit.get('title', '')}: {hit['text'][:120]}")
+        print(f"{len(hits)} hits in {elapsed:.2f} ms")
@@ -0,0 +1,154 @@
+# app/utils/rate_limiter.py
+"""
+Client-side admission control for upstream LLM calls.
+
+Two token buckets (requests/minute and tokens/minute) gate every call.
+Waiting callers are served strictly by priority (then arrival order), and a
+caller that cannot be admitted within its wait budget is shed with
+RateLimited instead of hammering the provider.
+
+The admitted rate adapts AIMD-style: every 429 / quota error cuts it
+multiplicatively and pauses admission for the provider's retry delay; every
+success nudges it back up towards the configured limit. Limits are set a
+little under the real quota (LLM_QUOTA_HEADROOM) so sustained throughput sits
+just below it instead of oscillating around it.
+"""
+import os
+import time
+import heapq
+import itertools
+import threading
+
+LLM_RPM = float(os.getenv("LLM_RPM", "30"))
+LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))
+LLM_QUOTA_HEADROOM = float(os.getenv("LLM_QUOTA_HEADROOM", "0.9"))
+LLM_MAX_WAIT_S = float(os.getenv("LLM_MAX_WAIT_S", "20"))
+LLM_OUTPUT_TOKEN_RESERVE = int(os.getenv("LLM_OUTPUT_TOKEN_RESERVE", "400"))
+# Callers below this priority are shed at once while a higher-priority caller
+# is waiting: background jobs (priority <= 0) give way to interactive calls (1)
+# but never to each other
+LLM_SHED_BELOW_PRIORITY = int(os.getenv("LLM_SHED_BELOW_PRIORITY", "1"))
+
+
+class RateLimited(Exception):
+    """Raised when a call is shed (or the provider reported quota exhaustion)."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(prompt: str, output_reserve: int = LLM_OUTPUT_TOKEN_RESERVE) -> int:
+    """~4 characters per token for the prompt, plus a reserve for the answer."""
+    return len(prompt) // 4 + 1 + output_reserve
+
+
+class TokenBucket:
+    """Continuous-refill bucket; not thread-safe on its own (the scheduler locks)."""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, per_minute / 60.0 * 5)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, factor: float = 1.0):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def wait_time(self, amount: float, factor: float = 1.0) -> float:
+        # A request bigger than the bucket would never fit; let it through once full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate * factor)
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+
+class LLMScheduler:
+    """
+    Priority-ordered RPM/TPM admission with adaptive backoff.
+
+        scheduler.acquire(estimate, priority=1)   # blocks or raises RateLimited
+        ... call the model ...
+        scheduler.record_success(estimate, actual_tokens)   # or record_throttled()
+    """
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 headroom: float = LLM_QUOTA_HEADROOM, max_wait: float = LLM_MAX_WAIT_S,
+                 shed_below_priority: int = LLM_SHED_BELOW_PRIORITY):
+        self.requests = TokenBucket(rpm * headroom)
+        self.tokens = TokenBucket(tpm * headroom, capacity=tpm * headroom / 60.0 * 5)
+        self.max_wait = max_wait
+        self.shed_below_priority = shed_below_priority
+        self.factor = 1.0          # adaptive multiplier on both refill rates
+        self.min_factor = 0.1
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting = []         # heap of (-priority, seq)
+        self._seq = itertools.count()
+        self.stats = {"admitted": 0, "shed": 0, "throttled": 0}
+
+    def _refill(self, now):
+        self.requests.refill(now, self.factor)
+        self.tokens.refill(now, self.factor)
+
+    def acquire(self, est_tokens: int, priority: int = 0, max_wait: float = None):
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            if (priority < self.shed_below_priority and self._waiting
+                    and -self._waiting[0][0] > priority):
+                self.stats["shed"] += 1
+                raise RateLimited("Upstream busy; low-priority request shed", retry_after=5.0)
+
+            entry = (-priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = max(self.paused_until - now,
+                               self.requests.wait_time(1, self.factor),
+                               self.tokens.wait_time(est_tokens, self.factor))
+                    if self._waiting[0] == entry and wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(min(est_tokens, self.tokens.capacity))
+                        self.stats["admitted"] += 1
+                        return
+                    if now + max(wait, 0.0) > deadline:
+                        self.stats["shed"] += 1
+                        raise RateLimited("Upstream quota budget exhausted; request shed",
+                                          retry_after=max(wait, 1.0))
+                    self._cond.wait(timeout=max(0.01, min(wait, deadline - now)) if wait > 0 else 0.05)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def record_success(self, est_tokens: int = 0, actual_tokens: int = None):
+        with self._cond:
+            if actual_tokens is not None:
+                # Settle the estimate against what the provider actually billed
+                self.tokens.take(actual_tokens - min(est_tokens, self.tokens.capacity))
+            self.factor = min(1.0, self.factor + 0.02)
+            self._cond.notify_all()
+
+    def record_throttled(self, retry_after: float = None):
+        with self._cond:
+            self.stats["throttled"] += 1
+            self.factor = max(self.min_factor, self.factor * 0.7)
+            pause = retry_after if retry_after is not None else 60.0 / max(1.0, self.requests.rate * 60.0)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            # Drain what we thought we had; the provider disagrees
+            self.requests.tokens = min(self.requests.tokens, 0.0)
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return dict(self.stats, factor=round(self.factor, 3), waiting=len(self._waiting))
+
+
+llm_scheduler = LLMScheduler()
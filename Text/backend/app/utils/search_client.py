@@ -0,0 +1,294 @@
+# app/utils/search_client.py
+"""
+Async live-search client used when a deployment enables web evidence.
+
+- One persistent HTTP/2 connection pool (httpx.AsyncClient) shared by all calls
+- Per-provider timeouts and circuit breakers
+- Parallel fan-out: every healthy provider is queried at once and whatever
+  answers within the deadline is used; stragglers are cancelled
+- TTL response cache keyed on the normalised query
+
+Provider endpoints can be pointed at a local mock server through
+SEARCH_DDG_URL / SEARCH_WIKI_URL, which is how the client is tested offline.
+
+Sync callers (FastAPI threadpool routes) go through `search_sync`, which runs
+the coroutine on a single background event loop so the pool stays alive
+between requests.
+"""
+import os
+import re
+import time
+import html
+import asyncio
+import threading
+from collections import OrderedDict
+
+import httpx
+
+SEARCH_DEADLINE_S = float(os.getenv("SEARCH_DEADLINE_S", "1.5"))
+SEARCH_CACHE_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S", "900"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_query(query: str) -> str:
+    """Case/punctuation/whitespace-insensitive cache key."""
+    return " ".join(_PUNCT_RE.sub(" ", query.lower()).split())
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class SearchProvider:
+    """Base provider: builds a request, parses the JSON into text snippets."""
+
+    name = "base"
+
+    def __init__(self, url: str, timeout: float = 1.0, breaker: CircuitBreaker = None):
+        self.url = url
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+
+    def params(self, query: str, num_results: int) -> dict:
+        raise NotImplementedError
+
+    def parse(self, data: dict, num_results: int):
+        raise NotImplementedError
+
+    async def search(self, client: httpx.AsyncClient, query: str, num_results: int):
+        try:
+            response = await client.get(self.url, params=self.params(query, num_results),
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            results = self.parse(response.json(), num_results)
+        except asyncio.CancelledError:
+            # Cancelled by the fan-out deadline — not the provider's fault.
+            # Release a half-open trial so the next request can retry it.
+            self.breaker.release_trial()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return results
+
+
+class DuckDuckGoProvider(SearchProvider):
+    """DuckDuckGo Instant Answer API (no key required)."""
+
+    name = "duckduckgo"
+
+    def params(self, query, num_results):
+        return {"q": query, "format": "json", "no_redirect": 1, "no_html": 1}
+
+    def parse(self, data, num_results):
+        results = []
+        if data.get("AbstractText"):
+            results.append(data["AbstractText"])
+        for topic in data.get("RelatedTopics", []):
+            if isinstance(topic, dict) and "Text" in topic:
+                results.append(topic["Text"])
+        return results[:num_results]
+
+
+class WikipediaProvider(SearchProvider):
+    """MediaWiki full-text search (no key required)."""
+
+    name = "wikipedia"
+
+    def params(self, query, num_results):
+        return {"action": "query", "list": "search", "srsearch": query,
+                "srlimit": num_results, "format": "json"}
+
+    def parse(self, data, num_results):
+        results = []
+        for hit in data.get("query", {}).get("search", []):
+            snippet = html.unescape(_TAG_RE.sub("", hit.get("snippet", "")))
+            results.append(f"{hit.get('title', '')}: {snippet}".strip(": "))
+        return results[:num_results]
+
+
+def default_providers():
+    return [
+        DuckDuckGoProvider(os.getenv("SEARCH_DDG_URL", "https://api.duckduckgo.com/"),
+                           timeout=float(os.getenv("SEARCH_DDG_TIMEOUT_S", "1.2"))),
+        WikipediaProvider(os.getenv("SEARCH_WIKI_URL", "https://en.wikipedia.org/w/api.php"),
+                          timeout=float(os.getenv("SEARCH_WIKI_TIMEOUT_S", "1.2"))),
+    ]
+
+
+class AsyncSearchClient:
+    """Fans a query out to all healthy providers and merges what arrives in time."""
+
+    def __init__(self, providers=None, deadline: float = SEARCH_DEADLINE_S, cache: TTLCache = None):
+        self.providers = providers if providers is not None else default_providers()
+        self.deadline = deadline
+        self.cache = cache or TTLCache()
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            try:
+                import h2  # noqa: F401  (enables HTTP/2 when installed)
+                http2 = True
+            except ImportError:
+                http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20,
+                                    keepalive_expiry=60.0),
+                headers={"User-Agent": "MisinformationSuite/1.0"},
+            )
+        return self._client
+
+    async def search(self, query: str, num_results: int = 3, deadline: float = None):
+        key = (normalize_query(query), num_results)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        client = self._get_client()
+        tasks = {
+            asyncio.ensure_future(p.search(client, query, num_results)): p
+            for p in self.providers if p.breaker.allow()
+        }
+        if not tasks:
+            return []
+
+        done, pending = await asyncio.wait(tasks, timeout=deadline or self.deadline)
+        for task in pending:
+            task.cancel()
+
+        # Merge in provider order so results are stable between calls
+        by_provider = {}
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                by_provider[tasks[task].name] = task.result()
+        merged, seen = [], set()
+        for provider in self.providers:
+            for snippet in by_provider.get(provider.name, []):
+                if snippet and snippet not in seen:
+                    seen.add(snippet)
+                    merged.append(snippet)
+        merged = merged[:num_results]
+
+        # Only cache complete answers, so a slow provider gets another chance
+        if merged and not pending:
+            self.cache.set(key, merged)
+        return merged
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# ---------- Sync bridge ----------
+
+_loop = None
+_loop_lock = threading.Lock()
+_default_client = None
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="search-client-loop", daemon=True).start()
+        return _loop
+
+
+def get_default_client() -> AsyncSearchClient:
+    global _default_client
+    with _loop_lock:
+        if _default_client is None:
+            _default_client = AsyncSearchClient()
+        return _default_client
+
+
+def search_sync(query: str, num_results: int = 3, deadline: float = None):
+    """Blocking wrapper; never waits much longer than the fan-out deadline."""
+    client = get_default_client()
+    deadline = deadline or client.deadline
+    future = asyncio.run_coroutine_threadsafe(
+        client.search(query, num_results, deadline), _background_loop()
+    )
+    return future.result(timeout=deadline + 0.5)
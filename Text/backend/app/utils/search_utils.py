@@ -1,28 +1,40 @@
 # app/utils/search_utils.py
-import requests
 import os
+from app.utils.search_client import search_sync
+from app.utils.evidence_index import get_default_index
 
 def search_web(query: str, num_results: int = 3):
     """
-    Uses DuckDuckGo's free API to get quick factual snippets.
-    No API key required.
+    Live web snippets (DuckDuckGo + Wikipedia, queried in parallel).
+    No API key required. Goes through the pooled async client in
+    search_client.py, so it is cached and bounded by SEARCH_DEADLINE_S.
     """
     try:
-        response = requests.get(
-            f"https://api.duckduckgo.com/?q={query}&format=json&no_redirect=1&no_html=1"
-        )
-        data = response.json()
-        results = []
-
-        # Collect abstract and related topics
-        if "AbstractText" in data and data["AbstractText"]:
-            results.append(data["AbstractText"])
+        results = search_sync(query, num_results)
+        return results if results else ["No factual info found."]
+    except Exception as e:
+        return [f"Search error: {e}"]
 
-        if "RelatedTopics" in data:
-            for topic in data["RelatedTopics"]:
-                if isinstance(topic, dict) and "Text" in topic:
-                    results.append(topic["Text"])
 
-        return results[:num_results] if results else ["No factual info found."]
+def search_local(query: str, num_results: int = 3):
+    """
+    Looks the claim up in the offline evidence index (see evidence_index.py).
+    Works without network access; returns [] when the index is empty.
+    """
+    try:
+        hits = get_default_index().search(query, k=num_results)
     except Exception as e:
-        return [f"Search error: {e}"]
+        print(f"[Evidence Index Error] {e}")
+        return []
+
+    results = []
+    for hit in hits:
+        snippet = hit["text"]
+        if hit.get("title"):
+            snippet = f"{hit['title']}: {snippet}"
+        if hit.get("verdict"):
+            snippet += f" (fact-check verdict: {hit['verdict']})"
+        if hit.get("source"):
+            snippet += f" [source: {hit['source']}]"
+        results.append(snippet)
+    return results
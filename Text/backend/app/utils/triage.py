@@ -0,0 +1,221 @@
+# app/utils/triage.py
+"""
+Claim pre-filter run before verify_claim_with_gemini.
+
+Cheap, local checks (regexes + small word lists, microseconds per call) that
+answer requests which never need the LLM:
+
+    length_limit   empty / too short / too long input
+    not_checkable  greetings, questions, opinions, first-person statements
+    known_verdict  claim already adjudicated (seed table or recent LLM result)
+
+Anything else returns None and goes on to the "llm" stage. Every answer
+carries a "stage" field so clients and logs can see who answered.
+"""
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+MIN_CLAIM_CHARS = int(os.getenv("MIN_CLAIM_CHARS", "12"))
+MAX_CLAIM_CHARS = int(os.getenv("MAX_CLAIM_CHARS", "2000"))
+KNOWN_VERDICTS_PATH = os.getenv(
+    "KNOWN_VERDICTS_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "known_verdicts.json"),
+)
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "10000"))
+VERDICT_CACHE_TTL_S = float(os.getenv("VERDICT_CACHE_TTL_S", str(24 * 3600)))
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+# Scripts written without spaces between words: word and character minimums
+# do not apply (a full claim can be five characters)
+_UNSPACED_LANGUAGES = {"zh", "ja"}
+
+# ---------- Language detection ----------
+
+_SCRIPTS = [
+    ("ru", re.compile(r"[Ѐ-ӿ]")),
+    ("ar", re.compile(r"[؀-ۿ]")),
+    ("hi", re.compile(r"[ऀ-ॿ]")),
+    ("ta", re.compile(r"[஀-௿]")),
+    ("zh", re.compile(r"[一-鿿]")),
+    ("ja", re.compile(r"[぀-ヿ]")),
+    ("ko", re.compile(r"[가-힯]")),
+]
+
+_LATIN_STOPWORDS = {
+    "en": set("the is are was were of and to in that it for on with as by this be not have has".split()),
+    "es": set("el la los las es son de que y en un una por con para no se del al".split()),
+    "fr": set("le la les est sont de des que et en un une pour avec pas ne du au".split()),
+    "de": set("der die das ist sind und zu den nicht mit ein eine von für auf dem des".split()),
+    "pt": set("o a os as é são de que e em um uma para com não do da no na".split()),
+    "it": set("il lo la gli le è sono di che e un una per con non del della nel".split()),
+}
+
+
+def detect_language(text: str) -> str:
+    """Script check, then stopword overlap for Latin-script languages."""
+    for lang, pattern in _SCRIPTS:
+        if pattern.search(text):
+            return lang
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return "unknown"
+    best, best_hits = "en", 0
+    for lang, stopwords in _LATIN_STOPWORDS.items():
+        hits = sum(1 for w in words if w in stopwords)
+        if hits > best_hits:
+            best, best_hits = lang, hits
+    return best
+
+
+# ---------- Check-worthiness ----------
+
+_GREETING_RE = re.compile(
+    r"^(hi+|hello+|hey+|yo|sup|thanks?|thank you|ok(ay)?|good (morning|afternoon|evening|night)|"
+    r"how are you|what'?s up|bye|goodbye|test(ing)?|lol|haha+)\b[\s!.?,]*\w{0,12}[\s!.?]*$",
+    re.IGNORECASE,
+)
+# Wh-words open a question on their own; a leading modal/auxiliary only does
+# with a trailing "?" ("Will Smith slapped...", "Can openers were...")
+_QUESTION_RE = re.compile(r"^(who|what|when|where|why|how|which)\b", re.IGNORECASE)
+# Yes/no questions about the world ("Is it true that...?", "Was ...?") embed a claim
+_FACT_QUESTION_RE = re.compile(r"^(is it true|is this true|did|does|do|is|are|was|were|has|have)\b", re.IGNORECASE)
+_SECOND_PERSON_RE = re.compile(r"\b(you|your|you're)\b", re.IGNORECASE)
+# Only explicit first-person opinion markers: "the best", "should" etc. also
+# appear in claims worth checking ("Bleach is the best cure for covid")
+_OPINION_RE = re.compile(
+    r"\b(i think|i feel|i believe|we think|we feel|we believe|in my opinion|in our opinion|imo|"
+    r"i love|i hate|i like|i prefer|personally)\b",
+    re.IGNORECASE,
+)
+# Singular only: "We never landed on the moon" is a claim about the world
+_FIRST_PERSON_RE = re.compile(r"^(i|i'm|i am|my|me)\b", re.IGNORECASE)
+_FACTUAL_SIGNAL_RE = re.compile(
+    r"(\d|%|\b(percent|million|billion|according|study|report|announced|confirmed|"
+    r"caused|causes|cures|killed|died|banned|approved|elected|won|lost|increase|decrease|"
+    r"government|president|minister|vaccine|virus)\b)",
+    re.IGNORECASE,
+)
+
+
+def not_checkable_reason(text: str):
+    """Return why an English text is not a checkable factual claim, or None."""
+    if _GREETING_RE.match(text):
+        return "This looks like a greeting or small talk, not a factual claim."
+    factual = bool(_FACTUAL_SIGNAL_RE.search(text))
+    if text.endswith("?") or _QUESTION_RE.match(text):
+        # "Is it true that X?" / "Did X happen?" still embed a checkable claim
+        if not _FACT_QUESTION_RE.match(text) or _SECOND_PERSON_RE.search(text):
+            return "This is a question rather than a claim. Rephrase it as a statement to fact-check it."
+    if _OPINION_RE.search(text) and not factual:
+        return "This reads as an opinion or preference, which cannot be fact-checked."
+    if _FIRST_PERSON_RE.match(text) and not factual:
+        return "This is a personal statement that cannot be verified against public evidence."
+    return None
+
+
+# ---------- Known verdicts ----------
+
+def normalize_claim(text: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", text.lower()).split())
+
+
+class VerdictTable:
+    """
+    Exact-match table of already adjudicated claims: a static seed file
+    (claim -> {"verdict", "confidence", "explanation"}) plus an LRU/TTL cache
+    of recent definitive LLM verdicts.
+    """
+
+    def __init__(self, seed_path: str = KNOWN_VERDICTS_PATH,
+                 maxsize: int = VERDICT_CACHE_SIZE, ttl: float = VERDICT_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._seed = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        if seed_path and os.path.exists(seed_path):
+            with open(seed_path, "r", encoding="utf-8") as f:
+                for claim, entry in json.load(f).items():
+                    self._seed[normalize_claim(claim)] = entry
+
+    def lookup(self, text: str):
+        key = normalize_claim(text)
+        if key in self._seed:
+            return self._seed[key]
+        with self._lock:
+            item = self._recent.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                del self._recent[key]
+                return None
+            self._recent.move_to_end(key)
+            return entry
+
+    def remember(self, text: str, result: dict):
+        """Cache a definitive (True/False) LLM verdict for identical future claims."""
+        if result.get("verdict") not in ("True", "False"):
+            return
+        entry = {k: result[k] for k in ("verdict", "confidence", "explanation") if k in result}
+        key = normalize_claim(text)
+        with self._lock:
+            self._recent[key] = (time.monotonic() + self.ttl, entry)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.maxsize:
+                self._recent.popitem(last=False)
+
+
+known_verdicts = VerdictTable()
+
+
+# ---------- Entry point ----------
+
+def _answer(claim: str, stage: str, verdict: str, explanation: str, confidence: float = 0.0, **extra):
+    result = {
+        "input_text": claim,
+        "verdict": verdict,
+        "confidence": confidence,
+        "explanation": explanation,
+        "stage": stage,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+    result.update(extra)
+    return result
+
+
+def triage_claim(claim: str):
+    """
+    Returns a finished result dict if the claim can be answered locally,
+    or None if it should go to the LLM.
+    """
+    text = " ".join((claim or "").split())
+
+    if not text:
+        return _answer(claim, "length_limit", "Not Checkable", "Empty input — please enter a claim to verify.")
+    if len(text) > MAX_CLAIM_CHARS:
+        return _answer(claim, "length_limit", "Not Checkable",
+                       f"Input exceeds {MAX_CLAIM_CHARS} characters. Please submit a single, specific claim.")
+    language = detect_language(text)
+    too_short = len(text) < MIN_CLAIM_CHARS or len(_WORD_RE.findall(text)) < 3
+    if too_short and language not in _UNSPACED_LANGUAGES:
+        return _answer(claim, "length_limit", "Not Checkable",
+                       "This is too short to be a factual claim. Please enter a full statement.")
+
+    known = known_verdicts.lookup(text)
+    if known is not None:
+        return _answer(claim, "known_verdict", known.get("verdict", "Uncertain"),
+                       known.get("explanation", ""), known.get("confidence", 0.0))
+
+    if language == "en":
+        reason = not_checkable_reason(text)
+        if reason:
+            return _answer(claim, "not_checkable", "Not Checkable", reason, language=language)
+
+    return None
@@ -3,6 +3,15 @@ import json
 from dotenv import load_dotenv
 import google.generativeai as genai
 from datetime import datetime
+from app.utils.search_utils import search_local, search_web
+from app.utils.rate_limiter import llm_scheduler, estimate_tokens, RateLimited
+from misinfo_common.stage_timer import StageTimer
+
+try:
+    from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+    QUOTA_ERRORS = (ResourceExhausted, TooManyRequests)
+except ImportError:
+    QUOTA_ERRORS = ()
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
@@ -12,12 +21,95 @@ api_key = os.getenv("GOOGLE_API_KEY")
 if not api_key:
     raise ValueError("❌ GOOGLE_API_KEY not found in environment. Please check your .env file.")
 
-# Configure Gemini
-genai.configure(api_key=api_key)
+# Configure Gemini (GEMINI_API_ENDPOINT points the client at a local fake upstream)
+gemini_endpoint = os.getenv("GEMINI_API_ENDPOINT")
+if gemini_endpoint:
+    genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": gemini_endpoint})
+else:
+    genai.configure(api_key=api_key)
+
+# Number of evidence snippets pulled from the local index per claim (0 disables)
+EVIDENCE_TOP_K = int(os.getenv("EVIDENCE_TOP_K", "3"))
+# Also query live web providers (bounded by SEARCH_DEADLINE_S)
+LIVE_SEARCH_ENABLED = os.getenv("LIVE_SEARCH_ENABLED", "0") == "1"
+
+
+def gather_evidence(claim: str):
+    """Local index first, then (optionally) live search within its deadline."""
+    if EVIDENCE_TOP_K <= 0:
+        return []
+    evidence = search_local(claim, EVIDENCE_TOP_K)
+    if LIVE_SEARCH_ENABLED:
+        evidence += [
+            snippet for snippet in search_web(claim, EVIDENCE_TOP_K)
+            if snippet != "No factual info found." and not snippet.startswith("Search error:")
+        ]
+    return evidence
+
+
+def build_evidence_block(evidence):
+    """Format retrieved snippets for the prompt (empty string if none)."""
+    if not evidence:
+        return ""
+    lines = "\n".join(f"        [{i}] {snippet}" for i, snippet in enumerate(evidence, 1))
+    return f"""
+        Reference evidence retrieved from our fact-check corpus (may be incomplete;
+        cite it by number when relevant and ignore it when unrelated):
+{lines}
+"""
+
 
-def verify_claim_with_gemini(claim: str):
+def _retry_after(error) -> float:
+    """
+    Best-effort retry delay from a quota error (falls back to None). gRPC
+    errors carry RetryInfo protos; the REST transport gives the decoded JSON
+    ({"@type": "...RetryInfo", "retryDelay": "49s"}) and a Retry-After header.
+    """
+    for detail in getattr(error, "details", None) or []:
+        if isinstance(detail, dict):
+            delay = detail.get("retryDelay")
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    pass
+            continue
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + delay.nanos / 1e9
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limited_result(claim: str, retry_after: float):
+    return {
+        "input_text": claim,
+        "verdict": "Rate Limited",
+        "confidence": 0,
+        "explanation": (
+            "⏳ The verification service is at its upstream request quota right now. "
+            f"Please retry in about {max(1, round(retry_after))} seconds."
+        ),
+        "retry_after": round(retry_after, 2),
+        "stage": "llm",
+        "timestamp": datetime.utcnow().isoformat() + "Z"
+    }
+
+
+def verify_claim_with_gemini(claim: str, priority: int = 1, timer: StageTimer = None):
+    """
+    priority: higher is admitted first by the LLM scheduler; interactive
+    requests use 1, background jobs default to 0 and may be shed under load.
+    timer: optional StageTimer that receives evidence / llm_queue / llm durations.
+    """
+    timer = timer or StageTimer()
     try:
         model = genai.GenerativeModel("gemini-2.0-flash-lite")
+        evidence = gather_evidence(claim)
+        timer.mark("evidence")
         prompt = f"""
         You are an expert fact-checking assistant. Analyze the following claim and determine:
         1. Whether it is True, False, or Unverifiable.
@@ -25,6 +117,7 @@ def verify_claim_with_gemini(claim: str):
         3. Give a clear, structured explanation with factual context and supporting evidence.
 
         Claim: "{claim}"
+        {build_evidence_block(evidence)}
 
         Respond strictly in this JSON format:
         {{
@@ -34,9 +127,25 @@ def verify_claim_with_gemini(claim: str):
         }}
         """
 
-        # Generate response from Gemini
-        response = model.generate_content(prompt)
+        # Generate response from Gemini, within the RPM/TPM budget
+        est_tokens = estimate_tokens(prompt)
+        try:
+            llm_scheduler.acquire(est_tokens, priority)
+        except RateLimited as e:
+            timer.mark("llm_queue")
+            return rate_limited_result(claim, e.retry_after)
+        timer.mark("llm_queue")
+        try:
+            response = model.generate_content(prompt)
+        except QUOTA_ERRORS as e:
+            timer.mark("llm")
+            retry_after = _retry_after(e)
+            llm_scheduler.record_throttled(retry_after)
+            return rate_limited_result(claim, retry_after or 5.0)
+        usage = getattr(response, "usage_metadata", None)
+        llm_scheduler.record_success(est_tokens, getattr(usage, "total_token_count", None) or None)
         content = response.text.strip() if hasattr(response, "text") else ""
+        timer.mark("llm")
 
         # 🔹 Clean up markdown code fences if present (like ```json ... ```)
         if content.startswith("```"):
@@ -57,6 +166,8 @@ def verify_claim_with_gemini(claim: str):
 
         # Add claim text and timestamp
         result["input_text"] = claim
+        result["evidence"] = evidence
+        result["stage"] = "llm"
         result["timestamp"] = datetime.utcnow().isoformat() + "Z"
 
         return result
@@ -73,6 +184,7 @@ def verify_claim_with_gemini(claim: str):
                 "Please retry after a few moments — subsequent runs often stabilize as "
                 "the system recalibrates."
             ),
+            "stage": "llm",
             "timestamp": datetime.utcnow().isoformat() + "Z"
         }
 
@@ -0,0 +1,60 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+# loadtest/ (repo root) holds the fake Gemini + search upstreams
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "loadtest"))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Read when app.utils.verifier / misinfo_common.job_queue are first imported:
+# Gemini goes to the fake upstream below and jobs to a throwaway database
+FAKE_PORT = _free_port()
+os.environ["GOOGLE_API_KEY"] = "test-key"
+os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{FAKE_PORT}"
+os.environ["JOB_QUEUE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "jobs.db")
+
+
+@pytest.fixture
+def fake_upstreams():
+    """The fake upstream app, instant and error-free unless a test changes its config."""
+    fake = pytest.importorskip("fake_upstreams")
+    saved = dict(fake.config)
+    fake.config.update(latency_ms=0, jitter_ms=0, error_rate=0, quota_rpm=0, quota_tpm=0,
+                       search_latency_ms=0, search_error_rate=0)
+    fake.reset()
+    fake._rng.seed(0)
+    yield fake
+    fake.config.update(saved)
+    fake.reset()
+
+
+@pytest.fixture(scope="session")
+def _fake_server():
+    fake = pytest.importorskip("fake_upstreams")
+    uvicorn = pytest.importorskip("uvicorn")
+    server = uvicorn.Server(uvicorn.Config(fake.app, host="127.0.0.1", port=FAKE_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.01)
+    yield
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def fake_gemini(_fake_server, fake_upstreams):
+    """fake_upstreams served over HTTP at GEMINI_API_ENDPOINT (for the real genai client)."""
+    return fake_upstreams
@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from app.utils.evidence_index import EvidenceIndex
+
+np = pytest.importorskip("numpy")
+
+DOCS = [
+    {"id": "1", "title": "Moon landing", "text": "Apollo 11 landed on the moon in July 1969."},
+    {"id": "2", "title": "Vaccines", "text": "Vaccines do not cause autism according to large studies."},
+    {"id": "3", "title": "Great Wall", "text": "The Great Wall of China is not visible from the moon."},
+]
+
+
+def test_vectors_written_even_when_search_does_not_use_them(tmp_path):
+    EvidenceIndex(str(tmp_path), use_vectors=False).ingest(DOCS[:2])
+    index = EvidenceIndex(str(tmp_path))
+    index.ingest(DOCS[2:])
+    assert index.meta["has_vectors"]
+    assert os.path.getsize(tmp_path / "vectors.f32") == 3 * index.meta["vector_dim"] * 4
+    assert index.search("apollo moon landing")[0]["id"] == "1"
+
+
+def test_short_vector_file_falls_back_to_bm25(tmp_path):
+    # Index from before has_vectors: the first ingest skipped vectors, the second wrote them
+    index = EvidenceIndex(str(tmp_path))
+    index.ingest(DOCS)
+    index.close()
+    with open(tmp_path / "vectors.f32", "r+b") as f:
+        f.truncate(index.meta["vector_dim"] * 4)
+    meta = json.loads((tmp_path / "meta.json").read_text())
+    del meta["has_vectors"]
+    (tmp_path / "meta.json").write_text(json.dumps(meta))
+
+    reopened = EvidenceIndex(str(tmp_path))
+    assert reopened.meta["has_vectors"] is False
+    assert reopened.search("vaccines autism")[0]["id"] == "2"
+    reopened.ingest([{"id": "4", "text": "Lightning can strike the same place twice."}])
+    assert reopened.search("lightning strike")[0]["id"] == "4"
+
+
+def test_numpy_bm25_matches_python_scoring(tmp_path):
+    index = EvidenceIndex(str(tmp_path), use_vectors=False)
+    index.ingest(DOCS[:2])
+    index.ingest(DOCS[2:])  # second segment
+    for query in ("moon wall china", "vaccines autism studies", "apollo moon 1969"):
+        tokens = query.split()
+        fast, slow = index._bm25(tokens, 10), index._bm25_python(tokens, 10)
+        assert [d for d, _ in fast] == [d for d, _ in slow]
+        assert [s for _, s in fast] == pytest.approx([s for _, s in slow])
+
+
+@pytest.mark.parametrize("legacy_meta", [False, True])
+def test_ingest_drops_rows_left_by_a_crashed_ingest(tmp_path, legacy_meta):
+    index = EvidenceIndex(str(tmp_path))
+    index.ingest(DOCS[:2])
+    index.close()
+    if legacy_meta:  # written before meta.json recorded docs_bytes
+        meta = json.loads((tmp_path / "meta.json").read_text())
+        del meta["docs_bytes"]
+        (tmp_path / "meta.json").write_text(json.dumps(meta))
+    # A crash after the data files were appended but before meta.json was replaced
+    with open(tmp_path / "docs.jsonl", "ab") as f:
+        f.write(json.dumps(DOCS[2]).encode() + b"\n{\"id\": \"trunc")
+    for name, size in (("offsets.bin", 8), ("doclens.bin", 4), ("vectors.f32", 4 * index.meta["vector_dim"])):
+        with open(tmp_path / name, "ab") as f:
+            f.write(b"\x07" * size)
+
+    reopened = EvidenceIndex(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.search("vaccines autism")[0]["id"] == "2"
+    assert reopened.ingest(DOCS[2:]) == 1  # "3" was never committed, so it is not a duplicate
+    assert reopened.search("great wall china")[0]["id"] == "3"
+    assert os.path.getsize(tmp_path / "offsets.bin") == 3 * 8
+    assert os.path.getsize(tmp_path / "vectors.f32") == 3 * 4 * reopened.meta["vector_dim"]
+    lines = (tmp_path / "docs.jsonl").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["1", "2", "3"]
+
+
+def test_failed_ingest_can_be_retried(tmp_path):
+    index = EvidenceIndex(str(tmp_path))
+    index.ingest(DOCS[:1])
+
+    def failing():
+        yield DOCS[1]
+        raise IOError("corpus read failed")
+
+    with pytest.raises(IOError):
+        index.ingest(failing())
+    assert index.ingest(DOCS[1:]) == 2
+    assert [hit["id"] for hit in index.search("vaccines autism")][:1] == ["2"]
+    assert len(index) == 3
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from app.routes import jobs
+from app.utils import verifier
+from app.utils.rate_limiter import LLMScheduler
+from misinfo_common.job_queue import JobQueue, SQLiteJobStore, SUCCEEDED
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(store=SQLiteJobStore(str(tmp_path / "jobs.db")), workers=2, poll_interval=0.01)
+    queue.register("text", jobs.handle_text_job)
+    yield queue
+    queue.stop()
+
+
+def wait_all(queue, job_ids, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        found = [queue.get(job_id) for job_id in job_ids]
+        if all(job["status"] in ("succeeded", "failed") for job in found):
+            return found
+        time.sleep(0.02)
+    raise AssertionError("jobs did not finish")
+
+
+def test_job_workers_do_not_shed_each_other(fake_gemini, queue, monkeypatch):
+    # One request per 0.1 s and no burst: both workers queue in the scheduler
+    scheduler = LLMScheduler(rpm=600, headroom=1.0)
+    scheduler.requests.capacity = 1.0
+    monkeypatch.setattr(verifier, "llm_scheduler", scheduler)
+    queue.start()
+    job_ids = [queue.submit("text", {"text": f"The city of Springfield has {n} bridges over its river"},
+                            max_attempts=1) for n in range(12)]
+    found = wait_all(queue, job_ids)
+    assert [job["status"] for job in found] == [SUCCEEDED] * 12
+    assert scheduler.stats["shed"] == 0
+
+
+def test_rate_limited_job_is_deferred_without_spending_attempts(queue, monkeypatch):
+    calls = []
+
+    def verification(text, priority):
+        calls.append(priority)
+        if len(calls) < 3:
+            return verifier.rate_limited_result(text, 0.05)
+        return {"verdict": "False", "confidence": 0.9}
+
+    monkeypatch.setattr(jobs, "run_text_verification", verification)
+    queue.start()
+    job_id = queue.submit("text", {"text": "x", "priority": 7}, max_attempts=1)
+    job = wait_all(queue, [job_id])[0]
+    assert job["status"] == SUCCEEDED and job["attempts"] == 1
+    # Client priority never outranks interactive calls in the scheduler
+    assert calls == [0, 0, 0]
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.rate_limiter import LLMScheduler, RateLimited
+
+
+def hold_waiter(scheduler, priority=1):
+    """Start a caller that queues behind an empty request bucket; returns its thread."""
+    thread = threading.Thread(target=lambda: scheduler.acquire(1, priority, max_wait=3.0), daemon=True)
+    thread.start()
+    deadline = time.time() + 2
+    while not scheduler._waiting and time.time() < deadline:
+        time.sleep(0.005)
+    return thread
+
+
+def test_default_sheds_background_but_not_interactive_calls():
+    scheduler = LLMScheduler(rpm=60, headroom=1.0)
+    scheduler.requests.tokens = 0.0
+    waiter = hold_waiter(scheduler)
+    with pytest.raises(RateLimited):
+        scheduler.acquire(1, priority=0)
+    assert scheduler.stats["shed"] == 1
+    scheduler.acquire(1, priority=1, max_wait=3.0)
+    waiter.join()
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """A fresh scheduler behind verify_claim_with_gemini (roomy rate, short wait budget)."""
+    from app.utils import verifier
+    scheduler = LLMScheduler(rpm=600, headroom=1.0, max_wait=0.2)
+    monkeypatch.setattr(verifier, "llm_scheduler", scheduler)
+    return scheduler
+
+
+def verify(claim="The Eiffel Tower is in Berlin"):
+    from app.utils.verifier import verify_claim_with_gemini
+    return verify_claim_with_gemini(claim)
+
+
+def test_quota_429_pauses_admission_for_the_provider_delay(fake_gemini, scheduler):
+    fake_gemini.config["quota_rpm"] = 2
+    verdicts = [verify()["verdict"] for _ in range(2)]
+    assert all(v in ("True", "False", "Unverifiable") for v in verdicts)
+
+    throttled = verify()
+    assert throttled["verdict"] == "Rate Limited"
+    # The fake asks for ~60 s (RetryInfo detail on the REST transport)
+    assert throttled["retry_after"] > 30
+    assert scheduler.stats["throttled"] == 1
+    assert scheduler.factor == pytest.approx(0.7)
+
+    # Paused: shed locally with the provider's delay, without another upstream call
+    shed = verify()
+    assert shed["verdict"] == "Rate Limited" and shed["retry_after"] > 30
+    assert fake_gemini.stats["generate"] == 3
+    assert fake_gemini.stats["quota_429"] == 1
+
+
+def test_successes_restore_the_rate(fake_gemini, scheduler):
+    scheduler.factor = 0.5
+    for _ in range(5):
+        assert verify()["verdict"] != "Rate Limited"
+    assert scheduler.factor == pytest.approx(0.6)
+    assert scheduler.stats["admitted"] == 5
+
+
+def test_waiting_callers_are_admitted_by_priority():
+    scheduler = LLMScheduler(rpm=120, headroom=1.0, shed_below_priority=-100)
+    scheduler.requests.tokens = 0.0
+    order = []
+
+    def call(priority):
+        scheduler.acquire(1, priority, max_wait=5.0)
+        order.append(priority)
+
+    low = threading.Thread(target=call, args=(0,))
+    low.start()
+    while not scheduler._waiting:
+        time.sleep(0.005)
+    high = threading.Thread(target=call, args=(1,))
+    high.start()
+    low.join()
+    high.join()
+    assert order == [1, 0]
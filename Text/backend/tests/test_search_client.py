@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from app.utils.search_client import (AsyncSearchClient, CircuitBreaker, DuckDuckGoProvider,
+                                     TTLCache, WikipediaProvider)
+
+
+def make_client(fake, deadline=1.0, cooldown=30.0):
+    providers = [
+        DuckDuckGoProvider("http://fake/ddg", breaker=CircuitBreaker(threshold=3, cooldown=cooldown)),
+        WikipediaProvider("http://fake/wiki", breaker=CircuitBreaker(threshold=3, cooldown=cooldown)),
+    ]
+    client = AsyncSearchClient(providers, deadline=deadline, cache=TTLCache())
+    client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app))
+    return client
+
+
+def search(client, query, num_results=3):
+    return asyncio.run(client.search(query, num_results))
+
+
+def test_merges_providers_and_caches(fake_upstreams):
+    client = make_client(fake_upstreams)
+    results = search(client, "moon landing")
+    assert results[0] == "Fake abstract about moon landing."
+    assert len(results) == 3
+    assert search(client, "Moon landing!") == results
+    assert fake_upstreams.stats["search"] == 2
+
+
+def test_deadline_cuts_off_slow_providers(fake_upstreams):
+    fake_upstreams.config["search_latency_ms"] = 500
+    client = make_client(fake_upstreams, deadline=0.1)
+    started = time.monotonic()
+    assert search(client, "slow query") == []
+    assert time.monotonic() - started < 0.4
+    # Running out of time is not the provider's fault, and partial answers are not cached
+    assert all(p.breaker.failures == 0 for p in client.providers)
+    fake_upstreams.config["search_latency_ms"] = 0
+    assert search(client, "slow query")
+
+
+def test_breaker_opens_then_half_opens(fake_upstreams):
+    fake_upstreams.config["search_error_rate"] = 1.0
+    client = make_client(fake_upstreams, cooldown=0.2)
+    for i in range(3):
+        assert search(client, f"outage {i}") == []
+    assert [p.breaker.state for p in client.providers] == ["open", "open"]
+
+    # Open: providers are skipped without a request
+    served = fake_upstreams.stats["search"]
+    assert search(client, "outage 3") == []
+    assert fake_upstreams.stats["search"] == served
+
+    # Half-open after the cooldown: one trial call per provider, success closes it
+    time.sleep(0.25)
+    assert [p.breaker.state for p in client.providers] == ["half-open", "half-open"]
+    fake_upstreams.config["search_error_rate"] = 0.0
+    assert search(client, "recovered")
+    assert fake_upstreams.stats["search"] == served + 2
+    assert [p.breaker.state for p in client.providers] == ["closed", "closed"]
+
+
+def test_failed_half_open_trial_reopens(fake_upstreams):
+    fake_upstreams.config["search_error_rate"] = 1.0
+    client = make_client(fake_upstreams, cooldown=0.2)
+    for i in range(3):
+        search(client, f"outage {i}")
+    time.sleep(0.25)
+    search(client, "still down")
+    assert [p.breaker.state for p in client.providers] == ["open", "open"]
@@ -0,0 +1,41 @@
+import pytest
+
+from app.utils.triage import triage_claim
+
+
+@pytest.mark.parametrize("claim", [
+    "新冠疫苗会导致不孕不育",
+    "地球是平的",
+    "Will Smith slapped Chris Rock at the Oscars",
+    "Can openers were invented after cans",
+    "We never landed on the moon",
+    "Our planet is only six thousand years old",
+    "Is it true that the vaccine causes infertility?",
+    "Is it true that the earth is flat?",
+    "Is the Great Wall of China visible from space?",
+    "Did Einstein fail math at school?",
+    "Drinking bleach is the best cure for covid",
+    "The best-selling book of all time is the Bible",
+    "Humans should drink eight glasses of water daily",
+])
+def test_checkable_claims_go_to_the_llm(claim):
+    assert triage_claim(claim) is None
+
+
+@pytest.mark.parametrize("claim, stage", [
+    ("", "length_limit"),
+    ("Moon fake", "length_limit"),
+    ("hello there", "length_limit"),
+    ("Will it rain in Paris tomorrow?", "not_checkable"),
+    ("Can you tell me the time in Paris?", "not_checkable"),
+    ("Are you the one who answered my email yesterday?", "not_checkable"),
+    ("What is the capital of France", "not_checkable"),
+    ("I think pineapple on pizza is great", "not_checkable"),
+    ("My cat likes sleeping on the sofa", "not_checkable"),
+    ("We think this movie is the best ever", "not_checkable"),
+])
+def test_non_claims_are_answered_locally(claim, stage):
+    result = triage_claim(claim)
+    assert result is not None
+    assert result["stage"] == stage
+    assert result["verdict"] == "Not Checkable"
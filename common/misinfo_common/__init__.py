@@ -0,0 +1 @@
+"""Modules shared by the Text and Image backends."""
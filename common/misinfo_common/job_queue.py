@@ -0,0 +1,573 @@
+# misinfo_common/job_queue.py
+"""
+Durable job queue + worker pool for work that should not run inside the
+HTTP request.
+
+Stores:
+    SQLiteJobStore   default; a single local file (JOB_QUEUE_URL=sqlite:///path.db)
+    RedisJobStore    any Redis-compatible server (JOB_QUEUE_URL=redis://host:6379/0)
+
+Jobs have a priority (higher runs first), a retry budget with exponential
+backoff (a handler raising Deferred is re-run later without spending an
+attempt), a result TTL after which finished jobs are purged, and an optional
+webhook that receives the finished job as JSON (http/https only; restricted to
+JOB_WEBHOOK_ALLOWED_HOSTS when set, otherwise to public addresses). Running
+jobs keep their lease alive with a heartbeat; jobs claimed by a worker that
+died are re-queued once their lease expires (or failed if no attempts are
+left), so a restart does not lose work.
+
+Stdlib only (redis optional); used by both the Text and Image backends.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import ipaddress
+import threading
+import traceback
+import urllib.parse
+import urllib.request
+
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "sqlite:///jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "300"))
+# Comma-separated hostnames webhooks may target; empty = any public address
+JOB_WEBHOOK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",")
+                             if h.strip()}
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+LEASE_EXPIRED_ERROR = "Worker lost while running the job (lease expired) and no attempts are left"
+
+
+class Deferred(Exception):
+    """
+    Raised by a handler to run the job again after `retry_after` seconds
+    without using up an attempt (e.g. the upstream asked callers to back off).
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_backoff(attempts: int) -> float:
+    """Delay before the next attempt of a job that failed `attempts` times."""
+    return min(60.0, 2.0 ** attempts)
+
+
+def check_webhook_url(url: str, allowed_hosts=None) -> str:
+    """
+    Raise ValueError unless `url` is an http(s) URL the server may POST to:
+    a host from the allowlist if one is configured, otherwise a host that
+    only resolves to public addresses (no loopback, private or metadata IPs).
+    """
+    allowed_hosts = JOB_WEBHOOK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError(f"webhook_url host {host} is not allowed")
+        return url
+    try:
+        infos = socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, ValueError) as e:
+        raise ValueError(f"webhook_url host {host} does not resolve: {e}")
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0].split("%")[0]).is_global:
+            raise ValueError(f"webhook_url host {host} is not a public address")
+    return url
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect could point the webhook at an internal address
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_webhook_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def _new_job(kind, payload, priority, max_attempts, webhook_url):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": QUEUED,
+        "priority": int(priority),
+        "payload": payload,
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "max_attempts": int(max_attempts),
+        "webhook_url": webhook_url,
+        "created_at": now,
+        "updated_at": now,
+        "run_after": now,
+        "lease_until": None,
+        "expires_at": None,
+    }
+
+
+class SQLiteJobStore:
+    """File-backed store. Safe for several threads and processes on one host."""
+
+    _COLUMNS = ("id", "kind", "status", "priority", "payload", "result", "error", "attempts",
+                "max_attempts", "webhook_url", "created_at", "updated_at", "run_after",
+                "lease_until", "expires_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT, status TEXT, priority INTEGER,
+                payload TEXT, result TEXT, error TEXT, attempts INTEGER, max_attempts INTEGER,
+                webhook_url TEXT, created_at REAL, updated_at REAL, run_after REAL,
+                lease_until REAL, expires_at REAL)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, run_after)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def put(self, job: dict):
+        row = dict(job, payload=json.dumps(job["payload"]),
+                   result=json.dumps(job["result"]) if job["result"] is not None else None)
+        self._conn().execute(
+            f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+            [row[c] for c in self._COLUMNS],
+        )
+
+    def get(self, job_id: str):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, kinds, lease_s: float, result_ttl: float = JOB_RESULT_TTL_S):
+        """Atomically move the best ready job to RUNNING and return it."""
+        now = time.time()
+        conn = self._conn()
+        marks = ", ".join("?" * len(kinds))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker died mid-run: fail them once their attempts are
+            # used up (a job that kills its worker must not loop forever),
+            # re-queue the rest
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, expires_at = ?, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                (FAILED, LEASE_EXPIRED_ERROR, now + result_ttl, now, RUNNING, now),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL WHERE status = ? AND lease_until < ?",
+                (QUEUED, RUNNING, now),
+            )
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND run_after <= ? AND kind IN ({marks}) "
+                "ORDER BY priority DESC, created_at ASC LIMIT 1",
+                (QUEUED, now, *kinds),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, now + lease_s, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = self._row_to_job(row)
+        job.update(status=RUNNING, attempts=job["attempts"] + 1, lease_until=now + lease_s)
+        return job
+
+    def renew(self, job_id: str, lease_until: float):
+        """Extend the lease of a job that is still RUNNING (worker heartbeat)."""
+        self._conn().execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+                             (lease_until, job_id, RUNNING))
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        self._conn().execute(f"UPDATE jobs SET {sets} WHERE id = ?", (*fields.values(), job_id))
+
+    def purge_expired(self):
+        cur = self._conn().execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?",
+                                   (time.time(),))
+        return cur.rowcount
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+
+class RedisJobStore:
+    """
+    Redis-compatible store: each job is a JSON string at <prefix>:job:<id>.
+    Per kind, runnable jobs sit in <prefix>:ready:<kind>, scored so that
+    higher priority and older jobs pop first, and jobs waiting out a retry
+    backoff sit in <prefix>:delayed:<kind>, scored by run_after. Claimed
+    jobs are in <prefix>:running, scored by lease expiry.
+
+    claim() is a single Lua script: lease recovery, promotion of due
+    delayed jobs, the pop and the running-set write happen atomically, so a
+    crash can never drop a job between them. renew() is a script too, and
+    update() a WATCH/MULTI transaction, so neither can overwrite a status
+    change made concurrently by the other or by claim().
+    """
+
+    # KEYS: running set. ARGV: now, lease_until, prefix, result_ttl, lease error, kinds...
+    _CLAIM_SCRIPT = """
+    local now, lease_until, prefix = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+    local result_ttl = tonumber(ARGV[4])
+    local function score(job) return -job.priority * 1e11 + job.created_at end
+
+    -- Expired leases (worker died): fail when out of attempts, else re-queue
+    for _, id in ipairs(redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", now)) do
+        redis.call("ZREM", KEYS[1], id)
+        local key = prefix .. ":job:" .. id
+        local raw = redis.call("GET", key)
+        if raw then
+            local job = cjson.decode(raw)
+            job.lease_until = cjson.null
+            job.updated_at = now
+            if job.attempts >= job.max_attempts then
+                job.status = "failed"
+                job.error = ARGV[5]
+                job.expires_at = now + result_ttl
+                redis.call("SET", key, cjson.encode(job), "EX", math.max(1, math.floor(result_ttl)))
+            else
+                job.status = "queued"
+                redis.call("SET", key, cjson.encode(job))
+                redis.call("ZADD", prefix .. ":ready:" .. job.kind, score(job), id)
+            end
+        end
+    end
+
+    for i = 6, #ARGV do
+        local ready = prefix .. ":ready:" .. ARGV[i]
+        local delayed = prefix .. ":delayed:" .. ARGV[i]
+        -- Backoff elapsed: make runnable
+        for _, id in ipairs(redis.call("ZRANGEBYSCORE", delayed, "-inf", now)) do
+            redis.call("ZREM", delayed, id)
+            local raw = redis.call("GET", prefix .. ":job:" .. id)
+            if raw then
+                redis.call("ZADD", ready, score(cjson.decode(raw)), id)
+            end
+        end
+        while true do
+            local popped = redis.call("ZPOPMIN", ready)
+            if #popped == 0 then break end
+            local key = prefix .. ":job:" .. popped[1]
+            local raw = redis.call("GET", key)
+            local job = raw and cjson.decode(raw)
+            if job and job.status == "queued" then
+                job.status = "running"
+                job.attempts = job.attempts + 1
+                job.lease_until = lease_until
+                job.updated_at = now
+                local encoded = cjson.encode(job)
+                redis.call("SET", key, encoded)
+                redis.call("ZADD", KEYS[1], lease_until, popped[1])
+                return encoded
+            end
+        end
+    end
+    return false
+    """
+
+    # KEYS: running set, job key. ARGV: job id, lease_until
+    _RENEW_SCRIPT = """
+    if not redis.call("ZSCORE", KEYS[1], ARGV[1]) then return 0 end
+    local raw = redis.call("GET", KEYS[2])
+    if not raw then return 0 end
+    local job = cjson.decode(raw)
+    if job.status ~= "running" then return 0 end
+    job.lease_until = tonumber(ARGV[2])
+    redis.call("SET", KEYS[2], cjson.encode(job))
+    redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+    return 1
+    """
+
+    def __init__(self, url: str = None, prefix: str = "jobs", client=None):
+        if client is None:
+            import redis  # optional dependency, only needed for this store
+            client = redis.Redis.from_url(url)
+        self.r = client
+        self.prefix = prefix
+        self._claim = self.r.register_script(self._CLAIM_SCRIPT)
+        self._renew = self.r.register_script(self._RENEW_SCRIPT)
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    @staticmethod
+    def _score(job):
+        # Priority dominates; creation time breaks ties (older first)
+        return -job["priority"] * 1e11 + job["created_at"]
+
+    def _enqueue(self, pipe, job):
+        """Add a QUEUED job to its ready set, or to the delayed set while in backoff."""
+        if job["run_after"] > time.time():
+            pipe.zadd(self._key("delayed", job["kind"]), {job["id"]: job["run_after"]})
+        else:
+            pipe.zadd(self._key("ready", job["kind"]), {job["id"]: self._score(job)})
+
+    def put(self, job):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.set(self._key("job", job["id"]), json.dumps(job))
+        self._enqueue(pipe, job)
+        pipe.execute()
+
+    def get(self, job_id):
+        raw = self.r.get(self._key("job", job_id))
+        return json.loads(raw) if raw else None
+
+    def claim(self, kinds, lease_s, result_ttl=JOB_RESULT_TTL_S):
+        now = time.time()
+        raw = self._claim(keys=[self._key("running")],
+                          args=[now, now + lease_s, self.prefix, result_ttl, LEASE_EXPIRED_ERROR, *kinds])
+        return json.loads(raw) if raw else None
+
+    def renew(self, job_id, lease_until):
+        # Only jobs still RUNNING and in the running set; atomic against update()
+        self._renew(keys=[self._key("running"), self._key("job", job_id)], args=[job_id, lease_until])
+
+    def update(self, job_id, **fields):
+        from redis.exceptions import WatchError
+
+        key = self._key("job", job_id)
+        with self.r.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # Retried if the job changes (renew / lease expiry) before EXEC
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if not raw:
+                        return
+                    job = json.loads(raw)
+                    job.update(fields, updated_at=time.time())
+                    pipe.multi()
+                    if job["status"] == QUEUED:
+                        pipe.zrem(self._key("running"), job_id)
+                        self._enqueue(pipe, job)
+                    elif job["status"] in (SUCCEEDED, FAILED):
+                        pipe.zrem(self._key("running"), job_id)
+                    ttl = job.get("expires_at")
+                    pipe.set(key, json.dumps(job), ex=max(1, int(ttl - time.time())) if ttl else None)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def purge_expired(self):
+        return 0  # handled by key expiry
+
+    def counts(self):
+        counts = {"queued": 0}
+        for pattern in (self._key("ready", "*"), self._key("delayed", "*")):
+            for key in self.r.scan_iter(pattern):
+                counts["queued"] += self.r.zcard(key)
+        counts["running"] = self.r.zcard(self._key("running"))
+        return counts
+
+
+def open_store(url: str = JOB_QUEUE_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobStore(url)
+    path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else url
+    return SQLiteJobStore(path)
+
+
+class JobQueue:
+    """
+    Submit jobs and run them on a pool of worker threads.
+
+        queue = JobQueue()
+        queue.register("text", handle_text)   # handler(payload) -> JSON-able result
+        queue.start()
+        job_id = queue.submit("text", {"text": "..."}, priority=5)
+    """
+
+    def __init__(self, store=None, workers: int = JOB_WORKERS, result_ttl: float = JOB_RESULT_TTL_S,
+                 lease_s: float = JOB_LEASE_S, poll_interval: float = 0.2):
+        self.store = store or open_store()
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.lease_s = lease_s
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self.finalizers = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._running = set()            # job IDs whose lease the heartbeat keeps alive
+        self._running_lock = threading.Lock()
+
+    def register(self, kind: str, handler, on_finish=None):
+        """
+        handler(payload) -> JSON-able result. on_finish(job), if given, runs
+        once the job has finished for good (succeeded, or failed with no
+        attempts left), e.g. to delete files the payload points to.
+        """
+        self.handlers[kind] = handler
+        if on_finish is not None:
+            self.finalizers[kind] = on_finish
+
+    def submit(self, kind: str, payload, priority: int = 0,
+               max_attempts: int = JOB_MAX_ATTEMPTS, webhook_url: str = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if webhook_url:
+            check_webhook_url(webhook_url)
+        job = _new_job(kind, payload, priority, max_attempts, webhook_url)
+        self.store.put(job)
+        self._wakeup.set()
+        return job["id"]
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    # ---------- Workers ----------
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _worker_loop(self):
+        last_purge = 0.0
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                if time.time() - last_purge > 60:
+                    self.store.purge_expired()
+                    last_purge = time.time()
+                job = self.store.claim(list(self.handlers), self.lease_s, self.result_ttl)
+                if job is not None:
+                    self._run(job)
+                failures = 0
+            except Exception as e:
+                # Store unavailable (locked database, lost Redis connection):
+                # keep the worker alive and back off. A job interrupted here is
+                # picked up again once its lease expires.
+                failures += 1
+                delay = min(30.0, self.poll_interval * 2 ** failures)
+                print(f"[Job Store Error] {e}; retrying in {delay:.1f}s")
+                self._stop.wait(delay)
+                continue
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _heartbeat_loop(self):
+        """Renew the leases of running jobs every lease_s / 3, so long jobs are not re-run."""
+        interval = max(0.05, self.lease_s / 3.0)
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                job_ids = list(self._running)
+            for job_id in job_ids:
+                try:
+                    self.store.renew(job_id, time.time() + self.lease_s)
+                except Exception as e:
+                    print(f"[Job Heartbeat Error] {job_id}: {e}")
+
+    def _run(self, job):
+        with self._running_lock:
+            self._running.add(job["id"])
+        try:
+            result = self.handlers[job["kind"]](job["payload"])
+        except Deferred as e:
+            self.store.update(job["id"], status=QUEUED, error=str(e), attempts=job["attempts"] - 1,
+                              run_after=time.time() + max(0.0, e.retry_after), lease_until=None)
+            return
+        except Exception as e:
+            print(f"[Job Error] {job['id']} attempt {job['attempts']}: {e}")
+            traceback.print_exc()
+            if job["attempts"] < job["max_attempts"]:
+                self.store.update(job["id"], status=QUEUED, error=str(e),
+                                  run_after=time.time() + retry_backoff(job["attempts"]), lease_until=None)
+                return
+            self._finish(job, FAILED, error=str(e))
+            return
+        finally:
+            with self._running_lock:
+                self._running.discard(job["id"])
+        self._finish(job, SUCCEEDED, result=result)
+
+    def _finish(self, job, status, result=None, error=None):
+        self.store.update(job["id"], status=status, result=result, error=error,
+                          lease_until=None, expires_at=time.time() + self.result_ttl)
+        finalizer = self.finalizers.get(job["kind"])
+        if finalizer is not None:
+            try:
+                finalizer(job)
+            except Exception as e:
+                print(f"[Job Cleanup Error] {job['id']}: {e}")
+        if job.get("webhook_url"):
+            self._notify(job["webhook_url"], self.store.get(job["id"]))
+
+    @staticmethod
+    def _notify(url: str, job: dict):
+        """Best-effort webhook delivery; failures are logged, never retried."""
+        try:
+            # Re-checked at delivery: the allowlist or DNS may have changed since submit
+            check_webhook_url(url)
+            req = urllib.request.Request(
+                url, data=json.dumps(public_view(job)).encode("utf-8"),
+                headers={"Content-Type": "application/json"}, method="POST",
+            )
+            _webhook_opener.open(req, timeout=5).close()
+        except Exception as e:
+            print(f"[Webhook Error] {url}: {e}")
+
+
+def public_view(job: dict) -> dict:
+    """The part of a job returned by GET /jobs/{id} and sent to webhooks."""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"] if job["status"] == FAILED else None,
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
@@ -0,0 +1,26 @@
+# misinfo_common/stage_timer.py
+"""
+Per-request stage timings, reported in the standard Server-Timing response
+header (visible in browser dev tools and aggregated by loadtest/loadgen.py).
+
+    timer = StageTimer()
+    ... decode ...
+    timer.mark("decode")        # time since the previous mark (or creation)
+    response.headers["Server-Timing"] = timer.header()
+"""
+import time
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def mark(self, name: str):
+        """Attribute the time since the previous mark to `name` (accumulates)."""
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self._last) * 1000.0
+        self._last = now
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
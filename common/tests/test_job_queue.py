@@ -0,0 +1,333 @@
+import time
+
+import pytest
+
+from misinfo_common.job_queue import JobQueue, SQLiteJobStore, SUCCEEDED, FAILED, Deferred, check_webhook_url
+
+
+def wait_for(queue, job_id, statuses=(SUCCEEDED, FAILED), timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {queue.get(job_id)['status']}")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+@pytest.fixture
+def make_queue(store):
+    queues = []
+
+    def make(**kwargs):
+        kwargs.setdefault("workers", 1)
+        kwargs.setdefault("poll_interval", 0.02)
+        queue = JobQueue(store=store, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def test_job_runs_and_stores_result(make_queue):
+    queue = make_queue()
+    queue.register("echo", lambda payload: {"echo": payload["value"]})
+    queue.start()
+    job = wait_for(queue, queue.submit("echo", {"value": 7}))
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"echo": 7}
+    assert job["attempts"] == 1
+
+
+def test_failing_job_is_retried_then_failed(make_queue, monkeypatch):
+    monkeypatch.setattr("misinfo_common.job_queue.retry_backoff", lambda attempts: 0.0)
+    queue = make_queue()
+    calls = []
+
+    def handler(payload):
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    queue.register("bad", handler)
+    queue.start()
+    job = wait_for(queue, queue.submit("bad", {}, max_attempts=2))
+    assert job["status"] == FAILED
+    assert job["error"] == "boom"
+    assert len(calls) == 2
+
+
+def test_higher_priority_is_claimed_first(store):
+    queue = JobQueue(store=store, workers=0)
+    queue.register("k", lambda payload: None)
+    low = queue.submit("k", {}, priority=0)
+    high = queue.submit("k", {}, priority=5)
+    assert store.claim(["k"], 30)["id"] == high
+    assert store.claim(["k"], 30)["id"] == low
+
+
+class FlakyStore:
+    """Wraps a store and raises on the first `failures` calls of `method`."""
+
+    def __init__(self, store, method, failures=1):
+        self.store = store
+        self.method = method
+        self.failures = failures
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name != self.method:
+            return attr
+
+        def flaky(*args, **kwargs):
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("database is locked")
+            return attr(*args, **kwargs)
+        return flaky
+
+
+@pytest.mark.parametrize("method", ["claim", "purge_expired", "update"])
+def test_worker_survives_store_errors(store, method):
+    # A failed update leaves the job RUNNING; it is re-run once its short lease expires
+    queue = JobQueue(store=FlakyStore(store, method), workers=1, poll_interval=0.01, lease_s=0.3)
+    queue.register("echo", lambda payload: payload)
+    queue.start()
+    try:
+        job = wait_for(queue, queue.submit("echo", {"n": 1}))
+        assert job["status"] == SUCCEEDED
+        assert all(t.is_alive() for t in queue._threads)
+    finally:
+        queue.stop()
+
+
+def test_heartbeat_keeps_long_job_from_running_twice(make_queue):
+    queue = make_queue(workers=2, lease_s=0.3)
+    runs = []
+
+    def slow(payload):
+        runs.append(1)
+        time.sleep(1.0)
+        return "done"
+
+    queue.register("slow", slow)
+    queue.start()
+    job = wait_for(queue, queue.submit("slow", {}))
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 1
+    assert len(runs) == 1
+
+
+def test_expired_lease_without_attempts_left_fails_the_job(store):
+    queue = JobQueue(store=store, workers=0)
+    queue.register("crashy", lambda payload: None)
+    job_id = queue.submit("crashy", {}, max_attempts=1)
+    # A worker claims it and dies (e.g. OOM): nobody renews or finishes it
+    assert store.claim(["crashy"], lease_s=0.0)["id"] == job_id
+    time.sleep(0.01)
+    assert store.claim(["crashy"], lease_s=30.0) is None
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert "lease expired" in job["error"]
+    assert job["expires_at"] is not None
+
+
+def test_expired_lease_with_attempts_left_is_requeued(store):
+    queue = JobQueue(store=store, workers=0)
+    queue.register("crashy", lambda payload: None)
+    job_id = queue.submit("crashy", {}, max_attempts=2)
+    store.claim(["crashy"], lease_s=0.0)
+    time.sleep(0.01)
+    job = store.claim(["crashy"], lease_s=30.0)
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+
+
+@pytest.fixture
+def redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis needs it to run Lua scripts
+    from misinfo_common.job_queue import RedisJobStore
+    return RedisJobStore(client=fakeredis.FakeRedis())
+
+
+def test_redis_claim_moves_job_to_running_atomically(redis_store):
+    queue = JobQueue(store=redis_store, workers=0)
+    queue.register("k", lambda payload: None)
+    job_id = queue.submit("k", {"text": "x"})
+    job = redis_store.claim(["k"], 30)
+    assert job["id"] == job_id and job["status"] == "running" and job["attempts"] == 1
+    assert redis_store.r.zscore("jobs:running", job_id) == pytest.approx(job["lease_until"])
+    assert redis_store.get(job_id)["status"] == "running"
+    assert redis_store.claim(["k"], 30) is None
+
+
+def test_redis_job_in_backoff_does_not_block_ready_jobs(redis_store):
+    queue = JobQueue(store=redis_store, workers=0)
+    queue.register("k", lambda payload: None)
+    urgent = queue.submit("k", {}, priority=9)
+    normal = queue.submit("k", {}, priority=0)
+    redis_store.claim(["k"], 30)
+    # The urgent job failed and waits out its backoff
+    redis_store.update(urgent, status="queued", run_after=time.time() + 60, lease_until=None)
+    assert redis_store.claim(["k"], 30)["id"] == normal
+    assert redis_store.claim(["k"], 30) is None
+    assert redis_store.counts()["queued"] == 1
+    redis_store.update(urgent, run_after=time.time() - 1)
+    redis_store.r.zadd("jobs:delayed:k", {urgent: time.time() - 1})
+    assert redis_store.claim(["k"], 30)["id"] == urgent
+
+
+def test_redis_expired_lease_requeues_or_fails(redis_store):
+    queue = JobQueue(store=redis_store, workers=0)
+    queue.register("k", lambda payload: None)
+    retry = queue.submit("k", {}, max_attempts=2, priority=1)
+    final = queue.submit("k", {}, max_attempts=1)
+    redis_store.claim(["k"], 0.2)
+    redis_store.claim(["k"], 0.2)
+    time.sleep(0.25)
+    job = redis_store.claim(["k"], 30)
+    assert job["id"] == retry and job["attempts"] == 2
+    failed = redis_store.get(final)
+    assert failed["status"] == "failed" and "lease expired" in failed["error"]
+
+
+def test_redis_queue_end_to_end(redis_store, monkeypatch):
+    monkeypatch.setattr("misinfo_common.job_queue.retry_backoff", lambda attempts: 0.05)
+    queue = JobQueue(store=redis_store, workers=1, poll_interval=0.01)
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("transient")
+        return {"ok": payload["n"]}
+
+    queue.register("k", flaky)
+    queue.start()
+    try:
+        job = wait_for(queue, queue.submit("k", {"n": 3}))
+    finally:
+        queue.stop()
+    assert job["status"] == SUCCEEDED and job["result"] == {"ok": 3} and job["attempts"] == 2
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_on_finish_runs_once_after_final_attempt(make_queue, monkeypatch, fails):
+    monkeypatch.setattr("misinfo_common.job_queue.retry_backoff", lambda attempts: 0.0)
+    queue = make_queue()
+    finished = []
+
+    def handler(payload):
+        if fails:
+            raise RuntimeError("bad image")
+        return "ok"
+
+    queue.register("image", handler, on_finish=lambda job: finished.append(job["attempts"]))
+    queue.start()
+    wait_for(queue, queue.submit("image", {}, max_attempts=3))
+    time.sleep(0.05)
+    assert finished == ([3] if fails else [1])
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "gopher://example.com/",
+    "http://127.0.0.1:8000/admin",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook",
+    "http:///no-host",
+])
+def test_webhook_url_rejects_unsafe_targets(url):
+    with pytest.raises(ValueError):
+        check_webhook_url(url, allowed_hosts=set())
+
+
+def test_webhook_url_allowlist():
+    assert check_webhook_url("https://93.184.216.34/hook", allowed_hosts=set())
+    assert check_webhook_url("http://hooks.internal/x", allowed_hosts={"hooks.internal"})
+    with pytest.raises(ValueError):
+        check_webhook_url("https://93.184.216.34/hook", allowed_hosts={"hooks.internal"})
+    with pytest.raises(ValueError):
+        check_webhook_url("ftp://hooks.internal/x", allowed_hosts={"hooks.internal"})
+
+
+def test_submit_rejects_unsafe_webhook(store):
+    queue = JobQueue(store=store, workers=0)
+    queue.register("k", lambda payload: None)
+    with pytest.raises(ValueError):
+        queue.submit("k", {}, webhook_url="http://127.0.0.1:6379/")
+    assert store.counts().get("queued", 0) == 0
+
+
+def test_deferred_job_does_not_use_up_attempts(make_queue):
+    queue = make_queue()
+    calls = []
+
+    def handler(payload):
+        calls.append(1)
+        if len(calls) < 3:
+            raise Deferred("upstream quota", retry_after=0.05)
+        return "ok"
+
+    queue.register("k", handler)
+    queue.start()
+    job = wait_for(queue, queue.submit("k", {}, max_attempts=1))
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 1
+    assert len(calls) == 3
+
+
+def test_redis_renew_never_resurrects_a_finished_job(redis_store):
+    queue = JobQueue(store=redis_store, workers=0)
+    queue.register("k", lambda payload: None)
+    job_id = queue.submit("k", {})
+    redis_store.claim(["k"], 30)
+    redis_store.update(job_id, status=SUCCEEDED, result="ok", lease_until=None,
+                       expires_at=time.time() + 60)
+    redis_store.renew(job_id, time.time() + 30)
+    job = redis_store.get(job_id)
+    assert job["status"] == SUCCEEDED and job["lease_until"] is None
+    assert redis_store.r.ttl(f"jobs:job:{job_id}") > 0
+    assert redis_store.r.zscore("jobs:running", job_id) is None
+
+
+def test_redis_update_retries_when_the_job_changes_underneath(redis_store, monkeypatch):
+    queue = JobQueue(store=redis_store, workers=0)
+    queue.register("k", lambda payload: None)
+    job_id = queue.submit("k", {})
+    redis_store.claim(["k"], 30)
+    enqueue = redis_store._enqueue
+    calls = []
+
+    def racing_enqueue(pipe, job):
+        if not calls:
+            # A concurrent writer (e.g. a heartbeat) changes the job before EXEC
+            redis_store.renew(job_id, time.time() + 99)
+        calls.append(1)
+        enqueue(pipe, job)
+
+    monkeypatch.setattr(redis_store, "_enqueue", racing_enqueue)
+    redis_store.update(job_id, status="queued", run_after=time.time(), lease_until=None)
+    assert len(calls) == 2
+    job = redis_store.get(job_id)
+    assert job["status"] == "queued" and job["lease_until"] is None
+    assert redis_store.r.zscore("jobs:running", job_id) is None
+
+
+def test_redis_claim_skips_stale_ready_entries(redis_store):
+    queue = JobQueue(store=redis_store, workers=0)
+    queue.register("k", lambda payload: None)
+    done = queue.submit("k", {})
+    redis_store.update(done, status=SUCCEEDED, expires_at=time.time() + 60)
+    # Left in the ready set by an older writer
+    redis_store.r.zadd("jobs:ready:k", {done: 0})
+    assert redis_store.claim(["k"], 30) is None
+    assert redis_store.get(done)["status"] == SUCCEEDED
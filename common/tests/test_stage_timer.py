@@ -0,0 +1,15 @@
+import time
+
+from misinfo_common.stage_timer import StageTimer
+
+
+def test_marks_accumulate_and_format_as_server_timing():
+    timer = StageTimer()
+    time.sleep(0.01)
+    timer.mark("decode")
+    timer.mark("ela")
+    timer.mark("decode")
+    assert list(timer.stages) == ["decode", "ela"]
+    assert timer.stages["decode"] >= 10.0
+    name, dur = timer.header().split(", ")[0].split(";dur=")
+    assert name == "decode" and float(dur) >= 10.0
@@ -0,0 +1,192 @@
+"""
+Fake upstreams for offline load tests of the text service.
+
+Serves, on one port:
+  - Gemini REST  POST /v1beta/models/{model}:generateContent
+  - DuckDuckGo   GET  /ddg      (Instant Answer JSON shape)
+  - Wikipedia    GET  /wiki     (MediaWiki search JSON shape)
+with configurable latency, error rate and a per-minute request/token quota
+that answers 429 RESOURCE_EXHAUSTED the way the real API does.
+
+Start it, then point the text backend at it:
+    python loadtest/fake_upstreams.py --port 9100 --latency-ms 600 --jitter-ms 200 --quota-rpm 120
+    GEMINI_API_ENDPOINT=http://127.0.0.1:9100 GOOGLE_API_KEY=fake \\
+    SEARCH_DDG_URL=http://127.0.0.1:9100/ddg SEARCH_WIKI_URL=http://127.0.0.1:9100/wiki \\
+        uvicorn app.main:app --port 8000          # from Text/backend
+
+Behaviour can be changed while a test runs (e.g. to inject an outage):
+    curl -X POST 127.0.0.1:9100/_config -H 'content-type: application/json' -d '{"error_rate": 0.5}'
+GET /_stats returns what the fake actually served.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+config = {
+    "latency_ms": float(os.getenv("FAKE_LATENCY_MS", "500")),
+    "jitter_ms": float(os.getenv("FAKE_JITTER_MS", "150")),
+    "error_rate": float(os.getenv("FAKE_ERROR_RATE", "0")),       # share of 500s
+    "quota_rpm": float(os.getenv("FAKE_QUOTA_RPM", "0")),         # 0 = unlimited
+    "quota_tpm": float(os.getenv("FAKE_QUOTA_TPM", "0")),
+    "search_latency_ms": float(os.getenv("FAKE_SEARCH_LATENCY_MS", "80")),
+    "search_error_rate": float(os.getenv("FAKE_SEARCH_ERROR_RATE", "0")),
+    "seed": None,
+}
+
+stats = {"generate": 0, "ok": 0, "errors": 0, "quota_429": 0, "search": 0, "search_errors": 0}
+_window = deque()        # (timestamp, tokens) of admitted generate calls in the last 60 s
+_rng = random.Random()
+
+VERDICTS = ["True", "False", "Unverifiable"]
+
+app = FastAPI(title="Fake upstreams (Gemini + search)")
+
+
+def _delay(mean_ms: float, jitter_ms: float) -> float:
+    # Log-normal-ish tail: mostly around the mean, occasionally much slower
+    base = max(0.0, _rng.gauss(mean_ms, jitter_ms))
+    if _rng.random() < 0.02:
+        base *= 3
+    return base / 1000.0
+
+
+def _quota_exceeded(tokens: int):
+    """Sliding 60 s window over requests and tokens. Returns retry-after seconds or None."""
+    now = time.monotonic()
+    while _window and now - _window[0][0] >= 60.0:
+        _window.popleft()
+    over_rpm = config["quota_rpm"] and len(_window) + 1 > config["quota_rpm"]
+    over_tpm = config["quota_tpm"] and sum(t for _, t in _window) + tokens > config["quota_tpm"]
+    if over_rpm or over_tpm:
+        return max(1.0, 60.0 - (now - _window[0][0])) if _window else 1.0
+    _window.append((now, tokens))
+    return None
+
+
+def _google_error(code: int, status: str, message: str, retry_after: float = None):
+    details = []
+    if retry_after is not None:
+        details.append({"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": f"{int(retry_after)}s"})
+    headers = {"Retry-After": str(int(retry_after))} if retry_after is not None else None
+    return JSONResponse(status_code=code, headers=headers,
+                        content={"error": {"code": code, "message": message, "status": status, "details": details}})
+
+
+@app.post("/v1beta/models/{model_action:path}")
+async def generate_content(model_action: str, request: Request):
+    body = await request.json()
+    prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                     for part in content.get("parts", []))
+    prompt_tokens = max(1, len(prompt) // 4)
+    stats["generate"] += 1
+
+    retry_after = _quota_exceeded(prompt_tokens)
+    if retry_after is not None:
+        stats["quota_429"] += 1
+        return _google_error(429, "RESOURCE_EXHAUSTED", "Quota exceeded (fake upstream)", retry_after)
+
+    await asyncio.sleep(_delay(config["latency_ms"], config["jitter_ms"]))
+    if _rng.random() < config["error_rate"]:
+        stats["errors"] += 1
+        return _google_error(500, "INTERNAL", "Injected failure (fake upstream)")
+
+    answer = json.dumps({
+        "verdict": _rng.choice(VERDICTS),
+        "confidence": round(_rng.uniform(0.5, 0.99), 2),
+        "explanation": "Synthetic explanation from the fake upstream. " * 4,
+    })
+    output_tokens = len(answer) // 4
+    stats["ok"] += 1
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": f"```json\n{answer}\n```"}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                          "totalTokenCount": prompt_tokens + output_tokens},
+        "modelVersion": model_action.split(":")[0],
+    }
+
+
+async def _search_delay():
+    stats["search"] += 1
+    await asyncio.sleep(_delay(config["search_latency_ms"], config["search_latency_ms"] / 3))
+    if _rng.random() < config["search_error_rate"]:
+        stats["search_errors"] += 1
+        return JSONResponse(status_code=503, content={"error": "Injected failure (fake upstream)"})
+    return None
+
+
+@app.get("/ddg")
+async def fake_duckduckgo(q: str = ""):
+    error = await _search_delay()
+    if error is not None:
+        return error
+    return {"AbstractText": f"Fake abstract about {q}.",
+            "RelatedTopics": [{"Text": f"Related fact {i} about {q}."} for i in range(3)]}
+
+
+@app.get("/wiki")
+async def fake_wikipedia(srsearch: str = "", srlimit: int = 3):
+    error = await _search_delay()
+    if error is not None:
+        return error
+    return {"query": {"search": [{"title": f"Article {i}", "snippet": f"<span>{srsearch}</span> fact {i}"}
+                                 for i in range(srlimit)]}}
+
+
+@app.post("/_config")
+async def update_config(request: Request):
+    changes = await request.json()
+    unknown = set(changes) - set(config)
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"Unknown keys: {sorted(unknown)}"})
+    config.update(changes)
+    if "seed" in changes:
+        _rng.seed(changes["seed"])
+    return config
+
+
+@app.get("/_stats")
+def get_stats():
+    return dict(stats, config=config, window_requests=len(_window))
+
+
+@app.post("/_reset")
+def reset():
+    for key in stats:
+        stats[key] = 0
+    _window.clear()
+    return {"status": "reset"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Gemini + search upstreams for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--quota-rpm", type=float, default=config["quota_rpm"], help="0 = unlimited")
+    parser.add_argument("--quota-tpm", type=float, default=config["quota_tpm"], help="0 = unlimited")
+    parser.add_argument("--search-latency-ms", type=float, default=config["search_latency_ms"])
+    parser.add_argument("--search-error-rate", type=float, default=config["search_error_rate"])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    for key in config:
+        config[key] = getattr(args, key)
+    _rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
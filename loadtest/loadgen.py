@@ -0,0 +1,515 @@
+"""
+Open-loop load generator and latency report for the Image and Text APIs.
+
+Requests arrive as a Poisson process at the offered rate of each step,
+whether or not earlier requests finished (open loop), so queueing shows
+up as latency instead of silently lowering the load. Latency is measured
+from the scheduled send time, which keeps client-side lag in the numbers.
+
+Steps are RATE:SECONDS (constant) or FROM-TO:SECONDS (linear ramp), e.g.
+    --steps 1:30,2:30,4:30          step ramp
+    --steps 0.5-8:120               linear ramp
+
+Image service (Image/backend/main.py or dispatcher.py):
+    python loadtest/loadgen.py image --url http://127.0.0.1:8080 --steps 1:30,2:30,4:30 \\
+        --sizes 640x480:0.5,1920x1080:0.3,4000x3000:0.2 --modes basic:0.8,advanced:0.2 \\
+        --out reports/image-before.json
+
+Text service against the fake upstreams (see fake_upstreams.py):
+    python loadtest/loadgen.py text --url http://127.0.0.1:8000 --steps 2:30,5:30,10:30 \\
+        --upstream http://127.0.0.1:9100 --out reports/text-before.json
+
+Compare two runs (exit code 1 if any SLO check of the new run failed):
+    python loadtest/loadgen.py compare reports/image-before.json reports/image-after.json
+
+The report (JSON) has, per step and overall: offered rate, throughput,
+p50/p95/p99 latency, error rate, status codes, breakdowns per scenario and
+per answering stage (the Text API's "stage" field), and percentiles of every
+Server-Timing entry the services return (decode, ela, heatmap, triage,
+llm_queue, llm, ...). --slo "p95<=2000,error_rate<=0.01" adds pass/fail
+checks on every step.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import subprocess
+from collections import defaultdict
+
+import httpx
+
+DEFAULT_CLAIMS = [
+    "The Great Wall of China is visible from space with the naked eye.",
+    "Drinking eight glasses of water a day is required for good health.",
+    "Vaccines cause autism in children.",
+    "The Eiffel Tower grows taller in summer because of thermal expansion.",
+    "Humans only use ten percent of their brains.",
+    "Lightning never strikes the same place twice.",
+    "The 2024 Summer Olympics were held in Paris.",
+    "Bats are blind and navigate only by echolocation.",
+    "Goldfish have a memory span of three seconds.",
+    "Mount Everest is the tallest mountain on Earth measured from sea level.",
+    "5G towers spread viruses through radio waves.",
+    "The moon landing in 1969 was filmed in a studio.",
+    "Antibiotics are effective against viral infections like the flu.",
+    "The Amazon rainforest produces twenty percent of the world's oxygen.",
+    "Napoleon Bonaparte was unusually short for his time.",
+    "A new law requires all cars sold in the EU from 2035 to be zero-emission.",
+]
+# Inputs the triage stage answers without the LLM (too short / not checkable)
+SHORT_INPUTS = ["ok", "lol", "hi there", "What do you think?", "I love this song so much!"]
+
+
+# ---------- Workloads ----------
+
+def parse_weighted(spec: str, cast=str):
+    """'a:0.7,b:0.3' -> [(a, 0.7), (b, 0.3)] (weights default to 1)."""
+    items = []
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition(":")
+        items.append((cast(name), float(weight) if weight else 1.0))
+    return items
+
+
+def weighted_choice(rng: random.Random, items):
+    return rng.choices([v for v, _ in items], weights=[w for _, w in items])[0]
+
+
+def _jpeg_with_comment(jpeg: bytes, comment: bytes) -> bytes:
+    """Insert a COM segment after SOI: same pixels, different bytes (defeats content-hash caches)."""
+    return jpeg[:2] + b"\xff\xfe" + (len(comment) + 2).to_bytes(2, "big") + comment + jpeg[2:]
+
+
+class ImageWorkload:
+    def __init__(self, args, rng: random.Random):
+        import cv2
+        import numpy as np
+
+        self.rng = rng
+        self.args = args
+        self.sizes = parse_weighted(args.sizes)
+        self.modes = parse_weighted(args.modes)
+        self.base = {}
+        np_rng = np.random.default_rng(args.seed)
+        for size, _ in self.sizes:
+            w, h = (int(v) for v in size.lower().split("x"))
+            # Smooth random structure + noise compresses like a photo, not like pure noise
+            small = np_rng.integers(0, 255, (max(2, h // 64), max(2, w // 64), 3), dtype=np.uint8)
+            img = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+            img = cv2.add(img, np_rng.integers(0, 12, img.shape, dtype=np.uint8))
+            cv2.rectangle(img, (w // 3, h // 3), (w // 2, h // 2), (40, 200, 90), -1)
+            ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 88])
+            self.base[size] = buf.tobytes()
+        self.counter = 0
+        # Seeds make runs reproducible; the nonce keeps "unique" uploads unique across runs
+        self.nonce = os.urandom(4).hex()
+
+    def next_request(self):
+        size = weighted_choice(self.rng, self.sizes)
+        mode = weighted_choice(self.rng, self.modes)
+        preview = self.rng.random() < self.args.preview_share
+        data = self.base[size]
+        if self.rng.random() < self.args.unique_share:
+            self.counter += 1
+            data = _jpeg_with_comment(data, f"loadgen {self.nonce} {self.counter}".encode())
+        else:
+            # Repeat uploads from a small pool: exercises the result cache
+            data = _jpeg_with_comment(data, f"pool {self.rng.randrange(self.args.pool)}".encode())
+        scenario = f"{size}/{mode}" + ("/preview" if preview else "")
+        params = {"mode": mode}
+        if preview:
+            params["preview"] = "true"
+        return scenario, {"method": "POST", "url": "/analyze", "params": params,
+                          "files": {"file": ("load.jpg", data, "image/jpeg")}}
+
+
+class TextWorkload:
+    def __init__(self, args, rng: random.Random):
+        self.rng = rng
+        self.args = args
+        if args.claims_file:
+            with open(args.claims_file, encoding="utf-8") as f:
+                self.claims = [line.strip() for line in f if line.strip()]
+        else:
+            self.claims = DEFAULT_CLAIMS
+        self.counter = 0
+        self.nonce = os.urandom(4).hex()
+
+    def next_request(self):
+        if self.rng.random() < self.args.short_share:
+            return "short", {"method": "POST", "url": "/api/verify-text",
+                             "json": {"text": self.rng.choice(SHORT_INPUTS)}}
+        claim = self.rng.choice(self.claims)
+        if self.rng.random() < self.args.unique_share:
+            # A fresh claim every time: misses the known-verdict cache
+            self.counter += 1
+            claim = f"{claim} Reported by source {self.nonce}-{self.counter}."
+            scenario = "claim"
+        else:
+            scenario = "repeat_claim"
+        return scenario, {"method": "POST", "url": "/api/verify-text", "json": {"text": claim}}
+
+
+# ---------- Schedule ----------
+
+def parse_steps(spec: str):
+    """'1:30,2-8:60' -> [(1.0, 1.0, 30.0), (2.0, 8.0, 60.0)]"""
+    steps = []
+    for part in spec.split(","):
+        rate, _, seconds = part.strip().partition(":")
+        start, _, end = rate.partition("-")
+        steps.append((float(start), float(end or start), float(seconds)))
+    return steps
+
+
+def arrival_times(rng: random.Random, start_rate: float, end_rate: float, seconds: float):
+    """Poisson arrivals with a linearly changing rate (thinning), offsets within the step."""
+    peak = max(start_rate, end_rate)
+    if peak <= 0:
+        return []
+    times, t = [], 0.0
+    while True:
+        t += rng.expovariate(peak)
+        if t >= seconds:
+            return times
+        rate = start_rate + (end_rate - start_rate) * t / seconds
+        if rng.random() * peak <= rate:
+            times.append(t)
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    timings[name] = timings.get(name, 0.0) + float(value)
+                except ValueError:
+                    pass
+    return timings
+
+
+async def send(client: httpx.AsyncClient, step: int, scenario: str, request: dict,
+               scheduled: float, parse_body: bool, records: list):
+    record = {"step": step, "scenario": scenario, "sent": scheduled}
+    try:
+        r = await client.request(**request)
+        record["latency_ms"] = (time.perf_counter() - scheduled) * 1000.0
+        record["status"] = r.status_code
+        record["timings"] = parse_server_timing(r.headers.get("server-timing"))
+        if parse_body and r.headers.get("content-type", "").startswith("application/json"):
+            body = r.json()
+            record["result_stage"] = body.get("stage")
+            record["verdict"] = body.get("verdict")
+    except httpx.TimeoutException:
+        record["latency_ms"] = (time.perf_counter() - scheduled) * 1000.0
+        record["status"] = "timeout"
+    except httpx.HTTPError as e:
+        record["latency_ms"] = (time.perf_counter() - scheduled) * 1000.0
+        record["status"] = type(e).__name__
+    records.append(record)
+
+
+async def run_load(args, workload, parse_body: bool):
+    rng = random.Random(args.seed)
+    steps = parse_steps(args.steps)
+    records, dropped = [], defaultdict(int)
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        pending = set()
+        origin = time.perf_counter()
+        offset = 0.0
+        for step, (start_rate, end_rate, seconds) in enumerate(steps):
+            print(f"step {step}: {start_rate:g}->{end_rate:g} req/s for {seconds:g}s", file=sys.stderr)
+            for t in arrival_times(rng, start_rate, end_rate, seconds):
+                scheduled = origin + offset + t
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if len(pending) >= args.max_inflight:
+                    dropped[step] += 1
+                    continue
+                scenario, request = workload.next_request()
+                task = asyncio.create_task(send(client, step, scenario, request, scheduled, parse_body, records))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            offset += seconds
+            remaining = origin + offset - time.perf_counter()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+        if pending:
+            print(f"waiting for {len(pending)} in-flight requests", file=sys.stderr)
+            await asyncio.gather(*pending)
+    return steps, records, dropped
+
+
+# ---------- Report ----------
+
+def percentile(sorted_values, q: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(q / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "max": round(values[-1], 1),
+    }
+
+
+# Text API answers that arrive with HTTP 200 but mean the request failed
+FAILED_VERDICTS = {"System Unavailable"}
+
+
+def is_success(record) -> bool:
+    return (isinstance(record["status"], int) and record["status"] < 400
+            and record.get("verdict") not in FAILED_VERDICTS)
+
+
+def summarize(records, seconds: float, dropped: int = 0) -> dict:
+    ok = [r for r in records if is_success(r)]
+    status = defaultdict(int)
+    for r in records:
+        status[str(r["status"])] += 1
+    summary = {
+        "sent": len(records) + dropped,
+        "completed": len(records),
+        "dropped": dropped,
+        "offered_rps": round((len(records) + dropped) / seconds, 3) if seconds else None,
+        "throughput_rps": round(len(ok) / seconds, 3) if seconds else None,
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else None,
+        "status": dict(status),
+        # Successful requests only: fast failures would flatter the percentiles
+        "latency_ms": latency_summary([r["latency_ms"] for r in ok]),
+    }
+
+    by_scenario = defaultdict(list)
+    by_result = defaultdict(list)
+    timings = defaultdict(list)
+    for r in records:
+        by_scenario[r["scenario"]].append(r)
+        if r.get("result_stage"):
+            by_result[r["result_stage"]].append(r)
+        if is_success(r):
+            for name, ms in r.get("timings", {}).items():
+                timings[name].append(ms)
+    summary["by_scenario"] = {
+        name: {"count": len(rs),
+               "error_rate": round(1 - sum(map(is_success, rs)) / len(rs), 4),
+               "latency_ms": latency_summary([r["latency_ms"] for r in rs if is_success(r)])}
+        for name, rs in sorted(by_scenario.items())
+    }
+    if by_result:
+        summary["by_result"] = {}
+        for name, rs in sorted(by_result.items()):
+            verdicts = defaultdict(int)
+            for r in rs:
+                verdicts[str(r.get("verdict"))] += 1
+            summary["by_result"][name] = {"count": len(rs), "verdicts": dict(verdicts),
+                                          "latency_ms": latency_summary([r["latency_ms"] for r in rs])}
+    summary["server_timing_ms"] = {name: latency_summary(v) for name, v in timings.items()}
+    return summary
+
+
+def parse_slo(spec: str):
+    """'p95<=2000,error_rate<=0.01' -> [("p95", 2000.0), ("error_rate", 0.01)] (all upper bounds)."""
+    checks = []
+    for part in (spec or "").split(","):
+        if part.strip():
+            name, _, limit = part.partition("<=")
+            checks.append((name.strip(), float(limit)))
+    return checks
+
+
+def slo_value(summary: dict, name: str):
+    if name in ("error_rate", "throughput_rps", "offered_rps"):
+        return summary.get(name)
+    return summary["latency_ms"].get(name)
+
+
+def evaluate_slo(report: dict, checks) -> dict:
+    results = []
+    for step in report["steps"]:
+        for name, limit in checks:
+            value = slo_value(step, name)
+            results.append({"step": step["step"], "check": f"{name}<={limit:g}", "value": value,
+                            "passed": value is not None and value <= limit})
+    return {"checks": results, "passed": all(r["passed"] for r in results)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def upstream_stats(url: str):
+    if not url:
+        return None
+    try:
+        return httpx.get(url.rstrip("/") + "/_stats", timeout=5).json()
+    except httpx.HTTPError:
+        return None
+
+
+def build_report(args, steps, records, dropped, started_at, upstream_before, upstream_after) -> dict:
+    report = {
+        "label": args.label,
+        "target": args.target,
+        "url": args.url,
+        "started_at": started_at,
+        "git_revision": git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("func",)},
+        "steps": [],
+    }
+    for i, (start_rate, end_rate, seconds) in enumerate(steps):
+        step_records = [r for r in records if r["step"] == i]
+        spec = f"{start_rate:g}:{seconds:g}" if start_rate == end_rate else f"{start_rate:g}-{end_rate:g}:{seconds:g}"
+        report["steps"].append(dict(step=i, spec=spec, **summarize(step_records, seconds, dropped[i])))
+    report["overall"] = summarize(records, sum(s for _, _, s in steps), sum(dropped.values()))
+    if upstream_after is not None:
+        counters = {k: v for k, v in upstream_after.items()
+                    if isinstance(v, (int, float)) and k != "window_requests"}
+        if upstream_before is not None:
+            counters = {k: v - upstream_before.get(k, 0) for k, v in counters.items()}
+        report["upstream"] = {"counters": counters, "config": upstream_after.get("config")}
+    checks = parse_slo(args.slo)
+    if checks:
+        report["slo"] = evaluate_slo(report, checks)
+    return report
+
+
+def print_table(report: dict):
+    print(f"\n{report['target']} @ {report['url']}  ({report.get('label') or 'unlabelled'})")
+    print(f"{'step':<14}{'offered':>9}{'tput':>9}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for row in report["steps"] + [dict(report["overall"], spec="overall")]:
+        lat = row["latency_ms"]
+        err = 100 * row["error_rate"] if row["error_rate"] is not None else float("nan")
+        print(f"{row['spec']:<14}{row['offered_rps'] or 0:>9.2f}{row['throughput_rps'] or 0:>9.2f}{err:>8.2f}"
+              f"{lat.get('p50', float('nan')):>9.0f}{lat.get('p95', float('nan')):>9.0f}"
+              f"{lat.get('p99', float('nan')):>9.0f}")
+    timings = report["overall"].get("server_timing_ms")
+    if timings:
+        print("server timing p50/p95 (ms): " + ", ".join(
+            f"{name} {t['p50']:.0f}/{t['p95']:.0f}" for name, t in timings.items()))
+    if "slo" in report:
+        failed = [c for c in report["slo"]["checks"] if not c["passed"]]
+        print("SLO: " + ("passed" if not failed else "FAILED " + ", ".join(
+            f"step {c['step']} {c['check']} (got {c['value']})" for c in failed)))
+
+
+def compare(old: dict, new: dict):
+    """Side-by-side deltas of two reports, step by step (matched by position)."""
+    def fmt(a, b, lower_is_better=True):
+        if a is None or b is None:
+            return f"{a!s:>9} -> {b!s:<9}"
+        if not a:
+            worse = b > a if lower_is_better else b < a
+            return f"{a:>9.1f} -> {b:<9.1f}{'':>7}{' !' if worse else '  '}"
+        change = (b - a) / a * 100
+        worse = change > 5 if lower_is_better else change < -5
+        return f"{a:>9.1f} -> {b:<9.1f}{change:+6.1f}%{' !' if worse else '  '}"
+
+    # " !" marks a regression of more than 5% (or any increase from zero)
+    print(f"old: {old.get('label') or old['started_at']} ({old.get('git_revision')})")
+    print(f"new: {new.get('label') or new['started_at']} ({new.get('git_revision')})")
+    rows = list(zip(old["steps"], new["steps"])) + [(dict(old["overall"], spec="overall"),
+                                                      dict(new["overall"], spec="overall"))]
+    for a, b in rows:
+        print(f"\n[{a['spec']} vs {b['spec']}]")
+        print(f"  throughput rps {fmt(a['throughput_rps'], b['throughput_rps'], lower_is_better=False)}")
+        print(f"  error rate %   {fmt(100 * (a['error_rate'] or 0), 100 * (b['error_rate'] or 0))}")
+        for q in ("p50", "p95", "p99"):
+            print(f"  {q} ms         {fmt(a['latency_ms'].get(q), b['latency_ms'].get(q))}")
+    old_t, new_t = old["overall"].get("server_timing_ms", {}), new["overall"].get("server_timing_ms", {})
+    if old_t or new_t:
+        print("\n[server timing p50 ms]")
+        for name in list(dict.fromkeys(list(old_t) + list(new_t))):
+            print(f"  {name:<14}{fmt(old_t.get(name, {}).get('p50'), new_t.get(name, {}).get('p50'))}")
+    slo = new.get("slo")
+    return slo is None or slo["passed"]
+
+
+# ---------- CLI ----------
+
+def run(args):
+    rng = random.Random(args.seed)
+    workload = ImageWorkload(args, rng) if args.target == "image" else TextWorkload(args, rng)
+    upstream = getattr(args, "upstream", None)
+    before = upstream_stats(upstream)
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    steps, records, dropped = asyncio.run(run_load(args, workload, parse_body=args.target == "text"))
+    report = build_report(args, steps, records, dropped, started_at, before, upstream_stats(upstream))
+    print_table(report)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.out}")
+    return 0 if report.get("slo", {"passed": True})["passed"] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="target", required=True)
+
+    def common(p, default_url):
+        p.add_argument("--url", default=default_url)
+        p.add_argument("--steps", default="1:30,2:30,4:30", help="RATE:SECONDS or FROM-TO:SECONDS, comma separated")
+        p.add_argument("--timeout", type=float, default=120.0)
+        p.add_argument("--max-inflight", type=int, default=256, help="arrivals beyond this are counted as dropped")
+        p.add_argument("--slo", default="", help='e.g. "p95<=2000,error_rate<=0.01" (checked on every step)')
+        p.add_argument("--label", default=None)
+        p.add_argument("--seed", type=int, default=1)
+        p.add_argument("--out", default=None, help="write the JSON report here")
+
+    image = sub.add_parser("image", help="drive POST /analyze")
+    common(image, "http://127.0.0.1:8080")
+    image.add_argument("--sizes", default="640x480:0.5,1920x1080:0.35,4000x3000:0.15")
+    image.add_argument("--modes", default="basic:0.8,advanced:0.2")
+    image.add_argument("--preview-share", type=float, default=0.0, help="share of requests with preview=true")
+    image.add_argument("--unique-share", type=float, default=1.0, help="share of never-seen uploads (cache misses)")
+    image.add_argument("--pool", type=int, default=8, help="distinct uploads per size for repeated requests")
+
+    text = sub.add_parser("text", help="drive POST /api/verify-text")
+    common(text, "http://127.0.0.1:8000")
+    text.add_argument("--claims-file", default=None, help="one claim per line (default: built-in set)")
+    text.add_argument("--unique-share", type=float, default=0.9, help="share of never-seen claims")
+    text.add_argument("--short-share", type=float, default=0.1, help="share of inputs triage answers locally")
+    text.add_argument("--upstream", default=None, help="fake upstream URL, to include its counters")
+
+    cmp_parser = sub.add_parser("compare", help="diff two reports")
+    cmp_parser.add_argument("old")
+    cmp_parser.add_argument("new")
+
+    args = parser.parse_args(argv)
+    if args.target == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        return 0 if compare(old, new) else 1
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())